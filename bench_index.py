@@ -0,0 +1,107 @@
+import argparse
+import os
+import random
+import statistics
+import tempfile
+import time
+import tracemalloc
+
+import id_index
+
+BASE_URL = "https://sea.banggood.com"
+# Banggood product ids are 7 digit numbers spread over a wide range
+FIRST_ID = 1000000
+ID_SPREAD = 8
+
+
+def product_url(product_id):
+    return f"{BASE_URL}/Bench-Product-{product_id}-p-{product_id}.html"
+
+
+def measure(build):
+    # Python heap allocated while building, the way a worker would hold it
+    tracemalloc.start()
+    start = time.perf_counter()
+    result = build()
+    elapsed = time.perf_counter() - start
+    size = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    return result, size, elapsed
+
+
+def time_lookups(contains, urls, repeat):
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for url in urls:
+            contains(url)
+        samples.append((time.perf_counter() - start) / len(urls))
+    return statistics.median(samples)
+
+
+def run(args):
+    rng = random.Random(args.seed)
+    ids = rng.sample(range(FIRST_ID, FIRST_ID + args.products * ID_SPREAD), args.products)
+    print(f"{args.products} crawled products, {args.lookups} lookups per case")
+
+    # The strings are most of the cost, so they are built inside the measurement
+    url_set, set_bytes, set_seconds = measure(
+        lambda: {product_url(product_id) for product_id in ids}
+    )
+
+    path = os.path.join(tempfile.mkdtemp(), id_index.ID_INDEX)
+    start = time.perf_counter()
+    id_index.write(ids, path)
+    write_seconds = time.perf_counter() - start
+    file_bytes = os.path.getsize(path)
+    index, index_bytes, open_seconds = measure(lambda: id_index.IdIndex(path))
+    id_set = id_index.IdSet(index)
+
+    # Half already crawled, half new, as in an incremental run
+    hits = [product_url(product_id) for product_id in rng.sample(ids, args.lookups // 2)]
+    misses = [
+        product_url(FIRST_ID + args.products * ID_SPREAD + n)
+        for n in range(args.lookups - len(hits))
+    ]
+    lookups = hits + misses
+    rng.shuffle(lookups)
+    if [url in url_set for url in lookups] != [url in id_set for url in lookups]:
+        print("WARNING: the index and the URL set disagree")
+
+    cases = [
+        ("set of URL strings", set_bytes, set_seconds, url_set.__contains__),
+        (
+            "mmapped id index",
+            index_bytes + file_bytes,
+            write_seconds + open_seconds,
+            id_set.__contains__,
+        ),
+    ]
+    for name, size, seconds, contains in cases:
+        per_lookup = time_lookups(contains, lookups, args.repeat)
+        print(
+            f"  {name}: {size / 2**20:.1f} MiB, built in {seconds:.2f}s, "
+            f"{per_lookup * 1e9:.0f} ns/lookup"
+        )
+    print(
+        f"  index file {file_bytes / 2**20:.1f} MiB, shared between workers; "
+        f"private heap {index_bytes / 2**10:.0f} KiB"
+    )
+    index.close()
+    os.remove(path)
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(
+        description="Compare memory and lookup cost of the product id index "
+        "against a set of product URLs"
+    )
+    parser.add_argument("--products", type=int, default=1000000)
+    parser.add_argument("--lookups", type=int, default=100000)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--seed", type=int, default=0)
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    run(parse_args())
@@ -0,0 +1,99 @@
+import argparse
+import statistics
+import time
+
+from bs4 import BeautifulSoup
+
+import bench_server
+import get_link
+import html_parse
+
+LEGACY = "bs4 html.parser (legacy)"
+
+
+def legacy_parse_listing(html, base_url):
+    # The listing parse as it was before html_parse: BeautifulSoup with
+    # html.parser and find/find_all
+    soup = BeautifulSoup(html, "html.parser")
+    goodlist = soup.find("ul", class_="goodlist")
+    if not goodlist:
+        return None
+    product_urls = []
+    for item in goodlist.find_all("li"):
+        a_tag = item.find("a", attrs={"data-spm": "0000001WJ"})
+        if a_tag and "href" in a_tag.attrs:
+            product_url = a_tag["href"]
+            if not product_url.startswith("http"):
+                product_url = base_url + product_url
+            product_urls.append(product_url)
+    return product_urls
+
+
+def listing_html(items, fixture=None):
+    if fixture:
+        with open(fixture, encoding="utf-8") as f:
+            return f.read()
+    site = bench_server.BenchSite(
+        categories=1, products_per_category=items, page_size=items
+    )
+    return site.listing(0)
+
+
+def time_parse(func, html, repeat):
+    samples = []
+    result = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func(html)
+        samples.append(time.perf_counter() - start)
+    return result, samples
+
+
+def run(args):
+    html = listing_html(args.items, args.fixture)
+    base_url = get_link.BASE_URL
+    cases = {LEGACY: lambda page: legacy_parse_listing(page, base_url)}
+    for backend in html_parse.available_backends():
+        cases[backend] = lambda page, backend=backend: get_link.parse_listing(
+            html_parse.parse(page, backend), base_url
+        )
+
+    print(
+        f"Listing page: {len(html) / 1024:.0f} KiB, {args.repeat} parses per backend"
+    )
+    expected = None
+    legacy_ms = None
+    for name, func in cases.items():
+        links, samples = time_parse(func, html, args.repeat)
+        if expected is None:
+            expected = links
+        elif links != expected:
+            print(f"  {name}: WARNING results differ from {LEGACY}")
+        median_ms = statistics.median(samples) * 1000
+        legacy_ms = legacy_ms or median_ms
+        print(
+            f"  {name}: median {median_ms:.2f} ms, min {min(samples) * 1000:.2f} ms, "
+            f"{1000 / median_ms:.0f} pages/s, {legacy_ms / median_ms:.1f}x, "
+            f"{len(links or [])} links"
+        )
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(
+        description="Micro-benchmark listing page parsing per HTML parser backend"
+    )
+    parser.add_argument(
+        "--items", type=int, default=500, help="Products on the synthetic listing page"
+    )
+    parser.add_argument(
+        "--fixture",
+        metavar="FILE",
+        default=None,
+        help="Parse a recorded listing page instead of a synthetic one",
+    )
+    parser.add_argument("--repeat", type=int, default=50)
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    run(parse_args())
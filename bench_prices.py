@@ -0,0 +1,150 @@
+import argparse
+import ast
+import itertools
+import os
+import random
+import statistics
+import tempfile
+import time
+
+import pandas as pd
+
+import price_history
+
+BASE_URL = "https://sea.banggood.com"
+FIRST_ID = 1000000
+# Option counts per product, roughly as crawled: many without options
+OPTION_COUNTS = [0, 0, 1, 2, 3, 4, 6, 8]
+# Names with an apostrophe are written in double quotes by str()
+OPTION_NAMES = ["Red", "Blue", "Black", "White", "Kid's Green", "Gray / EU Plug"]
+LEGACY = "ast.literal_eval per row (legacy)"
+
+
+def details_frame(products, seed):
+    rng = random.Random(seed)
+    rows = []
+    for n in range(products):
+        product_id = FIRST_ID + n * 7
+        base = rng.randint(100, 20000) / 100
+        options = [
+            {
+                "option_name": f"{OPTION_NAMES[i % len(OPTION_NAMES)]} {i}",
+                "price": f"US${base + i:,.2f}",
+                "stock": str(rng.randint(0, 500)),
+            }
+            for i in range(rng.choice(OPTION_COUNTS))
+        ]
+        rows.append(
+            {
+                "product_url": f"{BASE_URL}/Bench-Product-{product_id}-p-{product_id}.html",
+                "product_id": str(product_id),
+                "price": f"US${base:,.2f}" if rng.random() > 0.02 else "Price not found",
+                "option_details": str(options),
+            }
+        )
+    return pd.DataFrame(rows)
+
+
+def legacy_options(details):
+    # The row by row parse every analysis used to do
+    rows = []
+    for row, value in details.items():
+        for position, option in enumerate(ast.literal_eval(value)):
+            rows.append(
+                (row, position, option["option_name"], option["price"], option["stock"])
+            )
+    return rows
+
+
+def fast_path():
+    try:
+        import pyarrow  # noqa: F401
+    except ImportError:
+        return "pandas str.split"
+    return "pyarrow split_pattern"
+
+
+def timed(func, repeat):
+    samples = []
+    result = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func()
+        samples.append(time.perf_counter() - start)
+    return result, statistics.median(samples)
+
+
+def run(args):
+    products = details_frame(args.products, args.seed)
+    print(
+        f"{args.products} products, pandas {pd.__version__}, {fast_path()}, "
+        f"median of {args.repeat}"
+    )
+
+    if args.csv:
+        path = os.path.join(tempfile.mkdtemp(), price_history.DETAILS_CSV)
+        products.to_csv(path, index=False)
+        products, seconds = timed(
+            lambda: pd.concat(price_history.iter_products(path)), args.repeat
+        )
+        print(f"  read_csv: {seconds:.2f}s, {os.path.getsize(path) / 2**20:.0f} MiB")
+        os.remove(path)
+
+    options, explode_seconds = timed(
+        lambda: price_history.explode_options(products), args.repeat
+    )
+    table, table_seconds = timed(lambda: price_history.price_table(products), args.repeat)
+    print(
+        f"  explode_options: {explode_seconds:.2f}s, {len(options)} options, "
+        f"{len(options) / explode_seconds / 1e6:.2f}M options/s"
+    )
+    print(
+        f"  price_table: {table_seconds:.2f}s, {len(table)} price rows, "
+        f"{len(table) / table_seconds / 1e6:.2f}M rows/s"
+    )
+
+    # First run into an empty history: every price row is appended
+    directory = tempfile.mkdtemp()
+    paths = (os.path.join(directory, f"history-{n}.db") for n in itertools.count())
+
+    def append():
+        conn = price_history.open_history(next(paths))
+        try:
+            return price_history.append_history(conn, table, time.time())
+        finally:
+            conn.close()
+
+    appended, append_seconds = timed(append, args.repeat)
+    print(
+        f"  append_history: {append_seconds:.2f}s, {appended} rows, "
+        f"{appended / append_seconds / 1e6:.2f}M rows/s into SQLite"
+    )
+
+    # The legacy parse is too slow for the whole frame, so it gets a sample
+    sample = products["option_details"].iloc[: args.legacy_rows]
+    expected, legacy_seconds = timed(lambda: legacy_options(sample), 1)
+    got = price_history.explode_options(products.iloc[: args.legacy_rows])
+    if sorted(expected) != sorted(got.itertuples(name=None)):
+        print("  WARNING: explode_options and the legacy parse disagree")
+    print(
+        f"  {LEGACY}: {len(expected) / legacy_seconds / 1e6:.2f}M options/s, "
+        f"{legacy_seconds / len(sample) * args.products:.1f}s for {args.products} products"
+    )
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(
+        description="Time the vectorized option_details parse and price table"
+    )
+    parser.add_argument("--products", type=int, default=1000000)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--legacy-rows", type=int, default=100000)
+    parser.add_argument(
+        "--csv", action="store_true", help="also time reading the rows from a CSV"
+    )
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    run(parse_args())
@@ -0,0 +1,361 @@
+import argparse
+import json
+import os
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+
+# Hosts in recorded pages are rewritten to the local server so that links
+# followed by the crawlers stay offline
+RECORDED_HOSTS = ["https://www.banggood.com", "https://sea.banggood.com"]
+
+LISTING_RE = re.compile(r"^/c/(\d+)\.html$")
+PRODUCT_RE = re.compile(r"-p-(\d+)\.html$")
+
+COLORS = [("11", "Red"), ("12", "Blue"), ("13", "Black")]
+SIZES = [("21", "S"), ("22", "M"), ("23", "L")]
+ACTIVE = ' class="active"'
+
+# 1x1 transparent GIF for gallery images
+PIXEL = (
+    b"GIF89a\x01\x00\x01\x00\x80\x00\x00\x00\x00\x00\xff\xff\xff!\xf9\x04\x01"
+    b"\x00\x00\x00\x00,\x00\x00\x00\x00\x01\x00\x01\x00\x00\x02\x02D\x01\x00;"
+)
+
+HOME_TEMPLATE = """<!DOCTYPE html>
+<html><head><title>Banggood stand-in</title>
+<style>
+ul.nav-menu-list {{ list-style: none; width: 200px; }}
+li.nav-menu-item {{ position: relative; height: 40px; }}
+div.submenu {{ display: none; position: absolute; left: 200px; top: 0; width: 400px; }}
+li.nav-menu-item:hover div.submenu {{ display: block; }}
+</style></head>
+<body><ul class="nav-menu-list">{items}</ul></body></html>
+"""
+
+LISTING_TEMPLATE = """<!DOCTYPE html>
+<html><head><title>{name}</title>
+<style>ul.goodlist > li {{ height: 300px; }}</style></head>
+<body><h1>{name}</h1>
+<ul class="goodlist">{items}</ul>
+{pagination}
+<script>
+var pending = {pending};
+var loading = false;
+window.addEventListener("scroll", function () {{
+  if (loading || !pending.length) return;
+  if (window.innerHeight + window.scrollY < document.body.scrollHeight - 50) return;
+  loading = true;
+  setTimeout(function () {{
+    var list = document.querySelector("ul.goodlist");
+    pending.splice(0, {batch}).forEach(function (html) {{
+      list.insertAdjacentHTML("beforeend", html);
+    }});
+    loading = false;
+  }}, {delay_ms});
+}});
+</script></body></html>
+"""
+
+PRODUCT_TEMPLATE = """<!DOCTYPE html>
+<html><head><title>{title}</title></head>
+<body>
+<h1 class="product-title"><span class="product-title-text">{title}</span></h1>
+<span class="main-price" data-base="{base_price}">US${base_price}</span>
+{blocks}
+<div data-spm="0000000Cr" class="pcs">Stock: <em>{base_stock}</em></div>
+<div class="product-warehouse"><div class="block-title"><span class="text-name">Ship From</span></div>
+<a data-warehouse="CN" class="active" href="javascript:;">CN</a>
+<a data-warehouse="US" href="javascript:;">US</a></div>
+<ul data-spm="0000000W4" class="list cf">{images}</ul>
+<div class="tab-nav"><a class="tab-nav-item active" href="javascript:;">Description</a></div>
+<div data-spm="0000000UL" class="tab-cnt" style="margin-top: 1500px;">
+<div class="product-description-main-box" style="max-height: 200px; overflow: hidden;">{description}</div>
+<a class="product-description-main-more" href="javascript:;">More</a>
+</div>
+{state}
+<script>
+function selected() {{
+  var price = parseFloat(document.querySelector("span.main-price").getAttribute("data-base"));
+  var stock = {base_stock};
+  document.querySelectorAll("div.product-block a.imgtag.active").forEach(function (a) {{
+    price += parseFloat(a.getAttribute("data-price-delta"));
+    stock -= parseInt(a.getAttribute("data-stock-delta"), 10);
+  }});
+  return {{price: price, stock: stock}};
+}}
+document.querySelectorAll("div.product-block a.imgtag").forEach(function (option) {{
+  option.addEventListener("click", function () {{
+    option.parentNode.querySelectorAll("a.imgtag").forEach(function (a) {{
+      a.classList.remove("active");
+    }});
+    option.classList.add("active");
+    var sku = selected();
+    document.querySelector("span.main-price").textContent = "US$" + sku.price.toFixed(2);
+    document.querySelector("div.pcs em").textContent = sku.stock;
+  }});
+}});
+document.querySelector("a.product-description-main-more").addEventListener("click", function () {{
+  document.querySelector("div.product-description-main-box").style.maxHeight = "none";
+}});
+</script>
+</body></html>
+"""
+
+
+class BenchSite:
+    # Deterministic synthetic catalogue matching the selectors the crawlers use.
+    # Even product ids embed their SKU table in the page state; odd ids only
+    # expose it through option clicks, so both crawl_product paths are exercised
+    def __init__(
+        self,
+        categories=8,
+        products_per_category=40,
+        scroll_batch=8,
+        delay_ms=150,
+        latency=0.0,
+        fixtures=None,
+        page_size=20,
+    ):
+        self.categories = categories
+        self.products_per_category = products_per_category
+        self.scroll_batch = scroll_batch
+        self.delay_ms = delay_ms
+        self.latency = latency
+        self.fixtures = fixtures
+        # Listings are split into fully rendered ?page=N pages like the real
+        # site; page_size=0 serves one page that loads more items on scroll
+        self.page_size = page_size
+        self.base_url = None
+
+    def product_id(self, category, index):
+        return 1000000 + category * 1000 + index
+
+    def category_url(self, category):
+        return f"{self.base_url}/c/{category}.html"
+
+    def product_url(self, category, index):
+        product_id = self.product_id(category, index)
+        return f"{self.base_url}/Bench-Product-{product_id}-p-{product_id}.html"
+
+    def home(self):
+        items = []
+        per_lv1 = 4
+        for lv1 in range(0, self.categories, per_lv1):
+            dls = []
+            for lv2 in range(lv1, min(lv1 + per_lv1, self.categories), 2):
+                dds = "".join(
+                    f'<dd><a href="/c/{c}.html">Category {c}</a></dd>'
+                    for c in range(lv2, min(lv2 + 2, self.categories))
+                )
+                dls.append(
+                    f'<dl class="submenu-dl"><dt><a href="javascript:;">Group {lv2 // 2}</a></dt>{dds}</dl>'
+                )
+            items.append(
+                '<li class="nav-menu-item">'
+                f'<a class="nav-menu-link" href="javascript:;">Department {lv1 // per_lv1}</a>'
+                f'<div class="submenu">{"".join(dls)}</div></li>'
+            )
+        return HOME_TEMPLATE.format(items="".join(items))
+
+    def page_count(self):
+        if not self.page_size:
+            return 1
+        return max(1, -(-self.products_per_category // self.page_size))
+
+    def listing(self, category, page=1):
+        pages = self.page_count()
+        if page < 1 or page > pages:
+            return None
+        if self.page_size:
+            start = (page - 1) * self.page_size
+            indexes = range(start, min(start + self.page_size, self.products_per_category))
+        else:
+            indexes = range(self.products_per_category)
+        items = []
+        for index in indexes:
+            product_id = self.product_id(category, index)
+            items.append(
+                f'<li><a data-spm="0000001WJ" href="/Bench-Product-{product_id}-p-{product_id}.html">'
+                f"Bench Product {product_id}</a></li>"
+            )
+        first = len(items) if self.page_size else self.scroll_batch
+        links = "".join(
+            f'<a href="/c/{category}.html?page={n}"{ACTIVE if n == page else ""}>{n}</a>'
+            for n in range(1, pages + 1)
+        )
+        return LISTING_TEMPLATE.format(
+            name=f"Category {category}",
+            items="".join(items[:first]),
+            pagination=f'<div class="page-box">{links}</div>' if pages > 1 else "",
+            pending=json.dumps(items[first:]),
+            batch=self.scroll_batch,
+            delay_ms=self.delay_ms,
+        )
+
+    def product(self, product_id):
+        base_price = 10 + product_id % 90
+        base_stock = 100 + product_id % 50
+        blocks = []
+        for name, values in [("Color", COLORS), ("Size", SIZES)]:
+            options = "".join(
+                f'<a class="imgtag{" active" if i == 0 else ""}" href="javascript:;" '
+                f'title="{label}" data-value-id="{value_id}" '
+                f'data-price-delta="{i * 1.5}" data-stock-delta="{i * 3}">{label}</a>'
+                for i, (value_id, label) in enumerate(values)
+            )
+            blocks.append(
+                f'<div class="product-block"><div class="block-title"><em>{name}:</em></div>{options}</div>'
+            )
+        images = "".join(
+            f'<li><img data-spm="0000000Wa" src="/img/{product_id}-{n}.gif"></li>'
+            for n in range(6)
+        )
+        description = "".join(
+            f"<p>Bench product {product_id} feature {n}: lorem ipsum dolor sit amet.</p>"
+            for n in range(20)
+        )
+
+        state = ""
+        if product_id % 2 == 0:
+            skus = []
+            for ci, (color_id, _) in enumerate(COLORS):
+                for si, (size_id, _) in enumerate(SIZES):
+                    skus.append(
+                        {
+                            "poa": f"{color_id},{size_id}",
+                            "final_price": f"{base_price + (ci + si) * 1.5:.2f}",
+                            "stock": base_stock - (ci + si) * 3,
+                        }
+                    )
+            attrs = [
+                {"value_id": value_id, "value_name": label}
+                for value_id, label in COLORS + SIZES
+            ]
+            state = (
+                "<script>var productInfo = "
+                + json.dumps({"skus": skus, "attrs": attrs})
+                + ";</script>"
+            )
+
+        return PRODUCT_TEMPLATE.format(
+            title=f"Bench Product {product_id}",
+            base_price=f"{base_price:.2f}",
+            base_stock=base_stock,
+            blocks="".join(blocks),
+            images=images,
+            description=description,
+            state=state,
+        )
+
+    def recorded(self, path):
+        # Recorded pages are looked up by URL path, "/" maps to index.html
+        name = "index.html" if path == "/" else path.lstrip("/")
+        file_path = os.path.join(self.fixtures, name)
+        if not os.path.isfile(file_path):
+            return None
+        with open(file_path, encoding="utf-8") as f:
+            html = f.read()
+        for host in RECORDED_HOSTS:
+            html = html.replace(host, self.base_url)
+        return html
+
+    def render(self, path, page=1):
+        if self.fixtures:
+            html = self.recorded(path)
+            if html is not None:
+                return html
+        if path == "/":
+            return self.home()
+        match = LISTING_RE.match(path)
+        if match:
+            return self.listing(int(match.group(1)), page)
+        match = PRODUCT_RE.search(path)
+        if match:
+            return self.product(int(match.group(1)))
+        return None
+
+
+class BenchHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        site = self.server.site
+        if site.latency:
+            time.sleep(site.latency)
+        url = urlsplit(self.path)
+        path = url.path
+        if path.startswith("/img/"):
+            self._send(200, PIXEL, "image/gif")
+            return
+        try:
+            page = int(parse_qs(url.query).get("page", ["1"])[0])
+        except ValueError:
+            page = 1
+        html = site.render(path, page)
+        if html is None:
+            self._send(404, b"Not found", "text/plain")
+            return
+        self._send(200, html.encode("utf-8"), "text/html; charset=utf-8")
+
+    def _send(self, status, body, content_type):
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def start_server(site, host="127.0.0.1", port=0):
+    # Port 0 picks a free port; the server runs in a daemon thread
+    server = ThreadingHTTPServer((host, port), BenchHandler)
+    server.daemon_threads = True
+    server.site = site
+    site.base_url = f"http://{host}:{server.server_address[1]}"
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    return server
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Local stand-in for Banggood category, listing and product pages"
+    )
+    parser.add_argument("--port", type=int, default=8800)
+    parser.add_argument("--categories", type=int, default=8)
+    parser.add_argument("--products-per-category", type=int, default=40)
+    parser.add_argument(
+        "--page-size", type=int, default=20, help="Products per ?page=N listing page"
+    )
+    parser.add_argument(
+        "--latency", type=float, default=0.0, help="Seconds added to every response"
+    )
+    parser.add_argument(
+        "--fixtures",
+        metavar="DIR",
+        default=None,
+        help="Serve recorded HTML from DIR (by URL path) before synthetic pages",
+    )
+    args = parser.parse_args()
+
+    site = BenchSite(
+        categories=args.categories,
+        products_per_category=args.products_per_category,
+        page_size=args.page_size,
+        latency=args.latency,
+        fixtures=args.fixtures,
+    )
+    server = start_server(site, port=args.port)
+    print(f"Serving stand-in pages on {site.base_url}")
+    try:
+        while True:
+            time.sleep(1)
+    except KeyboardInterrupt:
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
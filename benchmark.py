@@ -0,0 +1,391 @@
+import argparse
+import json
+import os
+import subprocess
+import tempfile
+import time
+from datetime import datetime
+
+import bench_server
+import cate
+import driver_manager
+import get_link
+import http_fetch
+import network_profile
+import product
+import rate_control
+import wait_controller
+
+RESULTS_DIR = "bench_results"
+STAGES = ["categories", "category_tree", "listings", "paged_listings", "products"]
+
+
+class CollectingSink:
+    # Keeps crawled records in memory so the benchmark never touches output files
+    def __init__(self):
+        self.records = []
+
+    def write(self, product_info, description_data=None):
+        self.records.append((product_info, description_data))
+
+    def flush(self):
+        pass
+
+    def close(self):
+        pass
+
+
+def count_commands(driver):
+    # WebElement calls go through driver.execute too, so this sees every round trip
+    counts = {}
+    execute = driver.execute
+
+    def counted(command, params=None):
+        counts[command] = counts.get(command, 0) + 1
+        return execute(command, params)
+
+    driver.execute = counted
+    return counts
+
+
+def percentile(samples, pct):
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * pct / 100))]
+
+
+class StageTimer:
+    def __init__(self, commands):
+        self.commands = commands
+        self.latencies = []
+        self.errors = 0
+        self.started = time.perf_counter()
+        self.commands_before = dict(commands)
+
+    def page(self, func, *args):
+        start = time.perf_counter()
+        try:
+            return func(*args)
+        except Exception as e:
+            print(f"Benchmark page failed: {e}")
+            self.errors += 1
+            return None
+        finally:
+            self.latencies.append(time.perf_counter() - start)
+
+    def result(self):
+        seconds = time.perf_counter() - self.started
+        by_command = {
+            command: count - self.commands_before.get(command, 0)
+            for command, count in self.commands.items()
+            if count != self.commands_before.get(command, 0)
+        }
+        pages = len(self.latencies)
+        total_commands = sum(by_command.values())
+        result = {
+            "pages": pages,
+            "errors": self.errors,
+            "seconds": round(seconds, 3),
+            "pages_per_sec": round(pages / seconds, 3) if seconds else None,
+            "webdriver_commands": total_commands,
+            "commands_per_page": round(total_commands / pages, 2) if pages else None,
+            "commands_by_type": dict(sorted(by_command.items())),
+        }
+        for pct in [50, 90, 99]:
+            result[f"p{pct}_ms"] = (
+                round(percentile(self.latencies, pct) * 1000, 1)
+                if self.latencies
+                else None
+            )
+        return result
+
+
+def bench_categories(driver, commands, site, repeat):
+    timer = StageTimer(commands)
+    with tempfile.TemporaryDirectory() as tmp:
+        filename = os.path.join(tmp, "categories.csv")
+        for _ in range(repeat):
+            if os.path.isfile(filename):
+                os.remove(filename)
+            timer.page(cate.crawl_categories, driver, site.base_url + "/", filename)
+    return timer.result()
+
+
+def bench_category_tree(driver, commands, site, repeat):
+    # The served menu is complete, so this normally never touches the browser
+    timer = StageTimer(commands)
+    drivers = driver_manager.DriverManager(lambda: driver)
+    with tempfile.TemporaryDirectory() as tmp:
+        filename = os.path.join(tmp, "categories.csv")
+        cache_path = os.path.join(tmp, "tree.json")
+        for _ in range(repeat):
+            if os.path.isfile(filename):
+                os.remove(filename)
+            timer.page(
+                cate.crawl_category_tree,
+                drivers,
+                site.base_url + "/",
+                filename,
+                None,
+                cache_path,
+                0,
+            )
+    return timer.result()
+
+
+def bench_listings(driver, commands, site, max_products):
+    timer = StageTimer(commands)
+    waits = wait_controller.WaitController()
+    links = []
+    for category in range(site.categories):
+        row = {"lv3_href": site.category_url(category), "lv3": f"Category {category}"}
+        found = timer.page(
+            get_link.scrape_products, driver, row, waits, max_products, site.base_url
+        )
+        links.extend(found or [])
+    result = timer.result()
+    result["links"] = len(links)
+    return result, links
+
+
+def bench_paged_listings(site, max_products, concurrency):
+    # HTTP only, so no WebDriver commands are counted for this stage
+    timer = StageTimer({})
+    session = http_fetch.create_session(pool_size=concurrency)
+    links = []
+    try:
+        for category in range(site.categories):
+            row = {"lv3_href": site.category_url(category), "lv3": f"Category {category}"}
+            found = timer.page(
+                get_link.crawl_category_pages,
+                session,
+                row,
+                max_products,
+                concurrency,
+                site.base_url,
+            )
+            links.extend(found or [])
+    finally:
+        session.close()
+    result = timer.result()
+    result["links"] = len(links)
+    return result
+
+
+def bench_products(driver, commands, links, limit):
+    timer = StageTimer(commands)
+    waits = wait_controller.WaitController()
+    sink = CollectingSink()
+    for link in links[:limit]:
+        timer.page(
+            product.crawl_product,
+            driver,
+            link["product_url"],
+            link["lv3"],
+            link["lv3_href"],
+            sink,
+            waits,
+        )
+    result = timer.result()
+    result["records"] = len(sink.records)
+    result["options"] = sum(len(info["option_details"]) for info, _ in sink.records)
+    return result
+
+
+def git_revision():
+    try:
+        sha = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout.strip()
+        dirty = bool(
+            subprocess.run(
+                ["git", "status", "--porcelain", "--untracked-files=no"],
+                capture_output=True,
+                text=True,
+                check=True,
+            ).stdout.strip()
+        )
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown", False
+    return sha, dirty
+
+
+def run(args):
+    site = bench_server.BenchSite(
+        categories=args.categories,
+        products_per_category=args.products_per_category,
+        page_size=args.page_size,
+        latency=args.latency,
+        fixtures=args.fixtures,
+    )
+    server = bench_server.start_server(site)
+    print(f"Stand-in server on {site.base_url}")
+    # The stand-in never throttles; measure the crawlers, not the pacing
+    rate_control.configure(
+        start_rate=1000.0,
+        max_rate=1000.0,
+        start_concurrency=args.concurrency,
+        max_concurrency=args.concurrency,
+    )
+
+    driver = product.setup_driver(args.block_profile)
+    commands = count_commands(driver)
+    stages = {}
+    started = time.perf_counter()
+    try:
+        if "categories" in args.stages:
+            stages["categories"] = bench_categories(driver, commands, site, args.repeat)
+        if "category_tree" in args.stages:
+            stages["category_tree"] = bench_category_tree(
+                driver, commands, site, args.repeat
+            )
+        links = []
+        if "listings" in args.stages or "products" in args.stages:
+            listing, links = bench_listings(
+                driver, commands, site, args.products_per_category
+            )
+            if "listings" in args.stages:
+                stages["listings"] = listing
+        if "paged_listings" in args.stages:
+            stages["paged_listings"] = bench_paged_listings(
+                site, args.products_per_category, args.concurrency
+            )
+        if "products" in args.stages:
+            stages["products"] = bench_products(driver, commands, links, args.products)
+    finally:
+        driver.quit()
+        server.shutdown()
+
+    sha, dirty = git_revision()
+    return {
+        "commit": sha,
+        "dirty": dirty,
+        "created_at": datetime.now().isoformat(timespec="seconds"),
+        "total_seconds": round(time.perf_counter() - started, 3),
+        "config": {
+            "categories": args.categories,
+            "products_per_category": args.products_per_category,
+            "page_size": args.page_size,
+            "concurrency": args.concurrency,
+            "products": args.products,
+            "repeat": args.repeat,
+            "latency": args.latency,
+            "block_profile": args.block_profile,
+            "fixtures": args.fixtures,
+        },
+        "stages": stages,
+    }
+
+
+def save(results, directory=RESULTS_DIR):
+    os.makedirs(directory, exist_ok=True)
+    suffix = "-dirty" if results["dirty"] else ""
+    stamp = results["created_at"].replace(":", "").replace("-", "")
+    path = os.path.join(directory, f"{results['commit']}{suffix}-{stamp}.json")
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(results, f, indent=2)
+    return path
+
+
+def report(results):
+    print(f"\nBenchmark at {results['commit']}{' (dirty)' if results['dirty'] else ''}")
+    for stage, stats in results["stages"].items():
+        print(
+            f"  {stage}: {stats['pages']} pages, {stats['pages_per_sec']} pages/s, "
+            f"p50 {stats['p50_ms']} ms, p90 {stats['p90_ms']} ms, p99 {stats['p99_ms']} ms, "
+            f"{stats['commands_per_page']} WebDriver commands/page, {stats['errors']} errors"
+        )
+
+
+COMPARED_METRICS = [
+    "pages_per_sec",
+    "p50_ms",
+    "p90_ms",
+    "p99_ms",
+    "commands_per_page",
+    "errors",
+]
+
+
+def compare(old_path, new_path):
+    with open(old_path, encoding="utf-8") as f:
+        old = json.load(f)
+    with open(new_path, encoding="utf-8") as f:
+        new = json.load(f)
+    print(f"{old['commit']} ({old['created_at']}) -> {new['commit']} ({new['created_at']})")
+    if old["config"] != new["config"]:
+        print("Warning: benchmark configurations differ")
+    for stage in STAGES:
+        if stage not in old["stages"] or stage not in new["stages"]:
+            continue
+        print(f"  {stage}:")
+        for metric in COMPARED_METRICS:
+            before = old["stages"][stage].get(metric)
+            after = new["stages"][stage].get(metric)
+            if before is None or after is None:
+                continue
+            change = f"{(after - before) / before * 100:+.1f}%" if before else "n/a"
+            print(f"    {metric}: {before} -> {after} ({change})")
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(
+        description="Benchmark the crawlers offline against a local stand-in server"
+    )
+    parser.add_argument(
+        "--compare",
+        nargs=2,
+        metavar=("OLD", "NEW"),
+        help="Diff two saved result files instead of running the benchmark",
+    )
+    parser.add_argument("--stages", nargs="+", choices=STAGES, default=STAGES)
+    parser.add_argument("--categories", type=int, default=8)
+    parser.add_argument("--products-per-category", type=int, default=40)
+    parser.add_argument(
+        "--page-size", type=int, default=20, help="Products per listing page"
+    )
+    parser.add_argument(
+        "--concurrency",
+        type=int,
+        default=get_link.CONCURRENCY,
+        help="Listing pages fetched in parallel by the paged listing crawl",
+    )
+    parser.add_argument(
+        "--products", type=int, default=50, help="Product pages crawled in total"
+    )
+    parser.add_argument(
+        "--repeat", type=int, default=3, help="Runs of the category menu crawl"
+    )
+    parser.add_argument(
+        "--latency", type=float, default=0.0, help="Seconds added to every response"
+    )
+    parser.add_argument(
+        "--block-profile",
+        choices=sorted(network_profile.PROFILES),
+        default="default",
+    )
+    parser.add_argument(
+        "--fixtures",
+        metavar="DIR",
+        default=None,
+        help="Serve recorded HTML from DIR instead of synthetic pages where present",
+    )
+    parser.add_argument("--out-dir", default=RESULTS_DIR)
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    if args.compare:
+        compare(*args.compare)
+        return
+    results = run(args)
+    report(results)
+    path = save(results, args.out_dir)
+    print(f"Results saved to '{path}'")
+
+
+if __name__ == "__main__":
+    main()
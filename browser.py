@@ -0,0 +1,82 @@
+import json
+import os
+import time
+
+# Resolving chromedriver with webdriver_manager costs a version lookup on
+# every run; the resolved path is cached here and re-resolved after a week
+# or when the cached driver no longer starts
+DRIVER_CACHE = "banggood_driver_cache.json"
+DRIVER_CACHE_TTL = 7 * 24 * 3600
+CHROMEDRIVER_ENV = "CHROMEDRIVER"
+# host:port of a Chrome started with --remote-debugging-port
+DEBUGGER_ENV = "BANGGOOD_CHROME_DEBUGGER"
+
+
+def _cached_path(cache_path):
+    try:
+        with open(cache_path, encoding="utf-8") as f:
+            cached = json.load(f)
+    except (OSError, ValueError):
+        return None
+    path = cached.get("path")
+    if not path or not os.path.isfile(path):
+        return None
+    if time.time() - cached.get("resolved_at", 0) > DRIVER_CACHE_TTL:
+        return None
+    return path
+
+
+def driver_path(cache_path=DRIVER_CACHE, refresh=False):
+    explicit = os.environ.get(CHROMEDRIVER_ENV)
+    if explicit:
+        return explicit
+    if not refresh:
+        path = _cached_path(cache_path)
+        if path:
+            return path
+    from webdriver_manager.chrome import ChromeDriverManager
+
+    start = time.perf_counter()
+    path = ChromeDriverManager().install()
+    print(f"Resolved chromedriver in {time.perf_counter() - start:.1f}s: {path}")
+    tmp_path = cache_path + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump({"path": path, "resolved_at": time.time()}, f)
+    os.replace(tmp_path, cache_path)
+    return path
+
+
+def debugger_address(attach=None):
+    return attach or os.environ.get(DEBUGGER_ENV) or None
+
+
+def create_driver(options, attach=None):
+    # Starts Chrome with the given options, or attaches to an already running
+    # debug-port Chrome when attach (or $BANGGOOD_CHROME_DEBUGGER) is set
+    from selenium import webdriver
+    from selenium.common.exceptions import SessionNotCreatedException
+    from selenium.webdriver.chrome.options import Options
+    from selenium.webdriver.chrome.service import Service
+
+    address = debugger_address(attach)
+    if address:
+        # Launch flags do not apply to a running browser and chromedriver
+        # rejects some of them, so only the page load strategy carries over
+        attached = Options()
+        attached.debugger_address = address
+        attached.page_load_strategy = options.page_load_strategy
+        options = attached
+
+    try:
+        driver = webdriver.Chrome(service=Service(driver_path()), options=options)
+    except SessionNotCreatedException:
+        if os.environ.get(CHROMEDRIVER_ENV):
+            raise
+        # Chrome was probably updated past the cached driver
+        print("Cached chromedriver failed to start, resolving it again")
+        driver = webdriver.Chrome(
+            service=Service(driver_path(refresh=True)), options=options
+        )
+    if address:
+        print(f"Attached to Chrome at {address}")
+    return driver
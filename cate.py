@@ -1,19 +1,21 @@
-from selenium import webdriver
-from selenium.webdriver.chrome.service import Service
-from selenium.webdriver.common.by import By
-from selenium.webdriver.chrome.options import Options
-from selenium.webdriver.support.ui import WebDriverWait
-from selenium.webdriver.support import expected_conditions as EC
-from webdriver_manager.chrome import ChromeDriverManager
-import time
+import argparse
 import csv
 import os
 import psutil
+import browser
+import category_tree
+import crawl_state
+import http_fetch
+import network_profile
+import wait_controller
+import driver_manager
+import metrics
 
 
 def cleanup_chromedriver():
-    for proc in psutil.process_iter(["name"]):
-        if proc.info["name"] in ["chromedriver.exe", "chromedriver"]:
+    # Only chromedriver processes started by this crawler, never other crawlers'
+    for proc in psutil.Process().children(recursive=True):
+        if proc.name() in ["chromedriver.exe", "chromedriver"]:
             try:
                 proc.kill()
                 print(f"Killed existing chromedriver process: {proc.pid}")
@@ -21,7 +23,9 @@ def cleanup_chromedriver():
                 pass
 
 
-def setup_driver():
+def setup_driver(block_profile="default", attach=None):
+    from selenium.webdriver.chrome.options import Options
+
     chrome_options = Options()
     chrome_options.add_argument(
         "user-agent=Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36"
@@ -30,11 +34,11 @@ def setup_driver():
     chrome_options.add_experimental_option("excludeSwitches", ["enable-automation"])
     chrome_options.add_argument("--start-maximized")  # Open browser in full-screen
     # chrome_options.add_argument("--headless")  # Uncomment to run headless
+    network_profile.apply_options(chrome_options, block_profile)
     try:
         cleanup_chromedriver()
-        driver = webdriver.Chrome(
-            service=Service(ChromeDriverManager().install()), options=chrome_options
-        )
+        driver = browser.create_driver(chrome_options, attach)
+        network_profile.apply_blocking(driver, block_profile)
         print("Chrome driver initialized successfully!")
         return driver
     except Exception as e:
@@ -56,20 +60,85 @@ def get_crawled_urls(filename):
     return crawled_urls
 
 
-def crawl_categories(driver, url, filename="banggood_categories.csv"):
-    driver.get(url)
-    time.sleep(5)
+def submenu_loaded(lv1_item):
+    # Ready when the hovered item's submenu is shown and has its lv2 blocks
+    from selenium.webdriver.common.by import By
 
-    all_category_data = []
-    crawled_urls = get_crawled_urls(filename)
+    def condition(driver):
+        submenu = lv1_item.find_element(By.CSS_SELECTOR, "div.submenu")
+        if submenu.is_displayed() and submenu.find_elements(
+            By.CSS_SELECTOR, "dl.submenu-dl"
+        ):
+            return submenu
+        return False
+
+    return condition
+
+
+def known_categories(filename, state=None):
+    if state is not None:
+        if crawl_state.count(state, crawl_state.CATEGORY) == 0:
+            crawl_state.import_csv(
+                state,
+                crawl_state.CATEGORY,
+                filename,
+                "lv3_href",
+                data_columns=["lv1", "lv2", "lv3"],
+            )
+        crawled_urls = crawl_state.UrlSet(state, crawl_state.CATEGORY)
+    else:
+        crawled_urls = get_crawled_urls(filename)
     print(f"Found {len(crawled_urls)} already crawled category URLs")
+    return crawled_urls
+
+
+def save_categories(filename, state, all_category_data):
+    if all_category_data:
+        fieldnames = ["lv1", "lv2", "lv3", "lv3_href"]
+        write_header = not os.path.isfile(filename)
+        with open(filename, mode="a", newline="", encoding="utf-8") as csvfile:
+            writer = csv.DictWriter(csvfile, fieldnames=fieldnames)
+            if write_header:
+                writer.writeheader()
+            writer.writerows(all_category_data)
+        print(f"Saved {len(all_category_data)} new categories to {filename}")
+        if state is not None:
+            crawl_state.add_urls(
+                state,
+                crawl_state.CATEGORY,
+                (
+                    (
+                        category["lv3_href"],
+                        {key: category[key] for key in ["lv1", "lv2", "lv3"]},
+                    )
+                    for category in all_category_data
+                ),
+            )
+    else:
+        print("No new categories to save")
+
+
+def crawl_categories(driver, url, filename="banggood_categories.csv", state=None):
+    from selenium import webdriver
+    from selenium.webdriver.common.by import By
+    from selenium.webdriver.support import expected_conditions as EC
+
+    waits = wait_controller.WaitController()
+    with metrics.stage("home:get"):
+        driver.get(url)
+
+    all_category_data = []
+    crawled_urls = known_categories(filename, state)
 
     try:
         # Adjust selector for Banggood's category menu
-        header_category_list = WebDriverWait(driver, 30).until(
+        header_category_list = waits.until(
+            driver,
+            "home:menu",
             EC.presence_of_element_located(
                 (By.CSS_SELECTOR, "ul.nav-menu-list")  # Updated for Banggood
-            )
+            ),
+            timeout=30,
         )
         cate_items = header_category_list.find_elements(
             By.CSS_SELECTOR, "li.nav-menu-item"
@@ -82,14 +151,13 @@ def crawl_categories(driver, url, filename="banggood_categories.csv"):
                 lv1_title = lv1_a_tag.text.strip()
 
                 # Hover over the lv1 item to reveal lv2 and lv3 categories
-                webdriver.ActionChains(driver).move_to_element(lv1_item).perform()
-                time.sleep(2)  # Wait for the dropdown to appear
+                with metrics.stage("home:hover"):
+                    webdriver.ActionChains(driver).move_to_element(lv1_item).perform()
 
                 try:
-                    cate_cnt = WebDriverWait(lv1_item, 5).until(
-                        EC.presence_of_element_located(
-                            (By.CSS_SELECTOR, "div.submenu")  # Updated for Banggood
-                        )
+                    # Wait for the dropdown to appear instead of a fixed sleep
+                    cate_cnt = waits.until(
+                        driver, "home:submenu", submenu_loaded(lv1_item), timeout=5
                     )
                     exclick_dls = cate_cnt.find_elements(
                         By.CSS_SELECTOR, "dl.submenu-dl"
@@ -129,32 +197,123 @@ def crawl_categories(driver, url, filename="banggood_categories.csv"):
     except Exception as e:
         print(f"Error finding header categories: {e}")
 
+    metrics.page_done("categories")
+    metrics.inc("categories_found_total", len(all_category_data))
+
     # Save to CSV
-    if all_category_data:
-        fieldnames = ["lv1", "lv2", "lv3", "lv3_href"]
-        with open(filename, mode="a", newline="", encoding="utf-8") as csvfile:
-            writer = csv.DictWriter(csvfile, fieldnames=fieldnames)
-            if not os.path.isfile(filename):
-                writer.writeheader()
-            writer.writerows(all_category_data)
-        print(f"Saved {len(all_category_data)} new categories to {filename}")
-    else:
-        print("No new categories to save")
+    save_categories(filename, state, all_category_data)
+    waits.report()
+
+
+def fetch_category_tree(drivers, url):
+    # The served HTML first; the browser only if the menu is rendered client-side
+    session = http_fetch.create_session(pool_size=1)
+    try:
+        with metrics.stage("home:fetch"):
+            html = http_fetch.fetch_page(session, url)
+    finally:
+        session.close()
+    tree = category_tree.extract(html, url) if html else category_tree.CategoryTree()
+    if len(tree):
+        return tree
+
+    print("Menu not found in the served HTML, reading the rendered page")
+    from selenium.webdriver.common.by import By
+    from selenium.webdriver.support import expected_conditions as EC
+
+    driver = drivers.get()
+    waits = wait_controller.WaitController()
+    with metrics.stage("home:get"):
+        driver.get(url)
+    waits.until(
+        driver,
+        "home:menu",
+        EC.presence_of_element_located((By.CSS_SELECTOR, "ul.nav-menu-list")),
+        timeout=30,
+    )
+    return category_tree.extract(driver.page_source, url)
+
+
+def crawl_category_tree(
+    drivers,
+    url,
+    filename="banggood_categories.csv",
+    state=None,
+    cache_path=category_tree.TREE_CACHE,
+    ttl=category_tree.DEFAULT_TTL,
+):
+    # One pass over the page source instead of hovering every lv1 item.
+    # Returns None when no menu was found, so the caller can fall back to hovering
+    tree = category_tree.load(cache_path, ttl) if ttl else None
+    if tree is None:
+        tree = fetch_category_tree(drivers, url)
+        if not len(tree):
+            return None
+        category_tree.save(tree, cache_path, url)
+    metrics.page_done("categories")
+
+    new_rows = tree.new_rows(known_categories(filename, state))
+    print(
+        f"Category tree: {len(tree.child_nodes())} LV1, {len(tree)} LV3, "
+        f"{len(new_rows)} new"
+    )
+    metrics.inc("categories_found_total", len(new_rows))
+    save_categories(filename, state, new_rows)
+    return tree
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Crawl the Banggood category menu")
+    parser.add_argument(
+        "--hover",
+        action="store_true",
+        help="Reveal each submenu by hovering instead of reading the whole tree at once",
+    )
+    parser.add_argument(
+        "--tree-cache",
+        default=category_tree.TREE_CACHE,
+        help="JSON file caching the extracted category tree",
+    )
+    parser.add_argument(
+        "--ttl",
+        type=float,
+        default=category_tree.DEFAULT_TTL / 3600,
+        help="Hours a cached category tree is reused; 0 always refetches",
+    )
+    parser.add_argument(
+        "--attach",
+        metavar="HOST:PORT",
+        default=browser.debugger_address(),
+        help="Reuse a Chrome started with --remote-debugging-port instead of "
+        f"launching one (default: ${browser.DEBUGGER_ENV})",
+    )
+    return parser.parse_args()
 
 
 def main():
+    args = parse_args()
     url = "https://www.banggood.com"
     filename = "banggood_categories.csv"
-    driver = None
+    drivers = driver_manager.DriverManager(lambda: setup_driver(attach=args.attach))
+    state = crawl_state.open_state()
+    metrics.enable_from_env("cate")
     try:
-        driver = setup_driver()
-        crawl_categories(driver, url, filename)
+        tree = None
+        if not args.hover:
+            tree = crawl_category_tree(
+                drivers, url, filename, state, args.tree_cache, args.ttl * 3600
+            )
+            if tree is None:
+                print("No category tree found in the page, falling back to hovering")
+        if tree is None:
+            crawl_categories(drivers.get(), url, filename, state)
     except Exception as e:
         print(f"An error occurred in main: {e}")
     finally:
-        if driver:
-            driver.quit()
+        drivers.quit()
+        state.close()
         cleanup_chromedriver()
+        metrics.close()
 
 
 if __name__ == "__main__":
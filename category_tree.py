@@ -0,0 +1,192 @@
+import json
+import os
+import time
+from urllib.parse import urljoin
+
+import html_parse
+import sku_state
+
+TREE_CACHE = "banggood_category_tree.json"
+DEFAULT_TTL = 24 * 3600
+
+# Keys seen in embedded menu data, used when the menu is not in the HTML
+NAME_KEYS = ["name", "title", "cat_name", "text"]
+URL_KEYS = ["url", "link", "href", "cat_url"]
+CHILD_KEYS = ["children", "child", "sub", "subs", "list", "items"]
+
+
+class CategoryTree:
+    # lv1 > lv2 > lv3 menu with parent/child indexes. lv1 and lv2 nodes are
+    # keyed by title under their parent, lv3 nodes by href
+    def __init__(self):
+        self.nodes = []
+        self.children = {None: []}
+        self.by_key = {}
+        self.by_href = {}
+
+    def _node(self, parent, title, href=None):
+        key = (parent, title) if href is None else href
+        node_id = self.by_key.get(key)
+        if node_id is None:
+            node_id = len(self.nodes)
+            level = 1 if parent is None else self.nodes[parent]["level"] + 1
+            self.nodes.append(
+                {"id": node_id, "parent": parent, "level": level, "title": title, "href": href}
+            )
+            self.children[parent].append(node_id)
+            self.children[node_id] = []
+            self.by_key[key] = node_id
+            if href is not None:
+                self.by_href[href] = node_id
+        return node_id
+
+    def add(self, lv1, lv2, lv3, lv3_href):
+        lv1_id = self._node(None, lv1)
+        lv2_id = self._node(lv1_id, lv2)
+        return self._node(lv2_id, lv3, lv3_href)
+
+    def parent(self, node_id):
+        return self.nodes[node_id]["parent"]
+
+    def child_nodes(self, node_id=None):
+        # node_id None gives the lv1 roots
+        return [self.nodes[child] for child in self.children[node_id]]
+
+    def path(self, node_id):
+        titles = []
+        while node_id is not None:
+            titles.append(self.nodes[node_id]["title"])
+            node_id = self.nodes[node_id]["parent"]
+        return titles[::-1]
+
+    def find(self, href):
+        node_id = self.by_href.get(href)
+        return None if node_id is None else self.nodes[node_id]
+
+    def rows(self):
+        # lv3 entries in menu order, as they are stored in the categories CSV
+        for node in self.nodes:
+            if node["level"] == 3:
+                lv1, lv2, lv3 = self.path(node["id"])
+                yield {"lv1": lv1, "lv2": lv2, "lv3": lv3, "lv3_href": node["href"]}
+
+    def new_rows(self, known_hrefs):
+        return [row for row in self.rows() if row["lv3_href"] not in known_hrefs]
+
+    def __len__(self):
+        return len(self.by_href)
+
+    def to_dict(self):
+        return {"nodes": self.nodes}
+
+    @classmethod
+    def from_dict(cls, data):
+        tree = cls()
+        for node in data["nodes"]:
+            tree._node(node["parent"], node["title"], node["href"])
+        return tree
+
+
+def extract_from_html(html, base_url):
+    # Hidden submenus are still in the page source, so one parse gets the
+    # whole menu without hovering over anything
+    tree = CategoryTree()
+    doc = html_parse.parse(html)
+    for lv1_item in doc.select("ul.nav-menu-list li.nav-menu-item"):
+        lv1_a_tag = lv1_item.select_one("a.nav-menu-link")
+        if lv1_a_tag is None:
+            continue
+        lv1_title = lv1_a_tag.text()
+        for lv2_dl in lv1_item.select("div.submenu dl.submenu-dl"):
+            lv2_a_tag = lv2_dl.select_one("dt > a")
+            if lv2_a_tag is None:
+                continue
+            lv2_title = lv2_a_tag.text()
+            for lv3_a_tag in lv2_dl.select("dd > a"):
+                href = lv3_a_tag.get("href")
+                if href and not href.startswith("javascript"):
+                    tree.add(lv1_title, lv2_title, lv3_a_tag.text(), urljoin(base_url, href))
+    return tree
+
+
+def _first_key(record, keys):
+    for key in keys:
+        if key in record and record[key] not in (None, ""):
+            return record[key]
+    return None
+
+
+def _menu_lists(obj):
+    # Every list of named dicts in the embedded data is a candidate lv1 list
+    if isinstance(obj, dict):
+        for value in obj.values():
+            yield from _menu_lists(value)
+    elif isinstance(obj, list):
+        if obj and all(isinstance(item, dict) for item in obj):
+            if all(_first_key(item, NAME_KEYS) is not None for item in obj):
+                yield obj
+        for item in obj:
+            yield from _menu_lists(item)
+
+
+def _add_json_level(tree, items, path, base_url):
+    for item in items:
+        title = str(_first_key(item, NAME_KEYS)).strip()
+        if len(path) == 2:
+            href = _first_key(item, URL_KEYS)
+            if isinstance(href, str) and href:
+                tree.add(path[0], path[1], title, urljoin(base_url, href))
+            continue
+        children = _first_key(item, CHILD_KEYS)
+        if isinstance(children, list):
+            _add_json_level(
+                tree,
+                [child for child in children if isinstance(child, dict)],
+                path + [title],
+                base_url,
+            )
+
+
+def extract_from_json(html, base_url):
+    # The candidate list that yields the most lv3 entries is the menu
+    best = CategoryTree()
+    for blob in sku_state.find_embedded_json(html):
+        for items in _menu_lists(blob):
+            tree = CategoryTree()
+            _add_json_level(tree, items, [], base_url)
+            if len(tree) > len(best):
+                best = tree
+    return best
+
+
+def extract(html, base_url):
+    tree = extract_from_html(html, base_url)
+    if not len(tree):
+        tree = extract_from_json(html, base_url)
+    return tree
+
+
+def save(tree, path=TREE_CACHE, source_url=None):
+    data = dict(tree.to_dict(), fetched_at=time.time(), source_url=source_url)
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(data, f, ensure_ascii=False)
+    os.replace(tmp_path, path)
+
+
+def load(path=TREE_CACHE, ttl=DEFAULT_TTL):
+    # None when there is no cache or it is older than ttl seconds
+    if not os.path.isfile(path):
+        return None
+    try:
+        with open(path, encoding="utf-8") as f:
+            data = json.load(f)
+    except (OSError, ValueError) as e:
+        print(f"Ignoring unreadable category cache {path}: {e}")
+        return None
+    age = time.time() - data.get("fetched_at", 0)
+    if ttl is not None and age > ttl:
+        print(f"Category cache {path} is {age / 3600:.1f}h old, refreshing")
+        return None
+    print(f"Using category cache {path} ({age / 3600:.1f}h old)")
+    return CategoryTree.from_dict(data)
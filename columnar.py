@@ -0,0 +1,221 @@
+import argparse
+import ast
+import os
+import re
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+PRICE_RE = re.compile(r"([^\d\s.,-]*)\s*([\d.,]+)")
+INT_RE = re.compile(r"\d+")
+
+SKU_PROPERTY_TYPE = pa.struct(
+    [
+        ("sku_property", pa.string()),
+        ("sku_values", pa.list_(pa.string())),
+        ("active_value", pa.string()),
+    ]
+)
+OPTION_TYPE = pa.struct(
+    [
+        ("option_name", pa.string()),
+        ("price", pa.string()),
+        ("price_amount", pa.float64()),
+        ("currency", pa.string()),
+        ("stock", pa.string()),
+        ("stock_qty", pa.int64()),
+    ]
+)
+
+PRODUCT_SCHEMA = pa.schema(
+    [
+        ("lv3_title", pa.string()),
+        ("lv3_href", pa.string()),
+        ("product_url", pa.string()),
+        ("product_id", pa.int64()),
+        ("title", pa.string()),
+        ("price", pa.string()),
+        ("price_amount", pa.float64()),
+        ("currency", pa.string()),
+        ("sku_properties", pa.list_(SKU_PROPERTY_TYPE)),
+        ("image_urls", pa.list_(pa.string())),
+        ("option_details", pa.list_(OPTION_TYPE)),
+        ("description_hash", pa.string()),
+    ]
+)
+
+def product_schema(fieldnames=()):
+    # Columns the sink writes beyond the crawled ones (change_type in the
+    # recrawl delta, ...) are appended as plain strings
+    extra = [name for name in fieldnames if name not in PRODUCT_SCHEMA.names]
+    return pa.schema(list(PRODUCT_SCHEMA) + [(name, pa.string()) for name in extra])
+
+
+DESCRIPTION_SCHEMA = pa.schema(
+    [
+        ("product_url", pa.string()),
+        ("product_id", pa.int64()),
+        ("description", pa.string()),
+    ]
+)
+
+ROW_GROUP_SIZE = 5000
+
+
+def parse_price(text):
+    # "US$12.99" -> ("US$", 12.99); anything without digits -> (None, None)
+    if not isinstance(text, str):
+        return None, None
+    match = PRICE_RE.search(text)
+    if not match:
+        return None, None
+    try:
+        amount = float(match.group(2).replace(",", ""))
+    except ValueError:
+        return None, None
+    return match.group(1) or None, amount
+
+
+def parse_int(text):
+    if text is None:
+        return None
+    match = INT_RE.search(str(text))
+    return int(match.group()) if match else None
+
+
+def parse_list(value):
+    # Legacy CSV cells hold str(list); live records already hold lists
+    if isinstance(value, list):
+        return value
+    if not isinstance(value, str) or not value:
+        return []
+    try:
+        parsed = ast.literal_eval(value)
+    except (ValueError, SyntaxError):
+        return []
+    return parsed if isinstance(parsed, list) else []
+
+
+def to_product_record(product):
+    currency, amount = parse_price(product.get("price"))
+    options = []
+    for option in parse_list(product.get("option_details")):
+        option_currency, option_amount = parse_price(option.get("price"))
+        options.append(
+            {
+                "option_name": option.get("option_name"),
+                "price": option.get("price"),
+                "price_amount": option_amount,
+                "currency": option_currency,
+                "stock": option.get("stock"),
+                "stock_qty": parse_int(option.get("stock")),
+            }
+        )
+    return {
+        "lv3_title": product.get("lv3_title"),
+        "lv3_href": product.get("lv3_href"),
+        "product_url": product.get("product_url"),
+        "product_id": parse_int(product.get("product_id")),
+        "title": product.get("title"),
+        "price": product.get("price"),
+        "price_amount": amount,
+        "currency": currency,
+        "sku_properties": [
+            {
+                "sku_property": p.get("sku_property"),
+                "sku_values": [str(v) for v in p.get("sku_values", [])],
+                "active_value": p.get("active_value"),
+            }
+            for p in parse_list(product.get("sku_properties"))
+        ],
+        "image_urls": [str(url) for url in parse_list(product.get("image_urls"))],
+        "option_details": options,
+        "description_hash": product.get("description_hash"),
+    }
+
+
+def to_description_record(description):
+    return {
+        "product_url": description.get("product_url"),
+        "product_id": parse_int(description.get("product_id")),
+        "description": description.get("description"),
+    }
+
+
+def products_table(products, schema=PRODUCT_SCHEMA):
+    extra = [name for name in schema.names if name not in PRODUCT_SCHEMA.names]
+    records = []
+    for product in products:
+        record = to_product_record(product)
+        for name in extra:
+            value = product.get(name)
+            record[name] = None if value is None else str(value)
+        records.append(record)
+    return pa.Table.from_pylist(records, schema=schema)
+
+
+def descriptions_table(descriptions):
+    return pa.Table.from_pylist(
+        [to_description_record(d) for d in descriptions], schema=DESCRIPTION_SCHEMA
+    )
+
+
+def open_writer(path, schema):
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    return pq.ParquetWriter(path, schema, compression="zstd")
+
+
+def _clean(value):
+    return None if pd.isna(value) else value
+
+
+def convert_csv(csv_file, parquet_file, schema, to_table, chunksize=ROW_GROUP_SIZE):
+    # Streams the CSV so memory stays bounded by one row group
+    if not os.path.isfile(csv_file):
+        print(f"Error: File '{csv_file}' not found.")
+        return 0
+    writer = open_writer(parquet_file, schema)
+    converted = 0
+    try:
+        for chunk in pd.read_csv(csv_file, dtype=str, chunksize=chunksize):
+            rows = [
+                {key: _clean(value) for key, value in row.items()}
+                for row in chunk.to_dict("records")
+            ]
+            writer.write_table(to_table(rows))
+            converted += len(rows)
+            print(f"Converted {converted} rows from {csv_file}")
+    finally:
+        writer.close()
+    return converted
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Convert Banggood product CSVs to typed Parquet"
+    )
+    parser.add_argument("--details", default="banggood_product_details.csv")
+    parser.add_argument("--descriptions", default="banggood_product_descriptions.csv")
+    parser.add_argument("--out-dir", default="parquet")
+    parser.add_argument("--row-group-size", type=int, default=ROW_GROUP_SIZE)
+    args = parser.parse_args()
+
+    convert_csv(
+        args.details,
+        os.path.join(args.out_dir, "banggood_product_details.parquet"),
+        PRODUCT_SCHEMA,
+        products_table,
+        args.row_group_size,
+    )
+    convert_csv(
+        args.descriptions,
+        os.path.join(args.out_dir, "banggood_product_descriptions.parquet"),
+        DESCRIPTION_SCHEMA,
+        descriptions_table,
+        args.row_group_size,
+    )
+
+
+if __name__ == "__main__":
+    main()
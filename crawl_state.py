@@ -0,0 +1,175 @@
+import csv
+import json
+import os
+import sqlite3
+import time
+
+STATE_DB = "banggood_crawl_state.db"
+
+CATEGORY = "category"
+LINK = "link"
+PRODUCT = "product"
+
+PENDING = "pending"
+IN_PROGRESS = "in_progress"
+DONE = "done"
+FAILED = "failed"
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS crawl_state (
+    kind TEXT NOT NULL,
+    url TEXT NOT NULL,
+    status TEXT NOT NULL DEFAULT 'pending',
+    attempts INTEGER NOT NULL DEFAULT 0,
+    data TEXT,
+    last_error TEXT,
+    created_at REAL NOT NULL,
+    updated_at REAL NOT NULL,
+    PRIMARY KEY (kind, url)
+);
+CREATE INDEX IF NOT EXISTS idx_crawl_state_status ON crawl_state (kind, status);
+"""
+
+
+def open_state(path=STATE_DB):
+    conn = sqlite3.connect(path, timeout=30)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    conn.executescript(SCHEMA)
+    return conn
+
+
+def count(conn, kind, status=None):
+    if status is None:
+        row = conn.execute(
+            "SELECT COUNT(*) FROM crawl_state WHERE kind = ?", (kind,)
+        ).fetchone()
+    else:
+        row = conn.execute(
+            "SELECT COUNT(*) FROM crawl_state WHERE kind = ? AND status = ?",
+            (kind, status),
+        ).fetchone()
+    return row[0]
+
+
+def has_url(conn, kind, url, status=None):
+    row = conn.execute(
+        "SELECT status FROM crawl_state WHERE kind = ? AND url = ?", (kind, url)
+    ).fetchone()
+    if row is None:
+        return False
+    return status is None or row[0] == status
+
+
+def add_urls(conn, kind, records, status=PENDING):
+    # records: iterable of (url, data dict); existing URLs keep their state
+    now = time.time()
+    cursor = conn.executemany(
+        "INSERT OR IGNORE INTO crawl_state (kind, url, status, data, created_at, updated_at) "
+        "VALUES (?, ?, ?, ?, ?, ?)",
+        (
+            (kind, url, status, json.dumps(data) if data else None, now, now)
+            for url, data in records
+        ),
+    )
+    conn.commit()
+    return cursor.rowcount
+
+
+def mark(conn, kind, url, status, error=None):
+    now = time.time()
+    attempts = 1 if status == IN_PROGRESS else 0
+    conn.execute(
+        "INSERT INTO crawl_state (kind, url, status, attempts, last_error, created_at, updated_at) "
+        "VALUES (?, ?, ?, ?, ?, ?, ?) "
+        "ON CONFLICT (kind, url) DO UPDATE SET status = excluded.status, "
+        "attempts = attempts + excluded.attempts, "
+        "last_error = COALESCE(excluded.last_error, last_error), "
+        "updated_at = excluded.updated_at",
+        (kind, url, status, attempts, error, now, now),
+    )
+    conn.commit()
+
+
+def mark_many(conn, kind, urls, status):
+    now = time.time()
+    conn.executemany(
+        "INSERT INTO crawl_state (kind, url, status, created_at, updated_at) "
+        "VALUES (?, ?, ?, ?, ?) "
+        "ON CONFLICT (kind, url) DO UPDATE SET status = excluded.status, "
+        "updated_at = excluded.updated_at",
+        ((kind, url, status, now, now) for url in urls),
+    )
+    conn.commit()
+
+
+def mark_through(conn, kind, url, status):
+    # Mark every record inserted up to and including url, e.g. to resume by position
+    conn.execute(
+        "UPDATE crawl_state SET status = ?, updated_at = ? WHERE kind = ? AND rowid <= "
+        "(SELECT rowid FROM crawl_state WHERE kind = ? AND url = ?)",
+        (status, time.time(), kind, kind, url),
+    )
+    conn.commit()
+
+
+def iter_urls(conn, kind, status=None, exclude_status=None):
+    query = "SELECT url, data FROM crawl_state WHERE kind = ?"
+    params = [kind]
+    if status is not None:
+        query += " AND status = ?"
+        params.append(status)
+    if exclude_status is not None:
+        query += " AND status != ?"
+        params.append(exclude_status)
+    query += " ORDER BY rowid"
+    for url, data in conn.execute(query, params).fetchall():
+        yield url, json.loads(data) if data else {}
+
+
+def last_record(conn, kind):
+    row = conn.execute(
+        "SELECT url, data FROM crawl_state WHERE kind = ? ORDER BY rowid DESC LIMIT 1",
+        (kind,),
+    ).fetchone()
+    if row is None:
+        return None
+    return row[0], json.loads(row[1]) if row[1] else {}
+
+
+def import_csv(
+    conn, kind, filename, url_column, data_columns=(), status=PENDING, batch_size=10000
+):
+    # One-time migration from the legacy CSV files, streamed in batches
+    if not os.path.isfile(filename):
+        return 0
+    imported = 0
+    batch = []
+    with open(filename, mode="r", newline="", encoding="utf-8") as csvfile:
+        reader = csv.DictReader(csvfile)
+        for row in reader:
+            url = row.get(url_column)
+            if not url:
+                continue
+            batch.append((url, {col: row.get(col, "") for col in data_columns}))
+            if len(batch) >= batch_size:
+                imported += add_urls(conn, kind, batch, status=status)
+                batch = []
+    if batch:
+        imported += add_urls(conn, kind, batch, status=status)
+    print(f"Imported {imported} {kind} records from {filename}")
+    return imported
+
+
+class UrlSet:
+    # Drop-in for the old set of crawled URLs, backed by the primary-key index
+    def __init__(self, conn, kind, status=None):
+        self.conn = conn
+        self.kind = kind
+        self.status = status
+
+    def __contains__(self, url):
+        return has_url(self.conn, self.kind, url, self.status)
+
+    def __len__(self):
+        return count(self.conn, self.kind, self.status)
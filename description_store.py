@@ -0,0 +1,213 @@
+import argparse
+import csv
+import hashlib
+import os
+import sqlite3
+import sys
+import zlib
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+STORE_DIR = "banggood_descriptions"
+
+CODEC_ZLIB = "zlib"
+CODEC_ZSTD = "zstd"
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS blobs (
+    hash TEXT PRIMARY KEY,
+    offset INTEGER NOT NULL,
+    length INTEGER NOT NULL,
+    raw_length INTEGER NOT NULL,
+    codec TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS products (
+    product_id TEXT PRIMARY KEY,
+    product_url TEXT,
+    hash TEXT NOT NULL
+);
+"""
+
+
+class DescriptionStore:
+    # Unique descriptions are appended once to a pack file; the SQLite index
+    # maps hash -> (offset, length) and product_id -> hash for random access
+    def __init__(self, path=STORE_DIR, level=10):
+        os.makedirs(path, exist_ok=True)
+        self.pack_path = os.path.join(path, "blobs.pack")
+        self.conn = sqlite3.connect(os.path.join(path, "index.db"))
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.executescript(SCHEMA)
+        self.pack = open(self.pack_path, "ab")
+        if zstandard is not None:
+            self.codec = CODEC_ZSTD
+            self.compressor = zstandard.ZstdCompressor(level=level)
+        else:
+            print("zstandard not installed, compressing descriptions with zlib")
+            self.codec = CODEC_ZLIB
+            self.compressor = None
+        self.reader = None
+
+    def _compress(self, data):
+        if self.codec == CODEC_ZSTD:
+            return self.compressor.compress(data)
+        return zlib.compress(data, 9)
+
+    def _decompress(self, data, codec):
+        if codec == CODEC_ZSTD:
+            if zstandard is None:
+                raise RuntimeError("Reading zstd blobs requires zstandard")
+            return zstandard.ZstdDecompressor().decompress(data)
+        return zlib.decompress(data)
+
+    def put_many(self, descriptions):
+        # descriptions: dicts with product_url, product_id and description
+        descriptions = list(descriptions)
+        hashes = []
+        new_blobs = []
+        seen = set()
+        for item in descriptions:
+            raw = item["description"].encode("utf-8")
+            digest = hashlib.sha256(raw).hexdigest()
+            hashes.append(digest)
+            if digest in seen:
+                continue
+            seen.add(digest)
+            exists = self.conn.execute(
+                "SELECT 1 FROM blobs WHERE hash = ?", (digest,)
+            ).fetchone()
+            if exists:
+                continue
+            compressed = self._compress(raw)
+            offset = self.pack.tell()
+            self.pack.write(compressed)
+            new_blobs.append((digest, offset, len(compressed), len(raw), self.codec))
+
+        # Blobs must be durable before the index points at them
+        self.pack.flush()
+        os.fsync(self.pack.fileno())
+        with self.conn:
+            self.conn.executemany(
+                "INSERT OR IGNORE INTO blobs VALUES (?, ?, ?, ?, ?)", new_blobs
+            )
+            self.conn.executemany(
+                "INSERT OR REPLACE INTO products VALUES (?, ?, ?)",
+                [
+                    (
+                        str(item["product_id"] or item["product_url"]),
+                        item["product_url"],
+                        digest,
+                    )
+                    for item, digest in zip(descriptions, hashes)
+                ],
+            )
+        return hashes
+
+    def put(self, product_id, product_url, description):
+        return self.put_many(
+            [
+                {
+                    "product_id": product_id,
+                    "product_url": product_url,
+                    "description": description,
+                }
+            ]
+        )[0]
+
+    def get_blob(self, digest):
+        row = self.conn.execute(
+            "SELECT offset, length, codec FROM blobs WHERE hash = ?", (digest,)
+        ).fetchone()
+        if row is None:
+            return None
+        offset, length, codec = row
+        if self.reader is None:
+            self.reader = open(self.pack_path, "rb")
+        self.reader.seek(offset)
+        return self._decompress(self.reader.read(length), codec).decode("utf-8")
+
+    def get(self, product_id):
+        row = self.conn.execute(
+            "SELECT hash FROM products WHERE product_id = ?", (str(product_id),)
+        ).fetchone()
+        return self.get_blob(row[0]) if row else None
+
+    def stats(self):
+        blobs, stored, raw = self.conn.execute(
+            "SELECT COUNT(*), COALESCE(SUM(length), 0), COALESCE(SUM(raw_length), 0) FROM blobs"
+        ).fetchone()
+        products = self.conn.execute("SELECT COUNT(*) FROM products").fetchone()[0]
+        return {
+            "products": products,
+            "unique_blobs": blobs,
+            "stored_bytes": stored,
+            "raw_unique_bytes": raw,
+        }
+
+    def close(self):
+        self.pack.close()
+        if self.reader is not None:
+            self.reader.close()
+        self.conn.close()
+
+
+def import_csv(store, description_csv_file, batch_size=1000):
+    csv.field_size_limit(sys.maxsize)
+    imported = 0
+    batch = []
+    with open(description_csv_file, mode="r", newline="", encoding="utf-8") as csvfile:
+        for row in csv.DictReader(csvfile):
+            if not row.get("product_id") or not row.get("description"):
+                continue
+            batch.append(row)
+            if len(batch) >= batch_size:
+                store.put_many(batch)
+                imported += len(batch)
+                batch = []
+    if batch:
+        store.put_many(batch)
+        imported += len(batch)
+    return imported
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Deduplicated, compressed storage for product descriptions"
+    )
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    import_parser = subparsers.add_parser("import", help="Import a descriptions CSV")
+    import_parser.add_argument(
+        "csv_file", nargs="?", default="banggood_product_descriptions.csv"
+    )
+    get_parser = subparsers.add_parser("get", help="Print one product's description")
+    get_parser.add_argument("product_id")
+    subparsers.add_parser("stats", help="Show deduplication statistics")
+    parser.add_argument("--store", default=STORE_DIR)
+    args = parser.parse_args()
+
+    store = DescriptionStore(args.store)
+    try:
+        if args.command == "import":
+            if not os.path.isfile(args.csv_file):
+                print(f"Error: File '{args.csv_file}' not found.")
+                return
+            imported = import_csv(store, args.csv_file)
+            print(f"Imported {imported} descriptions from {args.csv_file}")
+            print(store.stats())
+        elif args.command == "get":
+            description = store.get(args.product_id)
+            if description is None:
+                print(f"No description stored for product {args.product_id}")
+            else:
+                print(description)
+        else:
+            print(store.stats())
+    finally:
+        store.close()
+
+
+if __name__ == "__main__":
+    main()
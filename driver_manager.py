@@ -0,0 +1,103 @@
+import psutil
+
+
+class DriverManager:
+    # Owns one Chrome at a time: launches it lazily, recycles it after
+    # max_pages or when its process tree grows past max_rss_mb, and only
+    # ever kills processes that this manager started
+    def __init__(self, factory, max_pages=200, max_rss_mb=2048, check_every=10):
+        self.factory = factory
+        self.max_pages = max_pages
+        self.max_rss_mb = max_rss_mb
+        self.check_every = check_every
+        self.driver = None
+        self.pages = 0
+        self.launches = 0
+        self.peak_rss_mb = 0.0
+        self.processes = {}
+
+    def get(self):
+        if self.driver is None:
+            self.driver = self.factory()
+            self.pages = 0
+            self.launches += 1
+            self._track()
+            print(
+                f"Started Chrome #{self.launches} "
+                f"({len(self.processes)} processes tracked)"
+            )
+        return self.driver
+
+    def _root_process(self):
+        service = getattr(self.driver, "service", None)
+        process = getattr(service, "process", None)
+        if process is None:
+            return None
+        try:
+            return psutil.Process(process.pid)
+        except psutil.NoSuchProcess:
+            return None
+
+    def _track(self):
+        # Remember chromedriver and every Chrome process below it
+        root = self._root_process()
+        if root is None:
+            return []
+        try:
+            tree = [root] + root.children(recursive=True)
+        except psutil.NoSuchProcess:
+            tree = [root]
+        for proc in tree:
+            self.processes.setdefault(proc.pid, proc)
+        return tree
+
+    def rss_mb(self):
+        total = 0
+        for proc in self._track():
+            try:
+                total += proc.memory_info().rss
+            except (psutil.NoSuchProcess, psutil.AccessDenied):
+                continue
+        rss = total / (1024 * 1024)
+        self.peak_rss_mb = max(self.peak_rss_mb, rss)
+        return rss
+
+    def page_done(self):
+        self.pages += 1
+        if self.pages >= self.max_pages:
+            print(f"Recycling Chrome after {self.pages} pages")
+            self.quit()
+            return
+        if self.pages % self.check_every == 0:
+            rss = self.rss_mb()
+            if rss > self.max_rss_mb:
+                print(
+                    f"Recycling Chrome: {rss:.0f} MB RSS exceeds {self.max_rss_mb} MB"
+                )
+                self.quit()
+
+    def quit(self):
+        if self.driver is not None:
+            self._track()
+            try:
+                self.driver.quit()
+            except Exception as e:
+                print(f"Error quitting Chrome: {e}")
+            self.driver = None
+        self._kill_leftovers()
+
+    def _kill_leftovers(self):
+        for pid, proc in list(self.processes.items()):
+            try:
+                if proc.is_running() and proc.status() != psutil.STATUS_ZOMBIE:
+                    proc.kill()
+                    print(f"Killed leftover browser process: {pid}")
+            except (psutil.NoSuchProcess, psutil.AccessDenied):
+                pass
+            del self.processes[pid]
+
+    def summary(self):
+        return {
+            "launches": self.launches,
+            "peak_rss_mb": round(self.peak_rss_mb, 1),
+        }
@@ -0,0 +1,179 @@
+import json
+from urllib.parse import urljoin
+
+# Each field is an XPath (or a list of fallback XPaths, first match wins) plus
+# what to read from the matched node: "text", "html" or "@attribute". Fields
+# with "many" return a list, fields with "fields" return nested records.
+NEWBIE_PRICE_XPATH = '//div[@class="product-newbie-price"]//div[@class="newbie-price"]'
+MAIN_PRICE_XPATH = '//span[contains(@class, "main-price")]'
+STOCK_XPATH = '//div[@data-spm="0000000Cr" and contains(@class, "pcs")]//em'
+DESCRIPTION_XPATH = (
+    '//div[@data-spm="0000000UL" and contains(@class, "tab-cnt")]'
+    '//div[contains(@class, "product-description-main-box")]'
+)
+
+PRODUCT_PLAN = {
+    "title": {
+        "xpath": '//h1[@class="product-title"]//span[@class="product-title-text"]',
+        "value": "text",
+    },
+    "price": {"xpath": [NEWBIE_PRICE_XPATH, MAIN_PRICE_XPATH], "value": "text"},
+    "blocks": {
+        "xpath": '//div[contains(@class, "product-block")]',
+        "many": True,
+        "fields": {
+            "name": {
+                "xpath": './/div[contains(@class, "block-title")]//em',
+                "value": "text",
+            },
+            "options": {
+                "xpath": [
+                    './/a[contains(@class, "imgtag")]',
+                    './/a[@href="javascript:;"]',
+                ],
+                "many": True,
+                "fields": {
+                    "title": {"value": "@title"},
+                    "class": {"value": "@class"},
+                },
+            },
+        },
+    },
+    "warehouse": {
+        "xpath": '//div[contains(@class, "product-warehouse")]',
+        "fields": {
+            "name": {
+                "xpath": './/div[contains(@class, "block-title")]//span[@class="text-name"]',
+                "value": "text",
+            },
+            "options": {
+                "xpath": ".//a[@data-warehouse]",
+                "many": True,
+                "fields": {
+                    "text": {"value": "text"},
+                    "class": {"value": "@class"},
+                },
+            },
+        },
+    },
+    "images": {
+        "xpath": '//ul[@data-spm="0000000W4" and contains(@class, "list cf")]//img[@data-spm="0000000Wa"]',
+        "many": True,
+        "value": "@src",
+    },
+}
+
+# Replay reads the description from the archived DOM too; live crawls fetch
+# it separately after opening the description tab
+REPLAY_PLAN = dict(PRODUCT_PLAN, description={"xpath": DESCRIPTION_XPATH, "value": "html"})
+
+OPTION_PLAN = {
+    "price": {"xpath": [NEWBIE_PRICE_XPATH, MAIN_PRICE_XPATH], "value": "text"},
+    "stock": {"xpath": STOCK_XPATH, "value": "text"},
+}
+
+INTERPRETER_JS = """
+function nodesFor(ctx, spec) {
+  if (!spec.xpath) return [ctx];
+  var xpaths = [].concat(spec.xpath);
+  for (var i = 0; i < xpaths.length; i++) {
+    var r = document.evaluate(xpaths[i], ctx, null,
+      XPathResult.ORDERED_NODE_SNAPSHOT_TYPE, null);
+    if (r.snapshotLength) {
+      var nodes = [];
+      var n = spec.many ? r.snapshotLength : 1;
+      for (var j = 0; j < n; j++) nodes.push(r.snapshotItem(j));
+      return nodes;
+    }
+  }
+  return [];
+}
+function readNode(node, spec) {
+  if (spec.fields) {
+    var out = {};
+    for (var key in spec.fields) out[key] = runSpec(node, spec.fields[key]);
+    return out;
+  }
+  if (spec.value === "text") return (node.innerText || node.textContent || "").trim();
+  if (spec.value === "html") return node.innerHTML.trim();
+  var name = spec.value.slice(1);
+  var value = node.getAttribute(name);
+  // Absolute URLs, as Selenium's get_attribute used to return them
+  if (value !== null && (name === "src" || name === "href")) {
+    try { return new URL(value, document.baseURI).href; } catch (e) {}
+  }
+  return value;
+}
+function runSpec(ctx, spec) {
+  var nodes = nodesFor(ctx, spec);
+  if (spec.many) return nodes.map(function (n) { return readNode(n, spec); });
+  return nodes.length ? readNode(nodes[0], spec) : null;
+}
+"""
+
+
+def compile_plan(plan):
+    # The whole plan runs as one execute_script call, i.e. one chromedriver round trip
+    return (
+        INTERPRETER_JS
+        + "return JSON.stringify(runSpec(document, {fields: "
+        + json.dumps(plan)
+        + "}));"
+    )
+
+
+COMPILED_PRODUCT_PLAN = compile_plan(PRODUCT_PLAN)
+COMPILED_OPTION_PLAN = compile_plan(OPTION_PLAN)
+
+
+def run_plan(driver, compiled_plan=COMPILED_PRODUCT_PLAN):
+    return json.loads(driver.execute_script(compiled_plan))
+
+
+def _nodes_for(ctx, spec):
+    # Same rules as nodesFor in INTERPRETER_JS
+    if "xpath" not in spec:
+        return [ctx]
+    xpaths = spec["xpath"] if isinstance(spec["xpath"], list) else [spec["xpath"]]
+    for xpath in xpaths:
+        nodes = ctx.xpath(xpath)
+        if nodes:
+            return nodes if spec.get("many") else nodes[:1]
+    return []
+
+
+def _read_node(node, spec, base_url):
+    import lxml.html
+
+    if "fields" in spec:
+        return {
+            key: _run_spec(node, field, base_url) for key, field in spec["fields"].items()
+        }
+    if spec["value"] == "text":
+        return node.text_content().strip()
+    if spec["value"] == "html":
+        inner = (node.text or "") + "".join(
+            lxml.html.tostring(child, encoding="unicode") for child in node
+        )
+        return inner.strip()
+    name = spec["value"][1:]
+    value = node.get(name)
+    if value is not None and name in ("src", "href"):
+        return urljoin(base_url, value)
+    return value
+
+
+def _run_spec(ctx, spec, base_url):
+    nodes = _nodes_for(ctx, spec)
+    if spec.get("many"):
+        return [_read_node(node, spec, base_url) for node in nodes]
+    return _read_node(nodes[0], spec, base_url) if nodes else None
+
+
+def run_plan_html(html, plan=PRODUCT_PLAN, base_url=""):
+    # The same plan evaluated with lxml against saved HTML, e.g. an archived
+    # rendered DOM, so XPath fixes can be replayed without a browser
+    import lxml.html
+
+    root = lxml.html.document_fromstring(html)
+    return _run_spec(root, {"fields": plan}, base_url or "")
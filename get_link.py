@@ -1,155 +1,498 @@
-import pandas as pd
-from selenium import webdriver
-from selenium.webdriver.chrome.service import Service
-from selenium.webdriver.chrome.options import Options
-from webdriver_manager.chrome import ChromeDriverManager
-from bs4 import BeautifulSoup
+import argparse
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import parse_qsl, urlencode, urlsplit, urlunsplit
+import math
+import os
+import re
 import time
+import browser
+import crawl_state
+import driver_manager
+import html_parse
+import http_fetch
+import network_profile
+import wait_controller
+import metrics
+import rate_control
+import work_queue
 
-# Đọc file CSV
-try:
-    product_links_df = pd.read_csv("banggood_product_links.csv")
-    categories_df = pd.read_csv("banggood_categories.csv")
-except FileNotFoundError as e:
-    print(f"Lỗi: Không tìm thấy file CSV - {e}")
-    exit()
-
-# Lấy link lv3_href cuối cùng từ product_links_df
-try:
-    last_lv3_href = product_links_df["lv3_href"].iloc[-1]
-except IndexError:
-    print("Lỗi: File banggood_product_links.csv rỗng hoặc không có cột lv3_href")
-    exit()
-
-# Tìm vị trí của last_lv3_href trong categories_df
-try:
-    current_index = categories_df[categories_df["lv3_href"] == last_lv3_href].index[0]
-except IndexError:
-    print(f"Lỗi: Không tìm thấy {last_lv3_href} trong banggood_categories.csv")
-    exit()
-
-# Lấy link tiếp theo từ categories_df
-next_index = current_index + 1
-if next_index >= len(categories_df):
-    print("Đã xử lý hết các danh mục!")
-    exit()
-
-# Cấu hình Selenium
-chrome_options = Options()
-chrome_options.add_argument("--headless")  # Chạy không giao diện
-chrome_options.add_argument("--disable-gpu")
-chrome_options.add_argument("--no-sandbox")
-chrome_options.add_argument("--disable-dev-shm-usage")
-chrome_options.add_argument("--disable-blink-features=AutomationControlled")
-chrome_options.add_argument(
-    "user-agent=Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36"
-)
-
-# Khởi tạo driver
-driver = webdriver.Chrome(
-    service=Service(ChromeDriverManager().install()), options=chrome_options
-)
-
-# Danh sách để lưu link sản phẩm mới
-new_products = []
+PRODUCT_LINKS_CSV = "banggood_product_links.csv"
+CATEGORIES_CSV = "banggood_categories.csv"
+BASE_URL = "https://sea.banggood.com"
+
+# Tốc độ tối đa (request/giây mỗi host); rate_control tự giảm khi bị chặn
+MAX_RATE = 2.0
+ITEM_COUNT_JS = "return document.querySelectorAll('ul.goodlist > li').length;"
+
+PRODUCT_ID_RE = re.compile(r"-p-(\d+)\.html")
+PAGE_PARAM_RE = re.compile(r"[?&]page=(\d+)")
+MAX_PRODUCTS = 500
+CONCURRENCY = 4
+# Số lần thử lại một trang danh sách bị lỗi trước khi đánh dấu danh mục FAILED
+PAGE_RETRIES = 2
+
+
+def load_pending_categories(state):
+    # Lần chạy đầu: nhập danh mục và tiến độ cũ từ các file CSV
+    if crawl_state.count(state, crawl_state.CATEGORY) == 0:
+        if not os.path.isfile(CATEGORIES_CSV):
+            print(f"Lỗi: Không tìm thấy file {CATEGORIES_CSV}")
+            return None
+        crawl_state.import_csv(
+            state,
+            crawl_state.CATEGORY,
+            CATEGORIES_CSV,
+            "lv3_href",
+            data_columns=["lv1", "lv2", "lv3"],
+        )
+    if crawl_state.count(state, crawl_state.LINK) == 0:
+        crawl_state.import_csv(
+            state,
+            crawl_state.LINK,
+            PRODUCT_LINKS_CSV,
+            "product_url",
+            data_columns=["lv3_href", "lv3"],
+        )
+        last_link = crawl_state.last_record(state, crawl_state.LINK)
+        if last_link:
+            # Các danh mục đến lv3_href cuối cùng đã được cào
+            crawl_state.mark_through(
+                state, crawl_state.CATEGORY, last_link[1]["lv3_href"], crawl_state.DONE
+            )
+
+    # Lấy các danh mục chưa xử lý theo thứ tự
+    return list(
+        crawl_state.iter_urls(
+            state, crawl_state.CATEGORY, exclude_status=crawl_state.DONE
+        )
+    )
+
+
+def setup_driver(attach=None):
+    # Selenium chỉ được import khi thật sự cần mở Chrome
+    from selenium.webdriver.chrome.options import Options
+
+    # Cấu hình Selenium
+    chrome_options = Options()
+    chrome_options.add_argument("--headless")  # Chạy không giao diện
+    chrome_options.add_argument("--disable-gpu")
+    chrome_options.add_argument("--no-sandbox")
+    chrome_options.add_argument("--disable-dev-shm-usage")
+    chrome_options.add_argument("--disable-blink-features=AutomationControlled")
+    chrome_options.add_argument(
+        "user-agent=Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36"
+    )
+
+    # Chặn ảnh, video, font và tracker; chỉ đợi DOMContentLoaded
+    network_profile.apply_options(chrome_options)
+
+    # Khởi tạo driver (đường dẫn chromedriver được lưu cache giữa các lần chạy)
+    driver = browser.create_driver(chrome_options, attach)
+    network_profile.apply_blocking(driver)
+    return driver
 
 
 # Hàm cào link sản phẩm từ một danh mục
-def scrape_products(category_row, max_products=20):
+def scrape_products(driver, category_row, waits, max_products=20, base_url=BASE_URL):
+    from selenium.common.exceptions import TimeoutException, WebDriverException
+    from selenium.webdriver.common.by import By
+    from selenium.webdriver.support import expected_conditions as EC
+
     lv3_href = category_row["lv3_href"]
     lv3 = category_row.get("lv3", "")  # Lấy lv3, để rỗng nếu không có
+    products = []
 
     print(f"Đang cào danh mục: {lv3} - {lv3_href}")
 
     try:
-        # Load trang với Selenium
-        driver.get(lv3_href)
-        time.sleep(3)  # Đợi trang load ban đầu
+        # Load trang với Selenium, đợi danh sách sản phẩm xuất hiện
+        with metrics.stage("listing:get"), rate_control.request(
+            lv3_href, "browser"
+        ) as request:
+            try:
+                driver.get(lv3_href)
+            except WebDriverException:
+                request.throttled("webdriver")
+                raise
+            if rate_control.looks_like_captcha(title=driver.title):
+                request.throttled("captcha")
+        try:
+            waits.until(
+                driver,
+                "listing:items",
+                EC.presence_of_element_located((By.CSS_SELECTOR, "ul.goodlist > li")),
+                timeout=10,
+            )
+        except TimeoutException:
+            print("Danh sách sản phẩm chưa xuất hiện")
 
         # Scroll để load thêm sản phẩm
         max_scroll_attempts = 10  # Giới hạn số lần thử scroll
         scroll_count = 0
-        last_item_count = 0
+        last_item_count = driver.execute_script(ITEM_COUNT_JS)
 
-        while scroll_count < max_scroll_attempts:
+        while scroll_count < max_scroll_attempts and last_item_count < max_products:
             # Scroll xuống cuối trang
             driver.execute_script("window.scrollTo(0, document.body.scrollHeight);")
-            time.sleep(1)  # Đợi 3 giây để load sản phẩm mới
-
-            # Kiểm tra số lượng li hiện tại
-            soup = BeautifulSoup(driver.page_source, "html.parser")
-            goodlist = soup.find("ul", class_="goodlist")
-            if goodlist:
-                items = goodlist.find_all("li")
-                current_item_count = len(items)
-                print(
-                    f"Scroll {scroll_count + 1}: Tìm thấy {current_item_count} sản phẩm"
-                )
-                if current_item_count >= max_products:
-                    break  # Đủ sản phẩm
-                if current_item_count == last_item_count and current_item_count > 0:
-                    print("Không load thêm sản phẩm mới, dừng scroll")
-                    break  # Không load thêm được
-                last_item_count = current_item_count
 
+            # Đợi đến khi có thêm li mới thay vì sleep cố định
+            try:
+                with metrics.stage("listing:scroll"):
+                    current_item_count = waits.until(
+                        driver,
+                        "listing:scroll",
+                        wait_controller.count_increased(ITEM_COUNT_JS, last_item_count),
+                        timeout=3,
+                    )
+            except TimeoutException:
+                print("Không load thêm sản phẩm mới, dừng scroll")
+                break  # Không load thêm được
+            print(f"Scroll {scroll_count + 1}: Tìm thấy {current_item_count} sản phẩm")
+            last_item_count = current_item_count
             scroll_count += 1
 
         # Phân tích HTML cuối cùng
-        soup = BeautifulSoup(driver.page_source, "html.parser")
-        goodlist = soup.find("ul", class_="goodlist")
-        if not goodlist:
+        # Trong lúc cuộn chỉ đếm li bằng JS, DOM chỉ được phân tích một lần ở đây
+        html = driver.page_source
+        with metrics.stage("listing:parse"):
+            product_urls = parse_listing(html_parse.parse(html), base_url)
+        if product_urls is None:
             print(f"Không tìm thấy ul class='goodlist' trong {lv3_href}")
-            print(f"Nội dung HTML mẫu: {str(soup)[:500]}...")
-            return
-
-        # Tìm tất cả li trong goodlist
-        items = goodlist.find_all("li")
-        print(f"Tổng số sản phẩm tìm thấy: {len(items)}")
-        count = 0
-
-        for item in items:
-            # Tìm thẻ a với data-spm="0000001WJ"
-            a_tag = item.find("a", attrs={"data-spm": "0000001WJ"})
-            if a_tag and "href" in a_tag.attrs:
-                product_url = a_tag["href"]
-                # Đảm bảo link bắt đầu bằng https://sea.banggood.com
-                if not product_url.startswith("http"):
-                    product_url = "https://sea.banggood.com" + product_url
-                new_products.append(
-                    {"lv3_href": lv3_href, "lv3": lv3, "product_url": product_url}
-                )
-                count += 1
-                if count >= max_products:
-                    break
-
-        print(f"Đã lấy {count} sản phẩm từ {lv3}")
+            print(f"Nội dung HTML mẫu: {html[:500]}...")
+            return products
+        print(f"Tổng số sản phẩm tìm thấy: {len(product_urls)}")
+
+        for product_url in product_urls[:max_products]:
+            products.append({"lv3_href": lv3_href, "lv3": lv3, "product_url": product_url})
+
+        print(f"Đã lấy {len(products)} sản phẩm từ {lv3}")
+        metrics.inc("links_found_total", len(products))
 
     except Exception as e:
+        # Để nơi gọi đánh dấu FAILED, danh mục sẽ được cào lại ở lần chạy sau
         print(f"Lỗi khi cào {lv3_href}: {e}")
+        raise
 
+    return products
 
-# Bắt đầu từ danh mục tiếp theo
-try:
-    for index in range(next_index, len(categories_df)):
-        category_row = categories_df.iloc[index]
-        scrape_products(category_row)
 
-        # Ghi vào file sau mỗi danh mục
-        if new_products:
-            try:
-                new_df = pd.DataFrame(new_products)
-                new_df.to_csv(
-                    "banggood_product_links.csv", mode="a", header=False, index=False
-                )
-                print(
-                    f"Đã ghi {len(new_products)} sản phẩm vào banggood_product_links.csv"
-                )
-                new_products = []  # Reset danh sách
-            except Exception as e:
-                print(f"Lỗi khi ghi file CSV: {e}")
-
-        # Nghỉ 2 giây giữa các danh mục
-finally:
-    driver.quit()
-
-print("Hoàn thành!")
+def parse_listing(doc, base_url=BASE_URL):
+    # doc là cây HTML từ html_parse.parse; trả về None nếu không có ul.goodlist
+    goodlist = doc.select_one("ul.goodlist")
+    if goodlist is None:
+        return None
+
+    product_urls = []
+    for item in goodlist.select("li"):
+        # Tìm thẻ a với data-spm="0000001WJ"
+        a_tag = item.select_one('a[data-spm="0000001WJ"]')
+        product_url = a_tag.get("href") if a_tag is not None else None
+        if product_url:
+            # Đảm bảo link bắt đầu bằng https://sea.banggood.com
+            if not product_url.startswith("http"):
+                product_url = base_url + product_url
+            product_urls.append(product_url)
+    return product_urls
+
+
+def page_url(lv3_href, page):
+    parts = urlsplit(lv3_href)
+    query = dict(parse_qsl(parts.query))
+    query["page"] = str(page)
+    return urlunsplit(parts._replace(query=urlencode(query)))
+
+
+def discover_page_count(doc):
+    # Số trang lớn nhất trong các link phân trang (?page=N); None nếu không có
+    pages = [
+        int(match.group(1))
+        for a_tag in doc.select('a[href*="page="]')
+        for match in [PAGE_PARAM_RE.search(a_tag.get("href"))]
+        if match
+    ]
+    return max(pages) if pages else None
+
+
+def fetch_listing_page(session, url, base_url):
+    # None khi tải trang lỗi; [] khi trang không có sản phẩm hoặc 404 (đã hết trang)
+    with metrics.stage("listing:page"):
+        html = http_fetch.fetch_page(session, url, not_found="")
+        if html is None:
+            return None
+        return parse_listing(html_parse.parse(html), base_url) or []
+
+
+def fetch_listing_pages(pool, session, lv3_href, pages, base_url, page_count=None):
+    # Trang lỗi được thử lại; nếu vẫn lỗi thì báo lỗi cả danh mục để nơi gọi
+    # đánh dấu FAILED và danh mục được cào lại ở lần chạy sau
+    def fetch(page):
+        return fetch_listing_page(session, page_url(lv3_href, page), base_url)
+
+    results = dict(zip(pages, pool.map(fetch, pages)))
+    for attempt in range(1, PAGE_RETRIES + 1):
+        failed = [page for page in pages if results[page] is None]
+        if not failed:
+            break
+        print(f"Thử lại {len(failed)} trang lỗi (lần {attempt}/{PAGE_RETRIES})")
+        metrics.inc("retries_total", len(failed), crawler="listing")
+        time.sleep(rate_control.controller(lv3_href).backoff(attempt))
+        results.update(zip(failed, pool.map(fetch, failed)))
+    failed = [page for page in pages if results[page] is None]
+    if page_count is None:
+        # Không có phân trang: chỉ các trang trước một trang còn sản phẩm là
+        # chắc chắn tồn tại, trang lỗi phía sau coi như đã hết trang
+        last_found = max((page for page in pages if results[page]), default=0)
+        failed = [page for page in failed if page < last_found]
+    if failed:
+        raise RuntimeError(f"Không tải được trang {failed} của {lv3_href}")
+    return [results[page] or [] for page in pages]
+
+
+def crawl_category_pages(
+    session,
+    category_row,
+    max_products=MAX_PRODUCTS,
+    concurrency=CONCURRENCY,
+    base_url=BASE_URL,
+):
+    # Cào toàn bộ danh mục qua các trang ?page=N bằng HTTP, nhiều trang song song.
+    # Trả về None nếu trang đầu không đọc được (khi đó dùng Selenium); báo lỗi
+    # nếu một trang sau vẫn lỗi sau khi thử lại
+    lv3_href = category_row["lv3_href"]
+    lv3 = category_row.get("lv3", "")
+    print(f"Đang cào danh mục (phân trang): {lv3} - {lv3_href}")
+
+    with metrics.stage("listing:page"):
+        html = http_fetch.fetch_page(session, lv3_href)
+    if html is None:
+        return None
+    doc = html_parse.parse(html)
+    first_page = parse_listing(doc, base_url)
+    if not first_page:
+        return None
+    page_count = discover_page_count(doc)
+    per_page = len(first_page)
+
+    # Loại trùng theo product id, giữ thứ tự xuất hiện
+    products = {}
+
+    def add(product_urls):
+        added = 0
+        for product_url in product_urls:
+            match = PRODUCT_ID_RE.search(product_url)
+            key = match.group(1) if match else product_url
+            if key not in products and len(products) < max_products:
+                products[key] = product_url
+                added += 1
+        return added
+
+    add(first_page)
+    next_page = 2
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        while len(products) < max_products and (
+            page_count is None or next_page <= page_count
+        ):
+            # Chỉ lấy số trang cần để đủ giới hạn, tối đa `concurrency` trang một lượt
+            wanted = math.ceil((max_products - len(products)) / per_page)
+            last_page = next_page + min(concurrency, wanted)
+            if page_count is not None:
+                last_page = min(last_page, page_count + 1)
+            pages = list(range(next_page, last_page))
+            results = fetch_listing_pages(
+                pool, session, lv3_href, pages, base_url, page_count
+            )
+            added = sum(add(result) for result in results)
+            print(
+                f"Trang {pages[0]}-{pages[-1]}"
+                f"{'' if page_count is None else f'/{page_count}'}: "
+                f"thêm {added} sản phẩm, tổng {len(products)}"
+            )
+            next_page = last_page
+            if added == 0:
+                # Hết trang (hoặc trang cuối bị lặp lại)
+                break
+
+    print(f"Đã lấy {len(products)} sản phẩm từ {lv3}")
+    metrics.inc("links_found_total", len(products))
+    return [
+        {"lv3_href": lv3_href, "lv3": lv3, "product_url": product_url}
+        for product_url in products.values()
+    ]
+
+
+def save_links(state, new_products):
+    import pandas as pd
+
+    new_df = pd.DataFrame(new_products)
+    new_df.to_csv(
+        PRODUCT_LINKS_CSV,
+        mode="a",
+        header=not os.path.isfile(PRODUCT_LINKS_CSV),
+        index=False,
+    )
+    crawl_state.add_urls(
+        state,
+        crawl_state.LINK,
+        (
+            (p["product_url"], {"lv3_href": p["lv3_href"], "lv3": p["lv3"]})
+            for p in new_products
+        ),
+    )
+    print(f"Đã ghi {len(new_products)} sản phẩm vào {PRODUCT_LINKS_CSV}")
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Cào link sản phẩm theo danh mục Banggood")
+    parser.add_argument(
+        "--queue",
+        metavar="URL",
+        default=None,
+        help="Chia danh mục giữa nhiều máy qua hàng đợi có lease: "
+        "sqlite:///path.db hoặc redis://host:port/db",
+    )
+    parser.add_argument(
+        "--queue-batch",
+        type=int,
+        default=1,
+        help="Số danh mục nhận từ hàng đợi mỗi lần",
+    )
+    parser.add_argument(
+        "--lease",
+        type=float,
+        default=work_queue.DEFAULT_LEASE,
+        help="Số giây giữ chỗ một lô danh mục trước khi máy khác được nhận lại",
+    )
+    parser.add_argument(
+        "--max-products",
+        type=int,
+        default=MAX_PRODUCTS,
+        help="Số sản phẩm tối đa lấy từ mỗi danh mục",
+    )
+    parser.add_argument(
+        "--concurrency",
+        type=int,
+        default=CONCURRENCY,
+        help="Số trang danh sách tải song song trong một danh mục",
+    )
+    parser.add_argument(
+        "--max-rate",
+        type=float,
+        default=MAX_RATE,
+        help="Số request tối đa mỗi giây tới một host; tốc độ tự điều chỉnh dưới mức này",
+    )
+    parser.add_argument(
+        "--scroll",
+        action="store_true",
+        help="Dùng cách cũ: mở danh mục bằng Selenium và cuộn trang",
+    )
+    parser.add_argument(
+        "--attach",
+        metavar="HOST:PORT",
+        default=browser.debugger_address(),
+        help="Dùng Chrome đang chạy với --remote-debugging-port thay vì mở Chrome mới "
+        f"(mặc định: ${browser.DEBUGGER_ENV})",
+    )
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    # Mở kho trạng thái (SQLite) thay cho việc quét lại toàn bộ file CSV
+    state = crawl_state.open_state()
+    pending_categories = load_pending_categories(state)
+    if pending_categories is None and not args.queue:
+        state.close()
+        return
+    pending_categories = pending_categories or []
+
+    queue = None
+    if args.queue:
+        # Đưa danh mục chưa cào vào hàng đợi chung, rồi nhận từng lô đến khi hết
+        queue = work_queue.open_queue(args.queue, "categories")
+        added = queue.put(pending_categories)
+        print(f"Đã thêm {added} danh mục vào hàng đợi, trạng thái: {queue.stats()}")
+        pending_categories = work_queue.iter_claimed(
+            queue, work_queue.default_owner(), args.queue_batch, args.lease
+        )
+    elif not pending_categories:
+        print("Đã xử lý hết các danh mục!")
+        state.close()
+        return
+    else:
+        print(f"Còn {len(pending_categories)} danh mục cần cào")
+
+    # Chrome chỉ được mở khi cần (--scroll hoặc khi không đọc được trang phân trang)
+    drivers = driver_manager.DriverManager(lambda: setup_driver(args.attach))
+    session = http_fetch.create_session(pool_size=args.concurrency)
+    waits = wait_controller.WaitController()
+    rate_control.configure(max_rate=args.max_rate)
+    # Bật đo thời gian/bộ đếm khi có biến môi trường BANGGOOD_METRICS_DIR
+    metrics.enable_from_env("get_link")
+
+    # Bắt đầu từ danh mục tiếp theo
+    try:
+        for lv3_href, category_data in pending_categories:
+            category_row = dict(category_data, lv3_href=lv3_href)
+            crawl_state.mark(
+                state, crawl_state.CATEGORY, lv3_href, crawl_state.IN_PROGRESS
+            )
+            new_products = None
+            if not args.scroll:
+                try:
+                    new_products = crawl_category_pages(
+                        session, category_row, args.max_products, args.concurrency
+                    )
+                except Exception as e:
+                    print(f"Lỗi khi cào {lv3_href}: {e}")
+                    crawl_state.mark(
+                        state, crawl_state.CATEGORY, lv3_href, crawl_state.FAILED, str(e)
+                    )
+                    continue
+            if new_products is None:
+                try:
+                    new_products = scrape_products(
+                        drivers.get(), category_row, waits, args.max_products
+                    )
+                except Exception as e:
+                    crawl_state.mark(
+                        state, crawl_state.CATEGORY, lv3_href, crawl_state.FAILED, str(e)
+                    )
+                    # Chrome có thể đang lỗi, mở lại cho danh mục sau
+                    drivers.quit()
+                    continue
+                drivers.page_done()
+
+            # Ghi vào file sau mỗi danh mục
+            if new_products:
+                try:
+                    with metrics.stage("listing:write"):
+                        save_links(state, new_products)
+                except Exception as e:
+                    print(f"Lỗi khi ghi file CSV: {e}")
+                    crawl_state.mark(
+                        state, crawl_state.CATEGORY, lv3_href, crawl_state.FAILED, str(e)
+                    )
+                    continue
+
+            crawl_state.mark(state, crawl_state.CATEGORY, lv3_href, crawl_state.DONE)
+            if queue is not None:
+                queue.ack([lv3_href])
+            metrics.page_done("listing")
+
+    finally:
+        drivers.quit()
+        session.close()
+        state.close()
+        if queue is not None:
+            # Trả lại các danh mục đã nhận nhưng chưa cào
+            pending_categories.close()
+            queue.close()
+        waits.report()
+        rate_control.report()
+        metrics.close()
+
+    print("Hoàn thành!")
+
+
+if __name__ == "__main__":
+    main()
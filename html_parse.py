@@ -0,0 +1,146 @@
+import importlib.util
+import os
+
+# Backends in order of preference; BANGGOOD_HTML_PARSER forces one by name
+PARSER_ENV = "BANGGOOD_HTML_PARSER"
+BACKEND_ORDER = ["selectolax", "lxml", "html.parser"]
+
+
+class SelectolaxNode:
+    __slots__ = ("node",)
+
+    def __init__(self, node):
+        self.node = node
+
+    def select(self, css):
+        return [SelectolaxNode(node) for node in self.node.css(css)]
+
+    def select_one(self, css):
+        node = self.node.css_first(css)
+        return None if node is None else SelectolaxNode(node)
+
+    def get(self, name, default=None):
+        value = self.node.attributes.get(name)
+        return default if value is None else value
+
+    def text(self):
+        return self.node.text(separator=" ", strip=True)
+
+
+class LxmlNode:
+    __slots__ = ("element",)
+
+    def __init__(self, element):
+        self.element = element
+
+    def select(self, css):
+        return [LxmlNode(element) for element in self.element.cssselect(css)]
+
+    def select_one(self, css):
+        elements = self.element.cssselect(css)
+        return LxmlNode(elements[0]) if elements else None
+
+    def get(self, name, default=None):
+        return self.element.get(name, default)
+
+    def text(self):
+        return " ".join(self.element.text_content().split())
+
+
+class SoupNode:
+    __slots__ = ("tag",)
+
+    def __init__(self, tag):
+        self.tag = tag
+
+    def select(self, css):
+        return [SoupNode(tag) for tag in self.tag.select(css)]
+
+    def select_one(self, css):
+        tag = self.tag.select_one(css)
+        return None if tag is None else SoupNode(tag)
+
+    def get(self, name, default=None):
+        value = self.tag.get(name, default)
+        # bs4 splits multi-valued attributes such as class into lists
+        return " ".join(value) if isinstance(value, list) else value
+
+    def text(self):
+        return self.tag.get_text(" ", strip=True)
+
+
+def _parse_selectolax(html):
+    from selectolax.lexbor import LexborHTMLParser
+
+    return SelectolaxNode(LexborHTMLParser(html).root)
+
+
+def _parse_lxml(html):
+    import lxml.html
+
+    return LxmlNode(lxml.html.document_fromstring(html))
+
+
+def _parse_soup(html):
+    from bs4 import BeautifulSoup
+
+    return SoupNode(BeautifulSoup(html, "html.parser"))
+
+
+PARSERS = {
+    "selectolax": _parse_selectolax,
+    "lxml": _parse_lxml,
+    "html.parser": _parse_soup,
+}
+
+
+# Modules each backend needs; lxml's Element.cssselect() also needs cssselect
+REQUIREMENTS = {
+    "selectolax": ["selectolax"],
+    "lxml": ["lxml", "cssselect"],
+    "html.parser": ["bs4"],
+}
+
+
+def _installed(name):
+    return all(importlib.util.find_spec(module) for module in REQUIREMENTS[name])
+
+
+def available_backends():
+    return [name for name in BACKEND_ORDER if _installed(name)]
+
+
+_backend = None
+
+
+def backend():
+    global _backend
+    if _backend is None:
+        forced = os.environ.get(PARSER_ENV)
+        if forced:
+            if forced not in PARSERS:
+                raise ValueError(f"Unknown {PARSER_ENV}={forced!r}, expected one of {BACKEND_ORDER}")
+            _backend = forced
+        else:
+            backends = available_backends()
+            _backend = backends[0] if backends else "html.parser"
+    return _backend
+
+
+def parse(html, backend_name=None):
+    # One parse per page: callers keep the returned root and run every query on it
+    return PARSERS[backend_name or backend()](html)
+
+
+_soup_features = None
+
+
+def soup(html):
+    # For code that still needs the BeautifulSoup API: bs4's lxml tree builder
+    # (which does not need cssselect) is several times faster than html.parser
+    global _soup_features
+    from bs4 import BeautifulSoup
+
+    if _soup_features is None:
+        _soup_features = "lxml" if importlib.util.find_spec("lxml") else "html.parser"
+    return BeautifulSoup(html, _soup_features)
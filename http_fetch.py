@@ -0,0 +1,170 @@
+from urllib.parse import urljoin
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+import html_parse
+import rate_control
+import sku_state
+
+USER_AGENT = "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36"
+
+REQUIRED_FIELDS = ["title", "price", "image_urls", "description"]
+NOT_FOUND_STATUSES = (404, 410)
+
+
+def create_session(pool_size=10):
+    session = requests.Session()
+    session.headers.update(
+        {
+            "User-Agent": USER_AGENT,
+            "Accept": "text/html,application/xhtml+xml,application/xml;q=0.9,*/*;q=0.8",
+            "Accept-Language": "en-US,en;q=0.9",
+            "Connection": "keep-alive",
+        }
+    )
+    retry = Retry(
+        total=2, backoff_factor=0.5, status_forcelist=[500, 502, 503, 504]
+    )
+    # Keep-alive connections are reused across products on the same host
+    adapter = HTTPAdapter(
+        pool_connections=pool_size, pool_maxsize=pool_size, max_retries=retry
+    )
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    return session
+
+
+def fetch_page(session, url, timeout=15, archive=None, not_found=None):
+    # With an archive, revalidate the last capture instead of refetching it.
+    # A 404/410 returns not_found, so callers can tell a missing page from a
+    # failed fetch
+    cached, headers = (None, {}) if archive is None else archive.validators(url)
+    # Paced by the host's shared AIMD controller, which also hears how it went
+    with rate_control.request(url) as request:
+        try:
+            response = session.get(url, timeout=timeout, headers=headers)
+        except requests.RequestException as e:
+            print(f"HTTP fetch failed for {url}: {e}")
+            request.throttled("timeout" if isinstance(e, requests.Timeout) else "error")
+            return None
+        if response.status_code == 304 and cached is not None:
+            print(f"Not modified since last fetch: {url}")
+            archive.put_revisit(url, cached)
+            return archive.read(cached)
+        if response.status_code in NOT_FOUND_STATUSES:
+            print(f"HTTP {response.status_code} for {url}")
+            return not_found
+        if response.status_code != 200:
+            print(f"HTTP {response.status_code} for {url}")
+            if rate_control.is_throttle_status(response.status_code):
+                request.throttled(f"http_{response.status_code}")
+            return None
+        if rate_control.looks_like_captcha(response.text):
+            print(f"Captcha page instead of {url}")
+            request.throttled("captcha")
+            return None
+        if archive is not None:
+            archive.put_response(url, response)
+        return response.text
+
+
+def parse_product_html(html, page_url=None):
+    soup = html_parse.soup(html)
+    data = {
+        "title": None,
+        "price": None,
+        "sku_properties": [],
+        "image_urls": [],
+        "description": None,
+        "option_details": [],
+        "has_options": False,
+    }
+
+    title_tag = soup.select_one("h1.product-title span.product-title-text")
+    if title_tag:
+        data["title"] = title_tag.get_text(strip=True) or None
+
+    price_tag = soup.select_one("div.product-newbie-price div.newbie-price")
+    if not price_tag or not price_tag.get_text(strip=True):
+        price_tag = soup.select_one("span.main-price")
+    if price_tag:
+        data["price"] = price_tag.get_text(strip=True) or None
+
+    for block in soup.select("div.product-block"):
+        name_tag = block.select_one("div.block-title em")
+        if not name_tag:
+            continue
+        option_tags = block.select("a.imgtag") or block.select('a[href="javascript:;"]')
+        sku_values = [
+            a.get("title", "").strip() for a in option_tags if a.get("title", "").strip()
+        ]
+        active_value = next(
+            (
+                a.get("title", "").strip()
+                for a in option_tags
+                if "active" in (a.get("class") or [])
+            ),
+            sku_values[0] if sku_values else "Unknown",
+        )
+        data["sku_properties"].append(
+            {
+                "sku_property": name_tag.get_text().replace(":", "").strip(),
+                "sku_values": sku_values,
+                "active_value": active_value,
+            }
+        )
+        if sku_values:
+            data["has_options"] = True
+
+    warehouse_block = soup.select_one("div.product-warehouse")
+    if warehouse_block:
+        warehouse_name_tag = warehouse_block.select_one("div.block-title span.text-name")
+        warehouse_tags = warehouse_block.select("a[data-warehouse]")
+        warehouse_values = [a.get_text(strip=True) for a in warehouse_tags]
+        active_warehouse = next(
+            (
+                a.get_text(strip=True)
+                for a in warehouse_tags
+                if "active" in (a.get("class") or [])
+            ),
+            warehouse_values[0]
+            if warehouse_values
+            else (warehouse_name_tag.get_text(strip=True) if warehouse_name_tag else ""),
+        )
+        data["sku_properties"].append(
+            {
+                "sku_property": "Ship From",
+                "sku_values": warehouse_values,
+                "active_value": active_warehouse,
+            }
+        )
+
+    image_tags = soup.select('ul[data-spm="0000000W4"].list.cf img[data-spm="0000000Wa"]')
+    # Relative and protocol-relative srcs resolved like the browser does
+    data["image_urls"] = [
+        urljoin(page_url or "", img.get("src").strip())
+        for img in image_tags
+        if img.get("src")
+    ]
+
+    description_div = soup.select_one(
+        'div[data-spm="0000000UL"].tab-cnt div.product-description-main-box'
+    )
+    if description_div:
+        data["description"] = description_div.decode_contents().strip() or None
+
+    if data["has_options"]:
+        data["option_details"] = sku_state.extract_option_details(
+            html, data["price"], soup
+        )
+
+    return data
+
+
+def needs_selenium(data):
+    # Without embedded SKU data, option prices only render after clicking
+    if data["has_options"] and not data["option_details"]:
+        return True
+    return any(not data[field] for field in REQUIRED_FIELDS)
@@ -0,0 +1,145 @@
+import array
+import mmap
+import os
+import re
+import struct
+from bisect import bisect_left
+
+import crawl_state
+
+ID_INDEX = "banggood_product_ids.idx"
+
+PRODUCT_ID_RE = re.compile(r"-p-(\d+)\.html")
+# magic, version, bytes per id, number of ids, crawl_state rows it was built from
+HEADER = struct.Struct("<4sBB2xQQ")
+MAGIC = b"BGID"
+VERSION = 1
+
+
+def url_id(url):
+    match = PRODUCT_ID_RE.search(url)
+    return int(match.group(1)) if match else None
+
+
+def write(ids, path=ID_INDEX, urls=(), source_count=0):
+    # Sorted, de-duplicated ids as a flat uint32/uint64 array, followed by
+    # the few URLs that have no product id, one per line
+    ids = sorted(set(ids))
+    typecode = "I" if not ids or ids[-1] < 2**32 else "Q"
+    data = array.array(typecode, ids)
+    extra = "\n".join(sorted(set(urls))).encode("utf-8")
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(HEADER.pack(MAGIC, VERSION, data.itemsize, len(data), source_count))
+        data.tofile(f)
+        f.write(extra)
+    os.replace(tmp_path, path)
+    return len(data)
+
+
+def build(state, path=ID_INDEX, status=crawl_state.DONE):
+    # One pass over the crawled products in the state store
+    source_count = crawl_state.count(state, crawl_state.PRODUCT, status)
+    ids = []
+    urls = []
+    for url, _ in crawl_state.iter_urls(state, crawl_state.PRODUCT, status):
+        product_id = url_id(url)
+        if product_id is None:
+            urls.append(url)
+        else:
+            ids.append(product_id)
+    count = write(ids, path, urls, source_count)
+    print(f"Built product id index {path}: {count} ids, {len(urls)} URLs without id")
+    return source_count
+
+
+class IdIndex:
+    # Read-only view of an index file. The ids stay in the memory map, so
+    # worker processes opening the same file share one copy in the page cache
+    def __init__(self, path=ID_INDEX):
+        self.path = path
+        with open(path, "rb") as f:
+            self.map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, itemsize, count, self.source_count = HEADER.unpack_from(
+            self.map
+        )
+        if magic != MAGIC or version != VERSION:
+            self.map.close()
+            raise ValueError(f"{path} is not a product id index")
+        end = HEADER.size + count * itemsize
+        self.ids = memoryview(self.map)[HEADER.size : end].cast(
+            "I" if itemsize == 4 else "Q"
+        )
+        extra = self.map[end:].decode("utf-8")
+        self.urls = set(extra.split("\n")) if extra else set()
+
+    def __contains__(self, product_id):
+        i = bisect_left(self.ids, product_id)
+        return i < len(self.ids) and self.ids[i] == product_id
+
+    def __len__(self):
+        return len(self.ids) + len(self.urls)
+
+    def has_url(self, url):
+        product_id = url_id(url)
+        if product_id is None:
+            return url in self.urls
+        return product_id in self
+
+    def close(self):
+        # The memoryview must go before the map it points into
+        self.ids.release()
+        self.map.close()
+
+
+def open_index(state, path=ID_INDEX, status=crawl_state.DONE):
+    # Reuses the file while it covers as many products as the state store,
+    # otherwise rebuilds it first
+    if os.path.isfile(path):
+        try:
+            index = IdIndex(path)
+        except (OSError, ValueError, struct.error) as e:
+            print(f"Rebuilding unreadable product id index {path}: {e}")
+        else:
+            if index.source_count == crawl_state.count(
+                state, crawl_state.PRODUCT, status
+            ):
+                return index
+            index.close()
+    build(state, path, status)
+    return IdIndex(path)
+
+
+class IdSet:
+    # Drop-in for a set of product URLs: membership goes through the index,
+    # URLs added during the run are kept as integer ids
+    def __init__(self, index=None):
+        self.index = index
+        self.ids = set()
+        self.urls = set()
+
+    def __contains__(self, url):
+        product_id = url_id(url)
+        if product_id is None:
+            if url in self.urls:
+                return True
+        elif product_id in self.ids:
+            return True
+        return self.index is not None and self.index.has_url(url)
+
+    def add(self, url):
+        if url in self:
+            return
+        product_id = url_id(url)
+        if product_id is None:
+            self.urls.add(url)
+        else:
+            self.ids.add(product_id)
+
+    def update(self, urls):
+        for url in urls:
+            self.add(url)
+
+    def __len__(self):
+        base = len(self.index) if self.index is not None else 0
+        return base + len(self.ids) + len(self.urls)
@@ -0,0 +1,396 @@
+import argparse
+import ast
+import csv
+import hashlib
+import os
+import sqlite3
+import sys
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, ThreadPoolExecutor, wait
+from urllib.parse import urlsplit
+
+import requests
+
+import http_fetch
+import metrics
+import rate_control
+
+try:
+    from PIL import Image
+except ImportError:
+    Image = None
+
+IMAGE_DIR = "banggood_images"
+MAX_ATTEMPTS = 3
+CHUNK_SIZE = 64 * 1024
+
+CONTENT_TYPES = {
+    "image/jpeg": ".jpg",
+    "image/png": ".png",
+    "image/gif": ".gif",
+    "image/webp": ".webp",
+}
+
+STATUS_DONE = "done"
+STATUS_FAILED = "failed"
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS images (
+    hash TEXT PRIMARY KEY,
+    path TEXT NOT NULL,
+    size INTEGER NOT NULL,
+    content_type TEXT,
+    stored_at REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS urls (
+    url TEXT PRIMARY KEY,
+    status TEXT NOT NULL,
+    hash TEXT,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    error TEXT,
+    updated_at REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS product_images (
+    product_id TEXT NOT NULL,
+    url TEXT NOT NULL,
+    position INTEGER NOT NULL,
+    PRIMARY KEY (product_id, url)
+);
+"""
+
+
+def parse_list(value):
+    # Output files hold str(list); see columnar.parse_list
+    if not isinstance(value, str) or not value:
+        return []
+    try:
+        parsed = ast.literal_eval(value)
+    except (ValueError, SyntaxError):
+        return []
+    return parsed if isinstance(parsed, list) else []
+
+
+def iter_product_images(source):
+    # (product_id, [image urls]) from a details CSV or a products SQLite file
+    if source.endswith(".db"):
+        conn = sqlite3.connect(source)
+        try:
+            for product_id, product_url, image_urls in conn.execute(
+                "SELECT product_id, product_url, image_urls FROM products"
+            ):
+                yield product_id or product_url, parse_list(image_urls)
+        finally:
+            conn.close()
+        return
+    csv.field_size_limit(sys.maxsize)
+    with open(source, mode="r", newline="", encoding="utf-8") as csvfile:
+        for row in csv.DictReader(csvfile):
+            yield row.get("product_id") or row.get("product_url"), parse_list(
+                row.get("image_urls")
+            )
+
+
+class HostLimiter:
+    # At most `limit` requests in flight per host, on top of the pool size
+    def __init__(self, limit):
+        self.limit = limit
+        self.lock = threading.Lock()
+        self.semaphores = {}
+
+    def get(self, url):
+        host = urlsplit(url).netloc
+        with self.lock:
+            semaphore = self.semaphores.get(host)
+            if semaphore is None:
+                semaphore = self.semaphores[host] = threading.BoundedSemaphore(self.limit)
+        return semaphore
+
+
+def make_thumbnail(source_path, thumb_path, size):
+    # Runs in a worker process; CPU-bound
+    with Image.open(source_path) as image:
+        image.thumbnail((size, size))
+        if image.mode not in ("RGB", "L"):
+            image = image.convert("RGB")
+        os.makedirs(os.path.dirname(thumb_path), exist_ok=True)
+        tmp_path = thumb_path + ".part"
+        image.save(tmp_path, "JPEG", quality=85)
+        os.replace(tmp_path, thumb_path)
+    return thumb_path
+
+
+class ImageStore:
+    # Images are stored once per content hash under objects/<2>/<hash><ext>;
+    # the SQLite index records every URL's outcome, so a restarted run skips
+    # finished URLs and retries failed ones up to MAX_ATTEMPTS
+    def __init__(self, path=IMAGE_DIR):
+        self.path = path
+        self.tmp_dir = os.path.join(path, "tmp")
+        os.makedirs(self.tmp_dir, exist_ok=True)
+        # Leftovers of an interrupted run; those URLs were never marked done
+        for name in os.listdir(self.tmp_dir):
+            os.remove(os.path.join(self.tmp_dir, name))
+        self.conn = sqlite3.connect(os.path.join(path, "index.db"))
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.executescript(SCHEMA)
+
+    def object_path(self, digest, ext):
+        return os.path.join(self.path, "objects", digest[:2], digest + ext)
+
+    def thumb_path(self, digest, size):
+        return os.path.join(self.path, "thumbs", str(size), digest[:2], digest + ".jpg")
+
+    def add_products(self, products):
+        rows = [
+            (str(product_id), url, position)
+            for product_id, urls in products
+            for position, url in enumerate(urls)
+            if url
+        ]
+        with self.conn:
+            self.conn.executemany(
+                "INSERT OR IGNORE INTO product_images VALUES (?, ?, ?)", rows
+            )
+        return rows
+
+    def pending(self, urls):
+        # URLs not done yet and still under the attempt limit, first occurrence only
+        pending = []
+        seen = set()
+        for url in urls:
+            if url in seen:
+                continue
+            seen.add(url)
+            row = self.conn.execute(
+                "SELECT status, attempts FROM urls WHERE url = ?", (url,)
+            ).fetchone()
+            if row is None or (row[0] != STATUS_DONE and row[1] < MAX_ATTEMPTS):
+                pending.append(url)
+        return pending
+
+    def download(self, session, limiter, url, timeout=30):
+        # Runs in a downloader thread: streams to a temp file while hashing
+        digest = hashlib.sha256()
+        size = 0
+        tmp_path = os.path.join(
+            self.tmp_dir, f"{threading.get_ident()}-{hashlib.sha1(url.encode()).hexdigest()}"
+        )
+        with limiter.get(url), rate_control.request(url) as request:
+            try:
+                with metrics.stage("image:fetch"), session.get(
+                    url, timeout=timeout, stream=True
+                ) as response:
+                    if response.status_code != 200:
+                        if rate_control.is_throttle_status(response.status_code):
+                            request.throttled(f"http_{response.status_code}")
+                        return url, None, f"HTTP {response.status_code}"
+                    content_type = response.headers.get("Content-Type", "").split(";")[0].strip()
+                    with open(tmp_path, "wb") as f:
+                        for chunk in response.iter_content(CHUNK_SIZE):
+                            digest.update(chunk)
+                            size += len(chunk)
+                            f.write(chunk)
+            except (requests.RequestException, OSError) as e:
+                if isinstance(e, requests.RequestException):
+                    request.throttled("timeout" if isinstance(e, requests.Timeout) else "error")
+                if os.path.exists(tmp_path):
+                    os.remove(tmp_path)
+                return url, None, str(e)
+        return url, (digest.hexdigest(), tmp_path, size, content_type), None
+
+    def store(self, url, result):
+        # Main thread only: moves the temp file into place unless the content
+        # is already stored, then records the URL
+        digest, tmp_path, size, content_type = result
+        row = self.conn.execute("SELECT path FROM images WHERE hash = ?", (digest,)).fetchone()
+        new = row is None
+        if new:
+            ext = CONTENT_TYPES.get(content_type) or os.path.splitext(urlsplit(url).path)[1] or ".img"
+            path = self.object_path(digest, ext)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            os.replace(tmp_path, path)
+        else:
+            os.remove(tmp_path)
+        with self.conn:
+            if new:
+                self.conn.execute(
+                    "INSERT INTO images VALUES (?, ?, ?, ?, ?)",
+                    (digest, os.path.relpath(path, self.path), size, content_type, time.time()),
+                )
+            self._mark(url, STATUS_DONE, digest)
+        return digest, new
+
+    def fail(self, url, error):
+        with self.conn:
+            self._mark(url, STATUS_FAILED, None, error)
+
+    def _mark(self, url, status, digest, error=None):
+        self.conn.execute(
+            "INSERT INTO urls (url, status, hash, attempts, error, updated_at) "
+            "VALUES (?, ?, ?, 1, ?, ?) ON CONFLICT(url) DO UPDATE SET "
+            "status = excluded.status, hash = excluded.hash, "
+            "attempts = attempts + 1, error = excluded.error, updated_at = excluded.updated_at",
+            (url, status, digest, error, time.time()),
+        )
+
+    def image_path(self, digest):
+        row = self.conn.execute("SELECT path FROM images WHERE hash = ?", (digest,)).fetchone()
+        return os.path.join(self.path, row[0]) if row else None
+
+    def stats(self):
+        images, stored = self.conn.execute(
+            "SELECT COUNT(*), COALESCE(SUM(size), 0) FROM images"
+        ).fetchone()
+        done, failed = self.conn.execute(
+            "SELECT COALESCE(SUM(status = 'done'), 0), COALESCE(SUM(status = 'failed'), 0) FROM urls"
+        ).fetchone()
+        products = self.conn.execute(
+            "SELECT COUNT(DISTINCT product_id) FROM product_images"
+        ).fetchone()[0]
+        return {
+            "products": products,
+            "urls_done": done,
+            "urls_failed": failed,
+            "unique_images": images,
+            "stored_bytes": stored,
+        }
+
+    def close(self):
+        self.conn.close()
+
+
+def download_all(store, urls, concurrency=16, per_host=4, thumbnail_size=None, thumb_workers=None):
+    session = http_fetch.create_session(pool_size=concurrency)
+    limiter = HostLimiter(per_host)
+    thumbnails = None
+    if thumbnail_size:
+        if Image is None:
+            raise RuntimeError("Thumbnails require Pillow (pip install Pillow)")
+        thumbnails = ProcessPoolExecutor(max_workers=thumb_workers)
+    stats = {"downloaded": 0, "deduplicated": 0, "failed": 0, "bytes": 0, "thumbnails": 0}
+    thumb_futures = []
+    started = time.perf_counter()
+    try:
+        with ThreadPoolExecutor(max_workers=concurrency) as pool:
+            url_iter = iter(urls)
+            in_flight = set()
+            # Keep a bounded window of submitted downloads instead of queuing every URL
+            while True:
+                for url in url_iter:
+                    in_flight.add(pool.submit(store.download, session, limiter, url))
+                    if len(in_flight) >= concurrency * 4:
+                        break
+                if not in_flight:
+                    break
+                done, in_flight = wait(in_flight, return_when=FIRST_COMPLETED)
+                for future in done:
+                    url, result, error = future.result()
+                    if result is None:
+                        stats["failed"] += 1
+                        metrics.inc("images_failed_total")
+                        print(f"Image failed: {url}: {error}")
+                        store.fail(url, error)
+                        continue
+                    digest, new = store.store(url, result)
+                    stats["downloaded"] += 1
+                    stats["bytes"] += result[2]
+                    metrics.inc("images_downloaded_total")
+                    metrics.inc("image_bytes_total", result[2])
+                    if not new:
+                        stats["deduplicated"] += 1
+                        metrics.inc("images_deduplicated_total")
+                    elif thumbnails is not None:
+                        thumb_futures.append(
+                            thumbnails.submit(
+                                make_thumbnail,
+                                store.image_path(digest),
+                                store.thumb_path(digest, thumbnail_size),
+                                thumbnail_size,
+                            )
+                        )
+                    done_count = stats["downloaded"] + stats["failed"]
+                    if done_count % 100 == 0:
+                        elapsed = time.perf_counter() - started
+                        print(f"{done_count} images handled ({done_count / elapsed:.1f}/s)")
+        for future in thumb_futures:
+            try:
+                future.result()
+                stats["thumbnails"] += 1
+            except Exception as e:
+                print(f"Thumbnail failed: {e}")
+    finally:
+        session.close()
+        rate_control.report()
+        if thumbnails is not None:
+            thumbnails.shutdown()
+    return stats
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Download product images, stored once per content hash"
+    )
+    parser.add_argument(
+        "source",
+        nargs="?",
+        default="banggood_product_details.csv",
+        help="Product details CSV, or the products .db written with --output-format sqlite",
+    )
+    parser.add_argument("--store", default=IMAGE_DIR)
+    parser.add_argument(
+        "--concurrency", type=int, default=16, help="Downloads in flight (and pooled connections)"
+    )
+    parser.add_argument(
+        "--per-host", type=int, default=4, help="Downloads in flight per image host"
+    )
+    parser.add_argument(
+        "--thumbnails",
+        type=int,
+        metavar="PX",
+        default=None,
+        help="Also write JPEG thumbnails no larger than PX x PX (needs Pillow)",
+    )
+    parser.add_argument(
+        "--thumb-workers", type=int, default=None, help="Processes generating thumbnails"
+    )
+    parser.add_argument(
+        "--max-rate",
+        type=float,
+        default=20.0,
+        help="Most requests per second to one image host; pacing adapts below it",
+    )
+    parser.add_argument("--stats", action="store_true", help="Only print store statistics")
+    args = parser.parse_args()
+
+    store = ImageStore(args.store)
+    rate_control.configure(
+        start_rate=args.max_rate / 4, max_rate=args.max_rate, max_concurrency=args.per_host
+    )
+    metrics.enable_from_env("images")
+    try:
+        if args.stats:
+            print(store.stats())
+            return
+        if not os.path.isfile(args.source):
+            print(f"Error: File '{args.source}' not found.")
+            return
+        rows = store.add_products(iter_product_images(args.source))
+        urls = store.pending(url for _, url, _ in rows)
+        print(f"{len(rows)} product images, {len(urls)} URLs left to download")
+        stats = download_all(
+            store, urls, args.concurrency, args.per_host, args.thumbnails, args.thumb_workers
+        )
+        print(
+            f"Downloaded {stats['downloaded']} images ({stats['bytes'] / 1e6:.1f} MB), "
+            f"{stats['deduplicated']} duplicates of stored images, {stats['failed']} failed, "
+            f"{stats['thumbnails']} thumbnails"
+        )
+        print(store.stats())
+    finally:
+        store.close()
+        metrics.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,288 @@
+import json
+import os
+import tempfile
+import threading
+import time
+
+METRICS_ENV = "BANGGOOD_METRICS_DIR"
+PREFIX = "banggood"
+
+# Upper bounds in seconds; waits top out around 30s and page loads at 60s
+BUCKETS = (0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+
+class _NullStage:
+    # Returned by stage() while metrics are off, so instrumented code pays for
+    # one function call and nothing else
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+NULL_STAGE = _NullStage()
+
+
+class _Stage:
+    def __init__(self, registry, labels):
+        self.registry = registry
+        self.labels = labels
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.registry.observe(
+            "stage_seconds", time.perf_counter() - self.start, self.labels
+        )
+        return False
+
+
+def _key(name, labels):
+    return name, tuple(sorted(labels.items()))
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_labels(labels):
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in labels) + "}"
+
+
+class Registry:
+    # Shared by every thread of a process (pipeline stages, image downloads),
+    # so all reads and updates go through one lock
+    def __init__(self, directory, name, interval=30.0):
+        os.makedirs(directory, exist_ok=True)
+        self.directory = directory
+        self.name = name
+        self.interval = interval
+        self.started = time.time()
+        self.last_write = time.monotonic()
+        self.counters = {}
+        self.gauges = {}
+        self.histograms = {}
+        self.lock = threading.RLock()
+
+    def inc(self, name, value, labels):
+        key = _key(name, labels)
+        with self.lock:
+            self.counters[key] = self.counters.get(key, 0) + value
+
+    def set_gauge(self, name, value, labels):
+        with self.lock:
+            self.gauges[_key(name, labels)] = value
+
+    def observe(self, name, seconds, labels):
+        with self.lock:
+            self._observe(_key(name, labels), seconds)
+
+    def _observe(self, key, seconds):
+        histogram = self.histograms.get(key)
+        if histogram is None:
+            histogram = self.histograms[key] = {
+                "buckets": [0] * len(BUCKETS),
+                "count": 0,
+                "sum": 0.0,
+            }
+        for i, bound in enumerate(BUCKETS):
+            if seconds <= bound:
+                histogram["buckets"][i] += 1
+                break
+        histogram["count"] += 1
+        histogram["sum"] += seconds
+
+    def _quantile(self, histogram, q):
+        # Upper bound of the bucket holding the q-th observation
+        rank = q * histogram["count"]
+        seen = 0
+        for bound, count in zip(BUCKETS, histogram["buckets"]):
+            seen += count
+            if seen >= rank:
+                return bound
+        return float("inf")
+
+    def snapshot(self):
+        with self.lock:
+            return self._snapshot()
+
+    def _snapshot(self):
+        uptime = time.time() - self.started
+        pages = {
+            dict(labels)["crawler"]: value
+            for (name, labels), value in self.counters.items()
+            if name == "pages_total"
+        }
+        histograms = {}
+        for (name, labels), histogram in sorted(self.histograms.items()):
+            label = ",".join(str(value) for _, value in labels)
+            count = histogram["count"]
+            histograms.setdefault(name, {})[label] = {
+                "count": count,
+                "sum": round(histogram["sum"], 3),
+                "mean": round(histogram["sum"] / count, 3) if count else None,
+                "p50": self._quantile(histogram, 0.5),
+                "p90": self._quantile(histogram, 0.9),
+                "p99": self._quantile(histogram, 0.99),
+            }
+        return {
+            "process": self.name,
+            "updated_at": time.time(),
+            "uptime_seconds": round(uptime, 1),
+            "pages": pages,
+            "pages_per_minute": {
+                crawler: round(value * 60 / uptime, 2) if uptime else 0.0
+                for crawler, value in pages.items()
+            },
+            "counters": [
+                {"name": name, "labels": dict(labels), "value": value}
+                for (name, labels), value in sorted(self.counters.items())
+            ],
+            "gauges": [
+                {"name": name, "labels": dict(labels), "value": value}
+                for (name, labels), value in sorted(self.gauges.items())
+            ],
+            "histograms": histograms,
+        }
+
+    def prometheus(self):
+        with self.lock:
+            return self._prometheus()
+
+    def _prometheus(self):
+        process = (("process", self.name),)
+        lines = []
+        typed = set()
+        uptime = time.time() - self.started
+        # Each metric family must be contiguous, so the page rates derived
+        # from pages_total go out after all counters
+        rates = []
+        for (name, labels), value in sorted(self.counters.items()):
+            metric = f"{PREFIX}_{name}"
+            if metric not in typed:
+                lines.append(f"# TYPE {metric} counter")
+                typed.add(metric)
+            lines.append(f"{metric}{_format_labels(process + labels)} {value}")
+            if name == "pages_total" and uptime:
+                rates.append(
+                    f"{PREFIX}_pages_per_minute{_format_labels(process + labels)} "
+                    f"{value * 60 / uptime:.3f}"
+                )
+        if rates:
+            lines.append(f"# TYPE {PREFIX}_pages_per_minute gauge")
+            typed.add(f"{PREFIX}_pages_per_minute")
+            lines.extend(rates)
+        for (name, labels), value in sorted(self.gauges.items()):
+            metric = f"{PREFIX}_{name}"
+            if metric not in typed:
+                lines.append(f"# TYPE {metric} gauge")
+                typed.add(metric)
+            lines.append(f"{metric}{_format_labels(process + labels)} {value}")
+        for (name, labels), histogram in sorted(self.histograms.items()):
+            metric = f"{PREFIX}_{name}"
+            if metric not in typed:
+                lines.append(f"# TYPE {metric} histogram")
+                typed.add(metric)
+            cumulative = 0
+            for bound, count in zip(BUCKETS, histogram["buckets"]):
+                cumulative += count
+                lines.append(
+                    f"{metric}_bucket{_format_labels(process + labels + (('le', bound),))} {cumulative}"
+                )
+            lines.append(
+                f"{metric}_bucket{_format_labels(process + labels + (('le', '+Inf'),))} {histogram['count']}"
+            )
+            lines.append(f"{metric}_sum{_format_labels(process + labels)} {histogram['sum']:.6f}")
+            lines.append(f"{metric}_count{_format_labels(process + labels)} {histogram['count']}")
+        return "\n".join(lines) + "\n"
+
+    def _replace(self, filename, text):
+        # Readers never see a half-written file; each write gets its own tmp
+        # file so concurrent writers never rename each other's
+        fd, tmp_path = tempfile.mkstemp(
+            prefix=f"{filename}.", suffix=".tmp", dir=self.directory
+        )
+        try:
+            with os.fdopen(fd, "w", encoding="utf-8") as f:
+                f.write(text)
+            os.replace(tmp_path, os.path.join(self.directory, filename))
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+
+    def write(self):
+        with self.lock:
+            self.last_write = time.monotonic()
+            snapshot = json.dumps(self._snapshot(), indent=2)
+            prometheus = self._prometheus()
+        self._replace(f"{self.name}.json", snapshot)
+        self._replace(f"{self.name}.prom", prometheus)
+
+    def maybe_write(self):
+        # Only the thread that finds the interval elapsed writes this round
+        with self.lock:
+            if time.monotonic() - self.last_write < self.interval:
+                return
+            self.last_write = time.monotonic()
+        self.write()
+
+
+_registry = None
+
+
+def enable(directory, name, interval=30.0):
+    global _registry
+    _registry = Registry(directory, name, interval)
+    print(f"Writing metrics to {os.path.join(directory, name)}.json/.prom every {interval:.0f}s")
+    return _registry
+
+
+def enable_from_env(name, interval=30.0):
+    directory = os.environ.get(METRICS_ENV)
+    if directory:
+        return enable(directory, name, interval)
+    return None
+
+
+def enabled():
+    return _registry is not None
+
+
+def stage(name, **labels):
+    if _registry is None:
+        return NULL_STAGE
+    return _Stage(_registry, dict(labels, stage=name))
+
+
+def inc(name, value=1, **labels):
+    if _registry is not None:
+        _registry.inc(name, value, labels)
+
+
+def gauge(name, value, **labels):
+    if _registry is not None:
+        _registry.set_gauge(name, value, labels)
+
+
+def observe(name, seconds, **labels):
+    if _registry is not None:
+        _registry.observe(name, seconds, labels)
+
+
+def page_done(crawler):
+    if _registry is not None:
+        _registry.inc("pages_total", 1, {"crawler": crawler})
+        _registry.maybe_write()
+
+
+def close():
+    global _registry
+    if _registry is not None:
+        _registry.write()
+        _registry = None
@@ -0,0 +1,158 @@
+import json
+import os
+
+IMAGE_PATTERNS = ["*.jpg*", "*.jpeg*", "*.png*", "*.gif*", "*.webp*", "*.svg*", "*.ico*"]
+MEDIA_PATTERNS = ["*.mp4*", "*.webm*", "*.m3u8*", "*.mp3*", "*.ogg*"]
+FONT_PATTERNS = ["*.woff*", "*.ttf*", "*.otf*", "*.eot*"]
+STYLESHEET_PATTERNS = ["*.css*"]
+TRACKER_PATTERNS = [
+    "*google-analytics.com*",
+    "*googletagmanager.com*",
+    "*doubleclick.net*",
+    "*googlesyndication.com*",
+    "*facebook.net*",
+    "*facebook.com/tr*",
+    "*hotjar.com*",
+    "*criteo.com*",
+    "*criteo.net*",
+    "*bat.bing.com*",
+    "*analytics.tiktok.com*",
+    "*clarity.ms*",
+]
+
+# Stylesheets are not blocked by default: innerText depends on CSS visibility
+PROFILES = {
+    "off": [],
+    "default": IMAGE_PATTERNS + MEDIA_PATTERNS + FONT_PATTERNS + TRACKER_PATTERNS,
+    "aggressive": IMAGE_PATTERNS
+    + MEDIA_PATTERNS
+    + FONT_PATTERNS
+    + TRACKER_PATTERNS
+    + STYLESHEET_PATTERNS,
+}
+
+NAVIGATION_TIMING_JS = """
+var nav = performance.getEntriesByType("navigation")[0];
+return nav ? {dom_content_loaded_ms: nav.domContentLoadedEventEnd,
+              load_ms: nav.loadEventEnd} : null;
+"""
+
+
+def apply_options(options, profile="default", collect_stats=False):
+    # "eager" returns from driver.get at DOMContentLoaded, not after every image
+    if profile != "off":
+        options.page_load_strategy = "eager"
+    if collect_stats:
+        options.set_capability("goog:loggingPrefs", {"performance": "ALL"})
+    return options
+
+
+def apply_blocking(driver, profile="default"):
+    patterns = PROFILES[profile]
+    if not patterns:
+        return
+    driver.execute_cdp_cmd("Network.enable", {})
+    driver.execute_cdp_cmd("Network.setBlockedURLs", {"urls": patterns})
+    print(f"Network blocking profile '{profile}' active ({len(patterns)} patterns)")
+
+
+class NetworkStats:
+    # Aggregates per-page CDP network events from Chrome's performance log
+    def __init__(self, profile):
+        self.profile = profile
+        self.pages = 0
+        self.requests = 0
+        self.blocked_requests = 0
+        self.bytes = 0
+        self.dom_content_loaded_ms = 0.0
+        self.blocked_by_type = {}
+
+    def record_page(self, driver):
+        requests = 0
+        blocked = 0
+        transferred = 0
+        for entry in driver.get_log("performance"):
+            message = json.loads(entry["message"])["message"]
+            method = message.get("method")
+            params = message.get("params", {})
+            if method == "Network.requestWillBeSent":
+                requests += 1
+            elif method == "Network.loadingFinished":
+                transferred += params.get("encodedDataLength", 0)
+            elif method == "Network.loadingFailed" and params.get("blockedReason"):
+                blocked += 1
+                resource_type = params.get("type", "Other")
+                self.blocked_by_type[resource_type] = (
+                    self.blocked_by_type.get(resource_type, 0) + 1
+                )
+        timing = None
+        try:
+            timing = driver.execute_script(NAVIGATION_TIMING_JS)
+        except Exception:
+            pass
+
+        self.pages += 1
+        self.requests += requests
+        self.blocked_requests += blocked
+        self.bytes += transferred
+        if timing:
+            self.dom_content_loaded_ms += timing["dom_content_loaded_ms"] or 0
+        print(
+            f"Network: {requests} requests, {blocked} blocked, "
+            f"{transferred / 1024:.1f} KiB transferred"
+        )
+
+    def counters(self):
+        return {
+            "pages": self.pages,
+            "requests": self.requests,
+            "blocked_requests": self.blocked_requests,
+            "bytes": self.bytes,
+            "dom_content_loaded_ms": self.dom_content_loaded_ms,
+            "blocked_by_type": dict(self.blocked_by_type),
+        }
+
+    def merge(self, counters):
+        # Used by the parent process to combine worker statistics
+        for key in ["pages", "requests", "blocked_requests", "bytes", "dom_content_loaded_ms"]:
+            setattr(self, key, getattr(self, key) + counters[key])
+        for resource_type, blocked in counters["blocked_by_type"].items():
+            self.blocked_by_type[resource_type] = (
+                self.blocked_by_type.get(resource_type, 0) + blocked
+            )
+
+    def summary(self):
+        pages = max(self.pages, 1)
+        return {
+            "profile": self.profile,
+            "pages": self.pages,
+            "requests_per_page": self.requests / pages,
+            "blocked_requests_per_page": self.blocked_requests / pages,
+            "bytes_per_page": self.bytes / pages,
+            "dom_content_loaded_ms_per_page": self.dom_content_loaded_ms / pages,
+            "blocked_by_type": self.blocked_by_type,
+        }
+
+    def save(self, directory="."):
+        path = os.path.join(directory, f"network_stats_{self.profile}.json")
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(self.summary(), f, indent=2)
+        return path
+
+    def report(self, directory="."):
+        # Compare against the last run with blocking turned off, if there is one
+        current = self.summary()
+        path = self.save(directory)
+        print(f"Network stats saved to '{path}'")
+        baseline_path = os.path.join(directory, "network_stats_off.json")
+        if self.profile == "off" or not os.path.isfile(baseline_path):
+            return current
+        with open(baseline_path, encoding="utf-8") as f:
+            baseline = json.load(f)
+        print(
+            f"Saved per page vs. blocking off: "
+            f"{baseline['requests_per_page'] - current['requests_per_page']:.1f} requests, "
+            f"{(baseline['bytes_per_page'] - current['bytes_per_page']) / 1024:.1f} KiB, "
+            f"{baseline['dom_content_loaded_ms_per_page'] - current['dom_content_loaded_ms_per_page']:.0f} ms to DOMContentLoaded"
+        )
+        return current
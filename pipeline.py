@@ -0,0 +1,354 @@
+import argparse
+import os
+import queue
+import threading
+import time
+
+import cate
+import category_tree
+import crawl_state
+import driver_manager
+import get_link
+import http_fetch
+import id_index
+import metrics
+import network_profile
+import product
+import rate_control
+import sinks
+import wait_controller
+
+HOME_URL = "https://www.banggood.com"
+
+# End of stream marker on the category and product queues
+STOP = None
+
+
+def iter_queue(work):
+    while True:
+        item = work.get()
+        if item is STOP:
+            return
+        yield item
+
+
+def feed_categories(categories, category_queue, link_workers):
+    for category in categories:
+        category_queue.put(category)
+    for _ in range(link_workers):
+        category_queue.put(STOP)
+
+
+def feed_links(links, product_queue):
+    # Links found by earlier runs whose products were never crawled
+    for link in links:
+        product_queue.put(link)
+
+
+def link_worker(args, category_queue, product_queue, result_queue, seen, seen_lock):
+    # Listing pages over HTTP; Chrome is only started for categories that
+    # need the scroll fallback
+    session = http_fetch.create_session(pool_size=args.listing_concurrency)
+    drivers = driver_manager.DriverManager(get_link.setup_driver)
+    waits = wait_controller.WaitController()
+    try:
+        for lv3_href, category_data in iter_queue(category_queue):
+            category_row = dict(category_data, lv3_href=lv3_href)
+            try:
+                found = get_link.crawl_category_pages(
+                    session, category_row, args.max_products, args.listing_concurrency
+                )
+                if found is None:
+                    found = get_link.scrape_products(
+                        drivers.get(), category_row, waits, args.max_products
+                    )
+                    drivers.page_done()
+            except Exception as e:
+                print(f"Listing failed for {lv3_href}: {e}")
+                # The browser may be what failed; start a fresh one next time
+                drivers.quit()
+                result_queue.put(("category", (lv3_href, crawl_state.FAILED, str(e))))
+                continue
+            result_queue.put(("links", (lv3_href, found)))
+            for link in found:
+                with seen_lock:
+                    if link["product_url"] in seen:
+                        continue
+                    seen.add(link["product_url"])
+                # Blocks while the product stage is behind
+                product_queue.put(link)
+    finally:
+        drivers.quit()
+        session.close()
+
+
+def finish_links(link_threads, product_queue, product_workers):
+    # Product workers stop once every producer of product links is done
+    for thread in link_threads:
+        thread.join()
+    for _ in range(product_workers):
+        product_queue.put(STOP)
+
+
+def product_worker(args, product_queue, result_queue):
+    stats = {"http": 0, "selenium": 0}
+    try:
+        stats = product.crawl_rows(
+            iter_queue(product_queue),
+            sinks.QueueSink(result_queue),
+            args,
+            result_queue=result_queue,
+        )
+    except Exception as e:
+        print(f"Product worker stopped with error: {e}")
+        # Keep draining so the link stage never blocks on a full queue
+        for _ in iter_queue(product_queue):
+            pass
+    finally:
+        result_queue.put(("done", stats))
+
+
+def write_results(result_queue, product_workers, sink, state):
+    # The only place that touches crawl_state and the output files
+    known_links = crawl_state.UrlSet(state, crawl_state.LINK)
+    finished = 0
+    stats = {"http": 0, "selenium": 0, "categories": 0, "links": 0}
+    while finished < product_workers:
+        kind, payload = result_queue.get()
+        if kind == "record":
+            sink.write(*payload)
+        elif kind == "status":
+            product_url, status, error = payload
+            crawl_state.mark(state, crawl_state.PRODUCT, product_url, status, error)
+        elif kind == "links":
+            lv3_href, links = payload
+            new_links = [link for link in links if link["product_url"] not in known_links]
+            if new_links:
+                with metrics.stage("listing:write"):
+                    get_link.save_links(state, new_links)
+            crawl_state.mark(state, crawl_state.CATEGORY, lv3_href, crawl_state.DONE)
+            metrics.page_done("listing")
+            stats["categories"] += 1
+            stats["links"] += len(new_links)
+        elif kind == "category":
+            lv3_href, status, error = payload
+            crawl_state.mark(state, crawl_state.CATEGORY, lv3_href, status, error)
+        elif kind == "done":
+            finished += 1
+            for path, count in payload.items():
+                stats[path] += count
+    return stats
+
+
+def discover_categories(args, state):
+    drivers = driver_manager.DriverManager(cate.setup_driver)
+    try:
+        tree = cate.crawl_category_tree(
+            drivers,
+            HOME_URL,
+            get_link.CATEGORIES_CSV,
+            state,
+            args.tree_cache,
+            args.ttl * 3600,
+        )
+        if tree is None:
+            print("No category tree found in the page, falling back to hovering")
+            cate.crawl_categories(drivers.get(), HOME_URL, get_link.CATEGORIES_CSV, state)
+    finally:
+        drivers.quit()
+    return get_link.load_pending_categories(state) or []
+
+
+def run(args):
+    # One AIMD controller per host, shared by the category, listing and product stages
+    if args.politeness_delay > 0:
+        rate_control.configure(max_rate=1 / args.politeness_delay)
+    state = crawl_state.open_state()
+    if crawl_state.count(state, crawl_state.PRODUCT) == 0:
+        crawl_state.import_csv(
+            state,
+            crawl_state.PRODUCT,
+            "banggood_product_details.csv",
+            "product_url",
+            status=crawl_state.DONE,
+        )
+    categories = discover_categories(args, state)
+    print(f"{len(categories)} categories to crawl")
+    # Integer ids in a memory-mapped index instead of every crawled URL as a string
+    index = id_index.open_index(state)
+    seen = id_index.IdSet(index)
+    print(f"Skipping {len(seen)} already crawled products")
+    leftover = [
+        {
+            "lv3_href": (link_data or {}).get("lv3_href", ""),
+            "lv3": (link_data or {}).get("lv3", ""),
+            "product_url": url,
+        }
+        for url, link_data in crawl_state.iter_urls(state, crawl_state.LINK)
+        if url not in seen
+    ]
+    seen.update(link["product_url"] for link in leftover)
+    print(f"{len(leftover)} links from earlier runs still to crawl")
+
+    def on_flush(records):
+        urls = [record["product_url"] for record, _ in records]
+        crawl_state.mark_many(state, crawl_state.PRODUCT, urls, crawl_state.DONE)
+
+    sink = sinks.BufferedSink(
+        sinks.create_backend(
+            args.output_format,
+            product.PRODUCT_FIELDNAMES,
+            description_store=args.description_store,
+        ),
+        batch_size=args.batch_size or sinks.DEFAULT_BATCH_SIZES[args.output_format],
+        flush_interval=args.flush_interval,
+        on_flush=on_flush,
+    )
+
+    # Bounded queues between the stages: a slow product stage stalls listing,
+    # which stalls the category feed, so memory stays flat
+    category_queue = queue.Queue(maxsize=args.link_workers * 2)
+    product_queue = queue.Queue(maxsize=args.queue_size)
+    result_queue = queue.Queue(maxsize=args.queue_size * 2)
+    seen_lock = threading.Lock()
+
+    threads = [
+        threading.Thread(
+            target=feed_categories,
+            args=(categories, category_queue, args.link_workers),
+            daemon=True,
+        )
+    ]
+    link_threads = [
+        threading.Thread(
+            target=link_worker,
+            args=(args, category_queue, product_queue, result_queue, seen, seen_lock),
+            daemon=True,
+        )
+        for _ in range(args.link_workers)
+    ]
+    link_threads.append(
+        threading.Thread(target=feed_links, args=(leftover, product_queue), daemon=True)
+    )
+    threads += link_threads
+    threads.append(
+        threading.Thread(
+            target=finish_links,
+            args=(link_threads, product_queue, args.product_workers),
+            daemon=True,
+        )
+    )
+    threads += [
+        threading.Thread(
+            target=product_worker,
+            args=(args, product_queue, result_queue),
+            daemon=True,
+        )
+        for _ in range(args.product_workers)
+    ]
+
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    try:
+        stats = write_results(result_queue, args.product_workers, sink, state)
+    finally:
+        sink.close()
+        state.close()
+        index.close()
+    rate_control.report()
+    elapsed = time.perf_counter() - start
+    print(
+        f"\nPipeline finished in {elapsed:.1f}s: {stats['categories']} categories, "
+        f"{stats['links']} new links, {stats['http'] + stats['selenium']} products "
+        f"(HTTP {stats['http']}, Selenium {stats['selenium']})"
+    )
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(
+        description="Crawl categories, product links and product details as one "
+        "streaming pipeline"
+    )
+    parser.add_argument(
+        "--link-workers",
+        type=int,
+        default=2,
+        help="Categories whose listing pages are crawled at the same time",
+    )
+    parser.add_argument(
+        "--listing-concurrency",
+        type=int,
+        default=get_link.CONCURRENCY,
+        help="Listing pages fetched in parallel within one category",
+    )
+    parser.add_argument(
+        "--product-workers",
+        type=int,
+        default=2,
+        help="Product crawler threads, each with its own Chrome",
+    )
+    parser.add_argument(
+        "--queue-size",
+        type=int,
+        default=200,
+        help="Product links buffered between the listing and product stages",
+    )
+    parser.add_argument(
+        "--max-products",
+        type=int,
+        default=get_link.MAX_PRODUCTS,
+        help="Maximum products taken from each category",
+    )
+    parser.add_argument(
+        "--tree-cache",
+        default=category_tree.TREE_CACHE,
+        help="JSON file caching the extracted category tree",
+    )
+    parser.add_argument(
+        "--ttl",
+        type=float,
+        default=category_tree.DEFAULT_TTL / 3600,
+        help="Hours a cached category tree is reused; 0 always refetches",
+    )
+    # Product stage options, with the same names and defaults as product.py
+    parser.add_argument("--http-first", action="store_true")
+    parser.add_argument(
+        "--output-format", choices=["csv", "sqlite", "parquet"], default="csv"
+    )
+    parser.add_argument("--batch-size", type=int, default=None)
+    parser.add_argument("--flush-interval", type=float, default=30.0)
+    parser.add_argument(
+        "--block-profile",
+        choices=sorted(network_profile.PROFILES),
+        default="default",
+    )
+    parser.add_argument("--politeness-delay", type=float, default=0.5)
+    parser.add_argument("--max-retries", type=int, default=3)
+    parser.add_argument("--max-pages-per-driver", type=int, default=200)
+    parser.add_argument("--max-driver-rss-mb", type=float, default=2048)
+    parser.add_argument("--description-store", metavar="DIR", default=None)
+    parser.add_argument("--archive", metavar="DIR", default=None)
+    parser.add_argument(
+        "--metrics",
+        metavar="DIR",
+        default=os.environ.get(metrics.METRICS_ENV),
+        help="Write stage timings and counters to DIR "
+        f"(default: ${metrics.METRICS_ENV})",
+    )
+    parser.add_argument("--metrics-interval", type=float, default=30.0)
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    if args.metrics:
+        metrics.enable(args.metrics, "pipeline", args.metrics_interval)
+    try:
+        run(args)
+    finally:
+        metrics.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,361 @@
+import argparse
+import ast
+import itertools
+import os
+import sqlite3
+import time
+
+import numpy as np
+import pandas as pd
+
+DETAILS_CSV = "banggood_product_details.csv"
+PRICES_CSV = "banggood_product_prices.csv"
+HISTORY_DB = "banggood_price_history.db"
+CHUNKSIZE = 1000000
+
+# Same rules as columnar.parse_price: "US$12.99" -> ("US$", 12.99)
+PRICE_PATTERN = r"(?P<currency>[^\d\s.,-]*)\s*(?P<amount>[\d.,]+)"
+INT_PATTERN = r"(\d+)"
+PRODUCT_ID_PATTERN = r"-p-(\d+)\.html"
+
+OPTION_FIELDS = ["option_name", "price", "stock"]
+# option_details cells are str(list) of these dicts, as written by
+# crawl_product and sku_state: "[{'option_name': 'Red', 'price': ..., 'stock': ...}]"
+OPTIONS_HEAD = "[{'option_name': "
+OPTIONS_TAIL = "}]"
+# Between consecutive field values, with the closing and opening quotes
+FIELD_SEPARATORS = ["', 'price': '", "', 'stock': '", "'}, {'option_name': '"]
+# str() puts a value in double quotes when it contains a single quote
+FIELD_SEPARATOR_PATTERN = r"""['"](?:, 'price': |, 'stock': |\}, \{'option_name': )['"]"""
+FIELD_MARK = "\x1f"
+# Backslash escapes only appear when a value holds both kinds of quote; a
+# FIELD_MARK inside a value would shift every later field
+ESCAPED_PATTERN = r"[\\\x1f]"
+
+# The product's own price is kept under this option name
+BASE_OPTION = ""
+KEY = ["product_id", "option_name"]
+PRICE_COLUMNS = KEY + ["price", "currency", "amount", "stock", "stock_qty"]
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS price_history (
+    product_id INTEGER NOT NULL,
+    option_name TEXT NOT NULL,
+    observed_at REAL NOT NULL,
+    currency TEXT,
+    amount REAL,
+    stock_qty INTEGER
+);
+CREATE INDEX IF NOT EXISTS idx_price_history_key
+    ON price_history (product_id, option_name);
+"""
+
+
+def _map_unique(values, parse):
+    # Prices and stock strings repeat across millions of rows: parse each
+    # distinct string once and broadcast the result back through the codes
+    codes, uniques = pd.factorize(values)
+    parsed = parse(pd.Series(uniques, dtype=object)).reset_index(drop=True)
+    # Missing values get code -1; point them at an all-NaN row past the end
+    parsed = parsed.reindex(range(len(uniques) + 1))
+    codes = np.where(codes < 0, len(uniques), codes)
+    result = parsed.iloc[codes]
+    result.index = values.index
+    return result
+
+
+def _parse_price_strings(values):
+    parts = values.str.extract(PRICE_PATTERN)
+    amount = pd.to_numeric(
+        parts["amount"].str.replace(",", "", regex=False), errors="coerce"
+    )
+    currency = parts["currency"].where(amount.notna() & (parts["currency"] != ""))
+    return pd.DataFrame({"currency": currency, "amount": amount})
+
+
+def _parse_int_strings(values):
+    qty = pd.to_numeric(values.str.extract(INT_PATTERN)[0], errors="coerce")
+    return pd.DataFrame({"qty": qty})
+
+
+def parse_prices(values):
+    # Series of raw price strings -> DataFrame with currency and amount columns;
+    # "Price not found" and empty cells give NaN
+    return _map_unique(values, _parse_price_strings)
+
+
+def parse_ints(values):
+    return _map_unique(values, _parse_int_strings)["qty"].astype("Int64")
+
+
+def product_ids(products):
+    # The product_id column, or the id in the URL where it is missing
+    if "product_id" in products:
+        ids = pd.to_numeric(products["product_id"], errors="coerce")
+    else:
+        ids = pd.Series(np.nan, index=products.index)
+    missing = ids.isna()
+    if missing.any():
+        from_url = products.loc[missing, "product_url"].str.extract(PRODUCT_ID_PATTERN)
+        ids[missing] = pd.to_numeric(from_url[0], errors="coerce")
+    return ids.astype("Int64")
+
+
+def _literal_options(details):
+    # Slow path for cells with quoted or escaped values or another layout
+    rows = []
+    for row, value in details.items():
+        try:
+            options = ast.literal_eval(value)
+        except (ValueError, SyntaxError):
+            continue
+        if not isinstance(options, list):
+            continue
+        for position, option in enumerate(options):
+            if isinstance(option, dict):
+                rows.append(
+                    dict(
+                        {field: option.get(field) for field in OPTION_FIELDS},
+                        row=row,
+                        option_index=position,
+                    )
+                )
+    return pd.DataFrame(rows, columns=["row", "option_index"] + OPTION_FIELDS).set_index(
+        "row"
+    )
+
+
+def _split_fields(core):
+    # FIELD_MARK separated cells -> values per cell, and names, prices and
+    # stocks as flat arrays. pyarrow splits without building a Python list per
+    # cell; pandas is the fallback
+    step = len(OPTION_FIELDS)
+    try:
+        import pyarrow as pa
+        import pyarrow.compute as pc
+    except ImportError:
+        parts = core.str.split(FIELD_MARK, regex=False)
+        values = parts.explode().to_numpy()
+        return parts.str.len().to_numpy(), [values[i::step] for i in range(step)]
+    parts = pc.split_pattern(pa.array(core, type=pa.large_string()), FIELD_MARK)
+    values = pc.list_flatten(parts)
+    return pc.list_value_length(parts).to_numpy(), [
+        values.take(pa.array(np.arange(i, len(values), step))).to_pandas().array
+        for i in range(step)
+    ]
+
+
+def explode_options(products):
+    # One row per (product row, option), indexed by the product row label.
+    # Cells in the usual layout are cut on the fixed field separators for the
+    # whole column at once; anything else goes through ast.literal_eval
+    details = products["option_details"].dropna()
+    details = details[details.str.len() > 2]
+    plain = (
+        details.str.startswith(OPTIONS_HEAD)
+        & details.str.endswith(OPTIONS_TAIL)
+        & ~details.str.contains(ESCAPED_PATTERN, regex=True)
+    )
+    cells = details[plain]
+    # Drop the head and tail along with the first and last value's quotes
+    core = cells.str.slice(len(OPTIONS_HEAD) + 1, -len(OPTIONS_TAIL) - 1)
+    quoted = core.str.contains('"', regex=False)
+    if quoted.any():
+        core[quoted] = core[quoted].str.replace(
+            FIELD_SEPARATOR_PATTERN, FIELD_MARK, regex=True
+        )
+    for separator in FIELD_SEPARATORS:
+        core = core.str.replace(separator, FIELD_MARK, regex=False)
+    lengths, fields = _split_fields(core)
+    good = lengths % len(OPTION_FIELDS) == 0
+    if not good.all():
+        # A value that itself looks like a separator: parse those cells slowly
+        plain[plain] = good
+        cells, core = cells[good], core[good]
+        lengths, fields = _split_fields(core)
+    counts = lengths // len(OPTION_FIELDS)
+
+    rows = np.repeat(cells.index.to_numpy(), counts)
+    first = np.repeat(np.cumsum(counts) - counts, counts)
+    options = pd.DataFrame(
+        dict(zip(OPTION_FIELDS, fields), option_index=np.arange(len(rows)) - first),
+        index=rows,
+    )[["option_index"] + OPTION_FIELDS]
+
+    if not plain.all():
+        options = pd.concat([options, _literal_options(details[~plain])])
+        # Keep file order so the later copy of a re-crawled product wins
+        options = options.sort_index(kind="stable")
+    return options
+
+
+def price_table(products):
+    # Long table with the product price under BASE_OPTION plus one row per option
+    ids = product_ids(products)
+    base = pd.DataFrame(
+        {
+            "product_id": ids,
+            "option_name": BASE_OPTION,
+            "price": products["price"],
+            "stock": None,
+        }
+    )
+    options = explode_options(products)
+    options.insert(0, "product_id", ids.loc[options.index].to_numpy())
+    table = pd.concat([base, options.drop(columns="option_index")], ignore_index=True)
+    # Options without a label are named the way sku_state names them
+    table["option_name"] = table["option_name"].fillna("Default")
+    prices = parse_prices(table["price"])
+    table["currency"] = prices["currency"]
+    table["amount"] = prices["amount"]
+    table["stock_qty"] = parse_ints(table["stock"])
+    table = table[table["product_id"].notna()]
+    # A product crawled twice in one file: the later row is the newer one
+    return table[PRICE_COLUMNS].drop_duplicates(KEY, keep="last")
+
+
+def iter_products(source, chunksize=CHUNKSIZE):
+    # Product rows from a details CSV or a products SQLite file, in chunks
+    columns = ["product_url", "product_id", "price", "option_details"]
+    if source.endswith(".db"):
+        conn = sqlite3.connect(source)
+        try:
+            yield from pd.read_sql_query(
+                f"SELECT {', '.join(columns)} FROM products", conn, chunksize=chunksize
+            )
+        finally:
+            conn.close()
+        return
+    yield from pd.read_csv(source, dtype=str, usecols=columns, chunksize=chunksize)
+
+
+def open_history(path=HISTORY_DB):
+    conn = sqlite3.connect(path)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.executescript(SCHEMA)
+    return conn
+
+
+def latest_prices(conn):
+    # Rows are only ever appended, so the highest rowid per key is the latest
+    latest = pd.read_sql_query(
+        "SELECT product_id, option_name, currency, amount, stock_qty "
+        "FROM price_history WHERE rowid IN "
+        "(SELECT MAX(rowid) FROM price_history GROUP BY product_id, option_name)",
+        conn,
+    )
+    latest["product_id"] = latest["product_id"].astype("Int64")
+    latest["stock_qty"] = latest["stock_qty"].astype("Int64")
+    return latest
+
+
+def _differs(new, old):
+    # NaN on both sides counts as unchanged
+    return ~((new == old).fillna(False) | (new.isna() & old.isna()))
+
+
+def changed_prices(table, latest):
+    # New keys, and keys whose currency or amount moved since the last snapshot
+    merged = table.merge(
+        latest[KEY + ["currency", "amount"]],
+        on=KEY,
+        how="left",
+        suffixes=("", "_last"),
+        indicator=True,
+    )
+    changed = (
+        (merged["_merge"] == "left_only")
+        | _differs(merged["amount"], merged["amount_last"])
+        | _differs(merged["currency"], merged["currency_last"])
+    )
+    return table[changed.to_numpy()]
+
+
+def _column(values):
+    # Python ints/floats/strs with None for missing, converted in one pass
+    return values.to_numpy(dtype=object, na_value=None).tolist()
+
+
+def append_history(conn, changed, observed_at):
+    # Bound straight from the column arrays: no per-row pandas objects
+    columns = [_column(changed[name]) for name in KEY + ["currency", "amount", "stock_qty"]]
+    product_id, option_name, currency, amount, stock_qty = columns
+    with conn:
+        conn.executemany(
+            "INSERT INTO price_history "
+            "(product_id, option_name, observed_at, currency, amount, stock_qty) "
+            "VALUES (?, ?, ?, ?, ?, ?)",
+            zip(
+                product_id,
+                option_name,
+                itertools.repeat(observed_at),
+                currency,
+                amount,
+                stock_qty,
+            ),
+        )
+    return len(changed)
+
+
+def run(args):
+    if not os.path.isfile(args.details):
+        print(f"Error: File '{args.details}' not found.")
+        return
+    conn = open_history(args.history)
+    latest = latest_prices(conn)
+    print(f"{len(latest)} products and options already in {args.history}")
+    observed_at = time.time()
+    start = time.perf_counter()
+    rows = prices = appended = 0
+    try:
+        for chunk in iter_products(args.details, args.chunksize):
+            table = price_table(chunk)
+            if args.prices_out:
+                table.to_csv(
+                    args.prices_out,
+                    mode="a" if prices else "w",
+                    header=not prices,
+                    index=False,
+                )
+            changed = changed_prices(table, latest)
+            appended += append_history(conn, changed, observed_at)
+            latest = pd.concat([latest, changed[latest.columns]]).drop_duplicates(
+                KEY, keep="last"
+            )
+            rows += len(chunk)
+            prices += len(table)
+            elapsed = time.perf_counter() - start
+            print(
+                f"{rows} products, {prices} prices in {elapsed:.1f}s "
+                f"({rows / elapsed:.0f} rows/s), {appended} history rows appended"
+            )
+    finally:
+        conn.close()
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(
+        description="Normalize product and option prices and append changes to "
+        "the price history"
+    )
+    parser.add_argument(
+        "--details",
+        default=DETAILS_CSV,
+        help="Product details CSV, or the products SQLite file (*.db)",
+    )
+    parser.add_argument(
+        "--history",
+        default=HISTORY_DB,
+        help="SQLite file with the append-only price history",
+    )
+    parser.add_argument(
+        "--prices-out",
+        default=PRICES_CSV,
+        help="CSV with one row per product and option; empty to skip",
+    )
+    parser.add_argument("--chunksize", type=int, default=CHUNKSIZE)
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    run(parse_args())
@@ -1,18 +1,44 @@
-from selenium import webdriver
-from selenium.webdriver.chrome.options import Options
-from selenium.webdriver.common.by import By
-from selenium.webdriver.support.ui import WebDriverWait
-from selenium.webdriver.support import expected_conditions as EC
-import random
+import argparse
+import multiprocessing
 import time
-import pandas as pd
-import csv
+import browser
+import http_fetch
+import id_index
+import response_archive
+import recrawl
+import metrics
+import rate_control
+import work_queue
+import sku_state
+import extraction_plan
+import crawl_state
+import sinks
+import network_profile
+import wait_controller
+import driver_manager
 import os
 import re
-from selenium.common.exceptions import WebDriverException, NoSuchElementException
+from queue import Empty
 
+PRODUCT_FIELDNAMES = [
+    "lv3_title",
+    "lv3_href",
+    "product_url",
+    "product_id",
+    "title",
+    "price",
+    "sku_properties",
+    "image_urls",
+    "option_details",
+]
+# How often the parent checks for workers that died without saying "done"
+RESULT_POLL_SECONDS = 5
+
+
+def setup_driver(block_profile="default", collect_stats=False, attach=None):
+    # Selenium is imported on first use so HTTP-only and replay runs never load it
+    from selenium.webdriver.chrome.options import Options
 
-def setup_driver():
     options = Options()
     options.add_argument("--headless")  # Uncomment for headless mode
     options.add_argument("--disable-gpu")
@@ -23,29 +49,12 @@ def setup_driver():
     options.add_argument(
         "user-agent=Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36"
     )
-    driver = webdriver.Chrome(options=options)
+    network_profile.apply_options(options, block_profile, collect_stats)
+    driver = browser.create_driver(options, attach)
+    network_profile.apply_blocking(driver, block_profile)
     return driver
 
 
-def save_product_to_csv(product, output_csv_file, fieldnames):
-    mode = "a" if os.path.isfile(output_csv_file) else "w"
-    with open(output_csv_file, mode=mode, newline="", encoding="utf-8") as csvfile:
-        writer = csv.DictWriter(csvfile, fieldnames=fieldnames)
-        if mode == "w":
-            writer.writeheader()
-        writer.writerow(product)
-
-
-def save_description_to_csv(description_data, description_csv_file):
-    fieldnames = ["product_url", "product_id", "description"]
-    mode = "a" if os.path.isfile(description_csv_file) else "w"
-    with open(description_csv_file, mode=mode, newline="", encoding="utf-8") as csvfile:
-        writer = csv.DictWriter(csvfile, fieldnames=fieldnames)
-        if mode == "w":
-            writer.writeheader()
-        writer.writerow(description_data)
-
-
 def get_product_id_from_url(url):
     match = re.search(r"-p-(\d+)\.html", url)
     return match.group(1) if match else None
@@ -54,6 +63,8 @@ def get_product_id_from_url(url):
 def get_crawled_urls(output_csv_file):
     crawled_urls = set()
     if os.path.isfile(output_csv_file):
+        import pandas as pd
+
         try:
             df = pd.read_csv(output_csv_file)
             if "product_url" in df.columns:
@@ -63,20 +74,53 @@ def get_crawled_urls(output_csv_file):
     return crawled_urls
 
 
+def block_property(block):
+    # One product-block read by the extraction plan -> sku_properties entry
+    if not block["name"]:
+        return None
+    options = block["options"]
+    sku_values = [option["title"].strip() for option in options if option["title"]]
+    active_value = next(
+        (
+            (option["title"] or "").strip()
+            for option in options
+            if "active" in (option["class"] or "")
+        ),
+        sku_values[0] if sku_values else "Unknown",
+    )
+    return {
+        "sku_property": block["name"].replace(":", "").strip(),
+        "sku_values": sku_values,
+        "active_value": active_value,
+    }
+
+
+def warehouse_property(warehouse):
+    warehouse_values = [option["text"] for option in warehouse["options"]]
+    active_warehouse = next(
+        (
+            option["text"]
+            for option in warehouse["options"]
+            if "active" in (option["class"] or "")
+        ),
+        (warehouse_values[0] if warehouse_values else warehouse["name"]),
+    )
+    return {
+        "sku_property": "Ship From",
+        "sku_values": warehouse_values,
+        "active_value": active_warehouse,
+    }
+
+
 def crawl_product(
-    driver, product_url, lv3_title, category_url, output_csv_file, description_csv_file
+    driver, product_url, lv3_title, category_url, sink, waits=None, archive=None
 ):
-    fieldnames = [
-        "lv3_title",
-        "lv3_href",
-        "product_url",
-        "product_id",
-        "title",
-        "price",
-        "sku_properties",
-        "image_urls",
-        "option_details",
-    ]
+    from selenium.common.exceptions import WebDriverException
+    from selenium.webdriver.common.by import By
+    from selenium.webdriver.support import expected_conditions as EC
+
+    if waits is None:
+        waits = wait_controller.WaitController()
     product_id = get_product_id_from_url(product_url)
     title = None
     price = "Price not found"
@@ -87,113 +131,93 @@ def crawl_product(
 
     try:
         print(f"Crawling product: {product_url}")
-        driver.get(product_url)
+        with metrics.stage("product:get"):
+            driver.get(product_url)
+        # Nothing of a captcha page may reach the sink; crawl_rows backs off and refetches
+        if rate_control.looks_like_captcha(title=driver.title):
+            raise rate_control.CaptchaError(f"Captcha page instead of {product_url}")
 
-        # Extract title
+        # Wait for the title, then read the static page structure in one call
         try:
-            wait = WebDriverWait(driver, 1)
-            title_tag = wait.until(
+            waits.until(
+                driver,
+                "product:title",
                 EC.presence_of_element_located(
                     (
                         By.XPATH,
                         '//h1[@class="product-title"]//span[@class="product-title-text"]',
                     )
-                )
+                ),
+                timeout=10,
             )
-            title = title_tag.text.strip()
         except Exception as e:
             print(f"Could not find product title: {e}")
 
+        page = {"title": None, "price": None, "blocks": [], "warehouse": None, "images": []}
+        try:
+            with metrics.stage("product:extract"):
+                page = extraction_plan.run_plan(driver)
+        except Exception as e:
+            print(f"Error running extraction plan: {e}")
+        title = page["title"]
+
         # Extract SKU properties and iterate through options
         try:
-            product_blocks = driver.find_elements(
-                By.XPATH, '//div[contains(@class, "product-block")]'
-            )
-            for block in product_blocks:
+            # Read every SKU combination from the page state; clicking is the fallback
+            try:
+                with metrics.stage("product:sku_state"):
+                    option_details = sku_state.extract_option_details(
+                        driver.page_source, page["price"]
+                    )
+            except Exception as e:
+                print(f"Could not read SKU data from page state: {e}")
+                option_details = []
+            from_page_state = bool(option_details)
+            if from_page_state:
+                print(f"Extracted {len(option_details)} SKU combinations from page state")
+
+            product_blocks = None
+            for block_index, block in enumerate(page["blocks"]):
                 try:
-                    try:
-                        property_name_tag = block.find_element(
-                            By.XPATH,
-                            './/div[contains(@class, "block-title")]//em',
-                        )
-                        property_name = property_name_tag.text.replace(":", "").strip()
-                    except NoSuchElementException:
+                    sku_property = block_property(block)
+                    if sku_property is None:
                         print("No block-title em found, skipping this block")
                         continue
+                    sku_properties.append(sku_property)
+                    options = block["options"]
 
-                    img_tags = block.find_elements(
+                    if from_page_state or not sku_property["sku_values"]:
+                        continue
+
+                    # Fallback: option elements are only looked up when we must click
+                    if product_blocks is None:
+                        product_blocks = driver.find_elements(
+                            By.XPATH, '//div[contains(@class, "product-block")]'
+                        )
+                    block_element = product_blocks[block_index]
+                    img_tags = block_element.find_elements(
                         By.XPATH, './/a[contains(@class, "imgtag")]'
                     )
                     option_elements = (
                         img_tags
                         if img_tags
-                        else block.find_elements(By.XPATH, './/a[@href="javascript:;"]')
-                    )
-
-                    sku_values = [
-                        el.get_attribute("title").strip()
-                        for el in option_elements
-                        if el.get_attribute("title")
-                    ]
-                    active_value = next(
-                        (
-                            el.get_attribute("title").strip()
-                            for el in option_elements
-                            if "active" in el.get_attribute("class")
-                        ),
-                        sku_values[0] if sku_values else "Unknown",
-                    )
-                    sku_properties.append(
-                        {
-                            "sku_property": property_name,
-                            "sku_values": sku_values,
-                            "active_value": active_value,
-                        }
+                        else block_element.find_elements(
+                            By.XPATH, './/a[@href="javascript:;"]'
+                        )
                     )
 
-                    for el in option_elements:
-                        option_name = el.get_attribute("title").strip()
+                    for el, option in zip(option_elements, options):
+                        option_name = (option["title"] or "").strip()
                         if not option_name:
                             continue
                         try:
-                            driver.execute_script("arguments[0].click();", el)
-
-                            try:
-                                price_tag = wait.until(
-                                    EC.presence_of_element_located(
-                                        (
-                                            By.XPATH,
-                                            '//div[@class="product-newbie-price"]//div[@class="newbie-price"]',
-                                        )
-                                    )
-                                )
-                                option_price = price_tag.text.strip()
-                            except Exception:
-                                try:
-                                    price_tag = wait.until(
-                                        EC.presence_of_element_located(
-                                            (
-                                                By.XPATH,
-                                                '//span[contains(@class, "main-price")]',
-                                            )
-                                        )
-                                    )
-                                    option_price = price_tag.text.strip()
-                                except Exception:
-                                    option_price = "Price not found"
-
-                            try:
-                                stock_tag = wait.until(
-                                    EC.presence_of_element_located(
-                                        (
-                                            By.XPATH,
-                                            '//div[@data-spm="0000000Cr" and contains(@class, "pcs")]//em',
-                                        )
-                                    )
+                            with metrics.stage("product:option_click"):
+                                driver.execute_script("arguments[0].click();", el)
+                                state = extraction_plan.run_plan(
+                                    driver, extraction_plan.COMPILED_OPTION_PLAN
                                 )
-                                stock = stock_tag.text.strip()
-                            except Exception:
-                                stock = "Stock not found"
+                            option_price = state["price"] or "Price not found"
+                            stock = state["stock"] or "Stock not found"
 
                             option_details.append(
                                 {
@@ -214,160 +238,110 @@ def crawl_product(
                     continue
 
             # Extract warehouse
-            try:
-                warehouse_block = driver.find_element(
-                    By.XPATH, '//div[contains(@class, "product-warehouse")]'
-                )
-                warehouse_name = warehouse_block.find_element(
-                    By.XPATH,
-                    './/div[contains(@class, "block-title")]//span[@class="text-name"]',
-                ).text.strip()
-                warehouse_values = [
-                    a_tag.text.strip()
-                    for a_tag in warehouse_block.find_elements(
-                        By.XPATH, ".//a[@data-warehouse]"
-                    )
-                ]
-                active_warehouse = next(
-                    (
-                        a_tag.text.strip()
-                        for a_tag in warehouse_block.find_elements(
-                            By.XPATH, ".//a[@data-warehouse]"
-                        )
-                        if "active" in a_tag.get_attribute("class")
-                    ),
-                    (warehouse_values[0] if warehouse_values else warehouse_name),
-                )
-                sku_properties.append(
-                    {
-                        "sku_property": "Ship From",
-                        "sku_values": warehouse_values,
-                        "active_value": active_warehouse,
-                    }
-                )
-            except Exception as e:
-                print(f"Could not extract warehouse info: {e}")
+            if page["warehouse"]:
+                sku_properties.append(warehouse_property(page["warehouse"]))
+            else:
+                print("Could not extract warehouse info: no product-warehouse block")
 
         except Exception as e:
             print(f"Error extracting SKU properties: {e}")
 
         # Extract default price if no options were processed
         if not option_details:
+            if page["price"]:
+                price = page["price"]
+            else:
+                print("Could not find newbie-price or main-price element.")
+                price = "Price not found"
+
+        # Extract product description
+        with metrics.stage("product:description"):
             try:
-                price_tag = wait.until(
-                    EC.presence_of_element_located(
-                        (
-                            By.XPATH,
-                            '//div[@class="product-newbie-price"]//div[@class="newbie-price"]',
-                        )
-                    )
-                )
-                price = price_tag.text.strip()
-            except Exception:
                 try:
-                    price_tag = wait.until(
+                    tab_section = waits.until(
+                        driver,
+                        "product:tab_section",
                         EC.presence_of_element_located(
                             (
                                 By.XPATH,
-                                '//span[contains(@class, "main-price")]',
+                                '//div[@data-spm="0000000UL" and contains(@class, "tab-cnt")]',
                             )
-                        )
+                        ),
+                        timeout=1,
                     )
-                    price = price_tag.text.strip()
-                except Exception:
-                    print("Could not find newbie-price or main-price element.")
-                    price = "Price not found"
-
-        # Extract product description
-        try:
-            try:
-                tab_section = wait.until(
-                    EC.presence_of_element_located(
-                        (
-                            By.XPATH,
-                            '//div[@data-spm="0000000UL" and contains(@class, "tab-cnt")]',
-                        )
+                    driver.execute_script(
+                        "arguments[0].scrollIntoView({block: 'center'});", tab_section
                     )
-                )
-                driver.execute_script(
-                    "arguments[0].scrollIntoView({behavior: 'smooth', block: 'center'});",
-                    tab_section,
-                )
-                print("Scrolled to description section")
-                time.sleep(random.uniform(1, 2))
-            except Exception as e:
-                print(f"Could not scroll to tab-cnt: {e}")
+                    print("Scrolled to description section")
+                    # Lazy content starts loading on scroll; wait until requests settle
+                    waits.settle(driver, "product:scroll_idle")
+                except Exception as e:
+                    print(f"Could not scroll to tab-cnt: {e}")
 
-            try:
-                description_tab = wait.until(
-                    EC.element_to_be_clickable(
-                        (
-                            By.XPATH,
-                            '//a[contains(@class, "tab-nav-item") and contains(text(), "Description")]',
-                        )
+                try:
+                    description_tab = waits.until(
+                        driver,
+                        "product:description_tab",
+                        EC.element_to_be_clickable(
+                            (
+                                By.XPATH,
+                                '//a[contains(@class, "tab-nav-item") and contains(text(), "Description")]',
+                            )
+                        ),
+                        timeout=1,
                     )
-                )
-                driver.execute_script("arguments[0].click();", description_tab)
-                print("Clicked 'Description' tab")
-            except Exception:
-                print("No 'Description' tab found or already active")
+                    driver.execute_script("arguments[0].click();", description_tab)
+                    print("Clicked 'Description' tab")
+                except Exception:
+                    print("No 'Description' tab found or already active")
 
-            try:
-                more_button = wait.until(
-                    EC.element_to_be_clickable(
-                        (
-                            By.XPATH,
-                            '//div[@data-spm="0000000UL" and contains(@class, "tab-cnt")]//a[contains(@class, "product-description-main-more")]',
-                        )
+                try:
+                    more_button = waits.until(
+                        driver,
+                        "product:more_button",
+                        EC.element_to_be_clickable(
+                            (
+                                By.XPATH,
+                                '//div[@data-spm="0000000UL" and contains(@class, "tab-cnt")]//a[contains(@class, "product-description-main-more")]',
+                            )
+                        ),
+                        timeout=1,
                     )
-                )
-                driver.execute_script("arguments[0].click();", more_button)
-                print("Clicked 'Show More' button")
-                time.sleep(random.uniform(1, 2))
-            except Exception:
-                print("No 'Show More' button found or not clickable")
+                    driver.execute_script("arguments[0].click();", more_button)
+                    print("Clicked 'Show More' button")
+                    waits.settle(driver, "product:more_idle")
+                except Exception:
+                    print("No 'Show More' button found or not clickable")
 
-            description_div = wait.until(
-                EC.presence_of_element_located(
-                    (
-                        By.XPATH,
-                        '//div[@data-spm="0000000UL" and contains(@class, "tab-cnt")]//div[contains(@class, "product-description-main-box")]',
-                    )
+                description_div = waits.until(
+                    driver,
+                    "product:description",
+                    EC.presence_of_element_located(
+                        (By.XPATH, extraction_plan.DESCRIPTION_XPATH)
+                    ),
+                    timeout=1,
                 )
-            )
-            description = description_div.get_attribute("innerHTML").strip()
-            print("Successfully extracted product description")
-        except Exception as e:
-            print(f"Error extracting product description: {e}")
-            description = "Description not found"
+                description = description_div.get_attribute("innerHTML").strip()
+                print("Successfully extracted product description")
+            except Exception as e:
+                print(f"Error extracting product description: {e}")
+                description = "Description not found"
 
-        # Save description to separate CSV
+        # Description is written to a separate output together with the product
+        description_data = None
         if description:
             description_data = {
                 "product_url": product_url,
                 "product_id": product_id,
                 "description": description,
             }
-            save_description_to_csv(description_data, description_csv_file)
 
         # Extract all image URLs
-        try:
-            image_elements = wait.until(
-                EC.presence_of_all_elements_located(
-                    (
-                        By.XPATH,
-                        '//ul[@data-spm="0000000W4" and contains(@class, "list cf")]//img[@data-spm="0000000Wa"]',
-                    )
-                )
-            )
-            image_urls = [
-                img.get_attribute("src").strip()
-                for img in image_elements
-                if img.get_attribute("src")
-            ]
+        image_urls = [src.strip() for src in page["images"] if src]
+        if image_urls:
             print(f"Extracted {len(image_urls)} image URLs")
-        except Exception as e:
-            print(f"Error extracting image URLs: {e}")
+        else:
+            print("Error extracting image URLs: no gallery images found")
 
         product_info = {
             "lv3_title": lv3_title,
@@ -376,26 +350,606 @@ def crawl_product(
             "product_id": product_id,
             "title": title,
             "price": price,
-            "sku_properties": str(sku_properties),
-            "image_urls": str(image_urls),
-            "option_details": str(option_details),
+            "sku_properties": sku_properties,
+            "image_urls": image_urls,
+            "option_details": option_details,
         }
-        save_product_to_csv(product_info, output_csv_file, fieldnames)
+        if archive is not None:
+            # Rendered DOM, so later parser fixes can be replayed without Chrome
+            archive.put_rendered(product_url, driver.page_source)
+        with metrics.stage("product:write"):
+            sink.write(product_info, description_data)
         print(f"Saved product data for {product_url}")
 
+    except (WebDriverException, rate_control.CaptchaError):
+        # Let crawl_rows retry on a fresh browser instead of losing the product
+        raise
     except Exception as e:
         print(f"Error crawling product {product_url}: {e}")
 
 
+def product_records(product_url, lv3_title, category_url, data):
+    product_id = get_product_id_from_url(product_url)
+    description_data = {
+        "product_url": product_url,
+        "product_id": product_id,
+        "description": data["description"],
+    }
+    product_info = {
+        "lv3_title": lv3_title,
+        "lv3_href": category_url,
+        "product_url": product_url,
+        "product_id": product_id,
+        "title": data["title"],
+        "price": data["price"],
+        "sku_properties": data["sku_properties"],
+        "image_urls": data["image_urls"],
+        "option_details": data["option_details"],
+    }
+    return product_info, description_data
+
+
+def crawl_product_http(session, product_url, lv3_title, category_url, sink, archive=None):
+    with metrics.stage("product:http_fetch"):
+        html = http_fetch.fetch_page(session, product_url, archive=archive)
+    if html is None:
+        return False
+    with metrics.stage("product:http_parse"):
+        data = http_fetch.parse_product_html(html, product_url)
+    if http_fetch.needs_selenium(data):
+        print(f"Static HTML incomplete for {product_url}, escalating to Selenium")
+        return False
+
+    sink.write(*product_records(product_url, lv3_title, category_url, data))
+    print(f"Saved product data for {product_url} via HTTP")
+    return True
+
+
+def page_data(page, html):
+    # What crawl_product would store for this page, minus option clicking:
+    # option prices come from the embedded page state only
+    block_properties = [
+        sku_property
+        for sku_property in map(block_property, page["blocks"])
+        if sku_property is not None
+    ]
+    has_options = any(p["sku_values"] for p in block_properties)
+    option_details = (
+        sku_state.extract_option_details(html, page["price"]) if has_options else []
+    )
+    warehouse = [warehouse_property(page["warehouse"])] if page["warehouse"] else []
+    return {
+        "title": page["title"],
+        "price": (
+            "Price not found" if option_details or not page["price"] else page["price"]
+        ),
+        "sku_properties": block_properties + warehouse,
+        "image_urls": [src.strip() for src in page["images"] if src],
+        "description": page.get("description") or None,
+        "option_details": option_details,
+        "has_options": has_options,
+    }
+
+
+def replay_page(item):
+    # Archived pages go through the same XPath plan as crawl_product, so a
+    # fixed selector in extraction_plan shows up without recrawling
+    product_url, html = item
+    page = extraction_plan.run_plan_html(html, extraction_plan.REPLAY_PLAN, product_url)
+    return product_url, page_data(page, html)
+
+
+def iter_archived_pages(archive):
+    for row in archive.iter_latest():
+        if get_product_id_from_url(row["url"]) is None:
+            continue
+        yield row["url"], archive.read(row)
+
+
+def replay_archive(archive, sink, links, workers=1):
+    # Re-run extraction over archived pages: no browser, no network
+    stats = {"replayed": 0, "incomplete": 0}
+    pages = iter_archived_pages(archive)
+    pool = multiprocessing.Pool(workers) if workers > 1 else None
+    try:
+        results = (
+            pool.imap(replay_page, pages, chunksize=16)
+            if pool is not None
+            else map(replay_page, pages)
+        )
+        for product_url, data in results:
+            link = links.get(product_url, {})
+            sink.write(
+                *product_records(
+                    product_url, link.get("lv3", ""), link.get("lv3_href", ""), data
+                )
+            )
+            stats["replayed"] += 1
+            if http_fetch.needs_selenium(data):
+                stats["incomplete"] += 1
+    finally:
+        if pool is not None:
+            pool.close()
+            pool.join()
+    return stats
+
+
+def record_status(state, result_queue, product_url, status, error=None):
+    # Workers report through the queue so only the parent writes to the state store
+    if result_queue is not None:
+        result_queue.put(("status", (product_url, status, error)))
+    elif state is not None:
+        crawl_state.mark(state, crawl_state.PRODUCT, product_url, status, error)
+
+
+def crawl_rows(rows, sink, args, state=None, result_queue=None, network_stats=None):
+    from selenium.common.exceptions import WebDriverException
+
+    drivers = driver_manager.DriverManager(
+        lambda: setup_driver(
+            args.block_profile, network_stats is not None, getattr(args, "attach", None)
+        ),
+        max_pages=args.max_pages_per_driver,
+        max_rss_mb=args.max_driver_rss_mb,
+    )
+    waits = wait_controller.WaitController()
+    # The politeness delay is now the floor of the adaptive pacing
+    max_rate = 1 / args.politeness_delay if args.politeness_delay > 0 else None
+    if result_queue is not None:
+        # A --workers process: its controllers get one share of the host's rate
+        rate_control.configure_share(args.workers, max_rate)
+    elif max_rate:
+        rate_control.configure(max_rate=max_rate)
+    session = http_fetch.create_session() if args.http_first else None
+    archive = response_archive.ResponseArchive(args.archive) if args.archive else None
+    stats = {"http": 0, "selenium": 0}
+
+    try:
+        for row in rows:
+            product_url = row["product_url"]
+            lv3_title = row["lv3"]
+            lv3_href = row["lv3_href"]
+            record_status(state, result_queue, product_url, crawl_state.IN_PROGRESS)
+
+            if session is not None and crawl_product_http(
+                session, product_url, lv3_title, lv3_href, sink, archive
+            ):
+                stats["http"] += 1
+                metrics.page_done("product")
+                print(f"Processed product {sum(stats.values())}: {product_url}")
+                continue
+
+            retries = 0
+            pacing = rate_control.controller(product_url)
+            while retries < args.max_retries:
+                try:
+                    driver = drivers.get()
+                    with pacing.request("browser") as request:
+                        try:
+                            crawl_product(
+                                driver, product_url, lv3_title, lv3_href, sink, waits, archive
+                            )
+                        except WebDriverException:
+                            request.throttled("webdriver")
+                            raise
+                        except rate_control.CaptchaError:
+                            request.throttled("captcha")
+                            raise
+                    if network_stats is not None:
+                        network_stats.record_page(driver)
+                    drivers.page_done()
+                    stats["selenium"] += 1
+                    metrics.page_done("product")
+                    print(f"Processed product {sum(stats.values())}: {product_url}")
+                    break
+
+                except (WebDriverException, rate_control.CaptchaError) as e:
+                    print(f"{type(e).__name__} for {product_url}: {e}")
+                    retries += 1
+                    metrics.inc("retries_total", crawler="product")
+                    drivers.quit()
+                    if retries < args.max_retries:
+                        print(
+                            f"Retrying {product_url} (Attempt {retries + 1}/{args.max_retries})"
+                        )
+                        time.sleep(pacing.backoff(retries))
+                    else:
+                        print(f"Max retries reached for {product_url}. Skipping.")
+                        metrics.inc("failures_total", crawler="product")
+                        record_status(
+                            state, result_queue, product_url, crawl_state.FAILED, str(e)
+                        )
+                        break
+    finally:
+        drivers.quit()
+        if session is not None:
+            session.close()
+        if archive is not None:
+            archive.close()
+    waits.report()
+    rate_control.report()
+    print(f"Driver usage: {drivers.summary()}")
+    return stats
+
+
+def split_rows(rows, workers):
+    # Contiguous, non-overlapping chunks so each worker owns its own slice
+    size, extra = divmod(len(rows), workers)
+    chunks = []
+    start = 0
+    for i in range(workers):
+        end = start + size + (1 if i < extra else 0)
+        if end > start:
+            chunks.append(rows[start:end])
+        start = end
+    return chunks
+
+
+def claimed_rows(queue, args):
+    for product_url, link in work_queue.iter_claimed(
+        queue, work_queue.default_owner(), args.queue_batch, args.lease
+    ):
+        yield dict(link, product_url=product_url)
+
+
+def worker_main(worker_id, rows, args, result_queue):
+    stats = {"http": 0, "selenium": 0}
+    queue = None
+    if rows is None:
+        # Queue mode: each worker claims its own batches
+        queue = work_queue.open_queue(args.queue, "products")
+        rows = claimed_rows(queue, args)
+    network_stats = (
+        network_profile.NetworkStats(args.block_profile) if args.network_stats else None
+    )
+    if args.metrics:
+        metrics.enable(args.metrics, f"product-worker{worker_id}", args.metrics_interval)
+    try:
+        stats = crawl_rows(
+            rows,
+            sinks.QueueSink(result_queue),
+            args,
+            result_queue=result_queue,
+            network_stats=network_stats,
+        )
+    except Exception as e:
+        print(f"Worker {worker_id} stopped with error: {e}")
+    finally:
+        metrics.close()
+        if queue is not None:
+            # Hand unstarted products of the claimed batch back to the queue
+            rows.close()
+            queue.close()
+        if network_stats is not None:
+            result_queue.put(("network", network_stats.counters()))
+        result_queue.put(("done", (worker_id, stats)))
+
+
+def write_results(
+    result_queue, processes, sink, state=None, network_stats=None, chunks=None
+):
+    # Runs until every worker said "done" or died without saying it (OOM
+    # killer, segfault, ...), which is noticed while waiting on the queue
+    running = dict(enumerate(processes))
+    in_progress = set()
+    stats = {"http": 0, "selenium": 0}
+    while running:
+        try:
+            kind, payload = result_queue.get(timeout=RESULT_POLL_SECONDS)
+        except Empty:
+            for worker_id, process in list(running.items()):
+                if not process.is_alive():
+                    del running[worker_id]
+                    worker_died(
+                        worker_id,
+                        process.exitcode,
+                        in_progress,
+                        state,
+                        chunks[worker_id] if chunks else None,
+                    )
+            continue
+        if kind == "record":
+            in_progress.discard(payload[0]["product_url"])
+            sink.write(*payload)
+        elif kind == "status":
+            product_url, status, error = payload
+            if status == crawl_state.IN_PROGRESS:
+                in_progress.add(product_url)
+            else:
+                in_progress.discard(product_url)
+            if state is not None:
+                crawl_state.mark(
+                    state, crawl_state.PRODUCT, product_url, status, error
+                )
+        elif kind == "network":
+            if network_stats is not None:
+                network_stats.merge(payload)
+        elif kind == "done":
+            worker_id, worker_stats = payload
+            running.pop(worker_id, None)
+            for path, count in worker_stats.items():
+                stats[path] += count
+    return stats
+
+
+def worker_died(worker_id, exitcode, in_progress, state, chunk=None):
+    error = f"worker {worker_id} exited with code {exitcode}"
+    print(f"Worker {worker_id} died without finishing (exit code {exitcode})")
+    metrics.inc("failures_total", crawler="worker")
+    if chunk is None:
+        # Queue mode: its leases expire and other workers claim the items again
+        return
+    # The product it was on is failed; the rest of its slice stays pending
+    # and is picked up by the next run
+    for row in chunk:
+        if row["product_url"] in in_progress:
+            in_progress.discard(row["product_url"])
+            if state is not None:
+                crawl_state.mark(
+                    state,
+                    crawl_state.PRODUCT,
+                    row["product_url"],
+                    crawl_state.FAILED,
+                    error,
+                )
+
+
+def crawl_rows_parallel(rows, sink, args, state=None, network_stats=None):
+    chunks = split_rows(rows, args.workers) if rows is not None else [None] * args.workers
+    result_queue = multiprocessing.Queue()
+    processes = []
+    for worker_id, chunk in enumerate(chunks):
+        process = multiprocessing.Process(
+            target=worker_main, args=(worker_id, chunk, args, result_queue)
+        )
+        process.start()
+        processes.append(process)
+        if chunk is None:
+            print(f"Started worker {worker_id} on queue {args.queue}")
+        else:
+            print(f"Started worker {worker_id} with {len(chunk)} products")
+
+    # The parent is the only process that touches the output files
+    stats = write_results(
+        result_queue, processes, sink, state, network_stats, chunks if rows is not None else None
+    )
+    for process in processes:
+        process.join()
+    return stats
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Crawl Banggood product details")
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=1,
+        help="Number of worker processes, each with its own Chrome driver",
+    )
+    parser.add_argument(
+        "--http-first",
+        action="store_true",
+        help="Fetch pages over HTTP first and only open Chrome when fields are missing",
+    )
+    parser.add_argument(
+        "--output-format",
+        choices=["csv", "sqlite", "parquet"],
+        default="csv",
+        help="Where product and description rows are written",
+    )
+    parser.add_argument(
+        "--batch-size",
+        type=int,
+        default=None,
+        help="Number of products buffered before each write "
+        "(default 50, or 5000 per Parquet row group)",
+    )
+    parser.add_argument(
+        "--flush-interval",
+        type=float,
+        default=30.0,
+        help="Maximum seconds a buffered product waits before being written",
+    )
+    parser.add_argument(
+        "--block-profile",
+        choices=sorted(network_profile.PROFILES),
+        default="default",
+        help="Network requests blocked in Chrome (images, media, fonts, trackers)",
+    )
+    parser.add_argument(
+        "--network-stats",
+        action="store_true",
+        help="Record requests and bytes per page and compare with a blocking-off run",
+    )
+    parser.add_argument(
+        "--politeness-delay",
+        type=float,
+        default=0.5,
+        help="Minimum delay in seconds between requests to one host; pacing "
+        "adapts above it, backing off on timeouts, 429/5xx and captchas",
+    )
+    parser.add_argument(
+        "--max-retries",
+        type=int,
+        default=3,
+        help="Attempts per product when Chrome fails",
+    )
+    parser.add_argument(
+        "--max-pages-per-driver",
+        type=int,
+        default=200,
+        help="Restart Chrome after this many product pages",
+    )
+    parser.add_argument(
+        "--max-driver-rss-mb",
+        type=float,
+        default=2048,
+        help="Restart Chrome when its process tree uses more memory than this",
+    )
+    parser.add_argument(
+        "--description-store",
+        metavar="DIR",
+        default=None,
+        help="Store descriptions deduplicated and compressed in DIR; "
+        "product rows then reference them by description_hash",
+    )
+    parser.add_argument(
+        "--archive",
+        metavar="DIR",
+        default=None,
+        help="Keep every fetched page in a WARC-style archive in DIR and "
+        "revalidate HTTP fetches with ETag/Last-Modified",
+    )
+    parser.add_argument(
+        "--queue",
+        metavar="URL",
+        default=None,
+        help="Share work between machines through a leased queue: "
+        "sqlite:///path.db or redis://host:port/db. Local links are added to "
+        "the queue, then batches are claimed until it is empty",
+    )
+    parser.add_argument(
+        "--queue-batch",
+        type=int,
+        default=work_queue.DEFAULT_BATCH,
+        help="Products claimed from the queue at a time",
+    )
+    parser.add_argument(
+        "--lease",
+        type=float,
+        default=work_queue.DEFAULT_LEASE,
+        help="Seconds a claimed batch stays reserved before other workers may take it",
+    )
+    parser.add_argument(
+        "--metrics",
+        metavar="DIR",
+        default=os.environ.get(metrics.METRICS_ENV),
+        help="Write stage timings and counters to DIR as JSON and Prometheus "
+        f"text files (default: ${metrics.METRICS_ENV})",
+    )
+    parser.add_argument(
+        "--metrics-interval",
+        type=float,
+        default=30.0,
+        help="Seconds between metrics snapshots",
+    )
+    parser.add_argument(
+        "--recrawl",
+        type=int,
+        metavar="PAGES",
+        default=None,
+        help="Refresh up to PAGES already crawled products, most likely changed "
+        "first, and write changed ones to banggood_product_delta_<run>_*",
+    )
+    parser.add_argument(
+        "--replay",
+        action="store_true",
+        help="Re-extract products from the archive without Chrome or network; "
+        "output goes to banggood_product_replay_*",
+    )
+    parser.add_argument(
+        "--attach",
+        metavar="HOST:PORT",
+        default=browser.debugger_address(),
+        help="Reuse a Chrome started with --remote-debugging-port instead of "
+        f"launching one; implies --workers 1 (default: ${browser.DEBUGGER_ENV})",
+    )
+    return parser.parse_args()
+
+
+def replay(args):
+    archive = response_archive.ResponseArchive(
+        args.archive or response_archive.ARCHIVE_DIR
+    )
+    state = crawl_state.open_state()
+    links = dict(crawl_state.iter_urls(state, crawl_state.LINK))
+    state.close()
+    sink = sinks.BufferedSink(
+        sinks.create_backend(
+            args.output_format,
+            PRODUCT_FIELDNAMES,
+            base_name="banggood_product_replay",
+            description_store=args.description_store,
+        ),
+        batch_size=args.batch_size or sinks.DEFAULT_BATCH_SIZES[args.output_format],
+        flush_interval=args.flush_interval,
+    )
+    start = time.perf_counter()
+    try:
+        stats = replay_archive(archive, sink, links, args.workers)
+    finally:
+        sink.close()
+        archive.close()
+    elapsed = time.perf_counter() - start
+    print(
+        f"Replayed {stats['replayed']} archived pages in {elapsed:.1f}s "
+        f"({stats['replayed'] / max(elapsed, 1e-9):.1f} pages/s), "
+        f"{stats['incomplete']} with missing fields"
+    )
+
+
+def run_recrawl(args):
+    state = crawl_state.open_state()
+    recrawl.open_schedule(state)
+    if recrawl.count(state) == 0:
+        recrawl.import_csv(state, "banggood_product_details.csv")
+    links = dict(crawl_state.iter_urls(state, crawl_state.LINK))
+    recrawl.add_products(
+        state,
+        (
+            url
+            for url, _ in crawl_state.iter_urls(
+                state, crawl_state.PRODUCT, crawl_state.DONE
+            )
+        ),
+        links,
+    )
+    rows = recrawl.select_due(state, args.recrawl)
+
+    run_id = time.strftime("%Y%m%d-%H%M%S")
+    sink = recrawl.ChangeSink(
+        state,
+        sinks.BufferedSink(
+            sinks.create_backend(
+                args.output_format,
+                PRODUCT_FIELDNAMES + ["change_type"],
+                base_name=f"banggood_product_delta_{run_id}",
+                description_store=args.description_store,
+            ),
+            batch_size=args.batch_size or sinks.DEFAULT_BATCH_SIZES[args.output_format],
+            flush_interval=args.flush_interval,
+        ),
+    )
+    # Products stay done in crawl_state; the schedule tracks the refresh
+    try:
+        if args.workers > 1 and len(rows) > 1:
+            crawl_rows_parallel(rows, sink, args)
+        else:
+            crawl_rows(rows, sink, args)
+    finally:
+        sink.close()
+        state.close()
+
+
 def main():
-    product_links_csv_file = "banggood_product_links.csv"
-    output_csv_file = "banggood_product_details.csv"
-    description_csv_file = "banggood_product_descriptions.csv"
-    max_retries = 3
+    args = parse_args()
+    if args.attach and args.workers > 1:
+        print("An attached Chrome cannot be shared between workers, using --workers 1")
+        args.workers = 1
+    if args.metrics:
+        metrics.enable(args.metrics, "product", args.metrics_interval)
+    try:
+        crawl_products(args)
+    finally:
+        metrics.close()
 
+
+def load_pending_rows(state, product_links_csv_file):
     if not os.path.isfile(product_links_csv_file):
         print(f"Error: File '{product_links_csv_file}' not found.")
-        return
+        return None
+
+    import pandas as pd
 
     try:
         df_links = pd.read_csv(product_links_csv_file)
@@ -403,70 +957,106 @@ def main():
             col in df_links.columns for col in ["lv3_href", "lv3", "product_url"]
         ):
             print(f"Error: '{product_links_csv_file}' missing required columns.")
-            return
+            return None
     except Exception as e:
         print(f"Error reading CSV file '{product_links_csv_file}': {e}")
-        return
+        return None
 
-    # Get set of already crawled URLs
-    crawled_urls = get_crawled_urls(output_csv_file)
+    # Crawled products are looked up by integer id in the memory-mapped index
+    index = id_index.open_index(state)
+    crawled_urls = id_index.IdSet(index)
     print(f"Found {len(crawled_urls)} already crawled URLs")
 
-    driver = None
-    products_collected = 0
+    try:
+        pending = df_links[
+            [product_url not in crawled_urls for product_url in df_links["product_url"]]
+        ]
+    finally:
+        index.close()
+    pending = pending.drop_duplicates(subset="product_url")
+    print(f"Skipping {len(df_links) - len(pending)} already crawled products")
+    return pending[["lv3_href", "lv3", "product_url"]].to_dict("records")
 
-    for index, row in df_links.iterrows():
-        product_url = row["product_url"]
-        lv3_title = row["lv3"]
-        lv3_href = row["lv3_href"]
 
-        if product_url in crawled_urls:
-            print(f"Product {product_url} already crawled, skipping.")
-            continue
+def crawl_products(args):
+    if args.replay:
+        replay(args)
+        return
+    if args.recrawl is not None:
+        run_recrawl(args)
+        return
+    product_links_csv_file = "banggood_product_links.csv"
+    output_csv_file = "banggood_product_details.csv"
 
-        retries = 0
-        while retries < max_retries:
-            try:
-                if driver is None:
-                    driver = setup_driver()
+    # Already crawled URLs are looked up in the indexed state store; the
+    # details CSV is only scanned once, to seed an empty store
+    state = crawl_state.open_state()
+    if crawl_state.count(state, crawl_state.PRODUCT) == 0:
+        crawl_state.import_csv(
+            state,
+            crawl_state.PRODUCT,
+            output_csv_file,
+            "product_url",
+            status=crawl_state.DONE,
+        )
 
-                crawl_product(
-                    driver,
-                    product_url,
-                    lv3_title,
-                    lv3_href,
-                    output_csv_file,
-                    description_csv_file,
-                )
-                products_collected += 1
-                print(f"Processed product {products_collected}: {product_url}")
-                break
-
-            except WebDriverException as e:
-                print(f"WebDriverException for {product_url}: {e}")
-                retries += 1
-                if retries < max_retries:
-                    print(
-                        f"Retrying {product_url} (Attempt {retries + 1}/{max_retries})"
-                    )
-                    try:
-                        driver.quit()
-                    except:
-                        pass
-                    driver = None
-                    time.sleep(random.uniform(1, 2))
-                else:
-                    print(f"Max retries reached for {product_url}. Skipping.")
-                    break
+    rows = []
+    # Queue workers without a local links file only consume
+    if not args.queue or os.path.isfile(product_links_csv_file):
+        rows = load_pending_rows(state, product_links_csv_file)
+        if rows is None:
+            state.close()
+            return
+    queue = None
+    if args.queue:
+        queue = work_queue.open_queue(args.queue, "products")
+        added = queue.put(
+            (row["product_url"], {"lv3_href": row["lv3_href"], "lv3": row["lv3"]})
+            for row in rows
+        )
+        print(f"Queued {added} new products, queue status: {queue.stats()}")
+        rows = None
 
-    if driver is None:
-        try:
-            driver.quit()
-        except:
-            pass
-    print(f"\nTotal crawled {products_collected} new products")
-    print(f"Product details saved to '{output_csv_file}'")
-    print(f"Product descriptions saved to '{description_csv_file}'")
+    def on_flush(records):
+        urls = [product["product_url"] for product, _ in records]
+        crawl_state.mark_many(state, crawl_state.PRODUCT, urls, crawl_state.DONE)
+        if queue is not None:
+            queue.ack(urls)
+
+    # Products only count as done once their batch has been written
+    sink = sinks.BufferedSink(
+        sinks.create_backend(
+            args.output_format,
+            PRODUCT_FIELDNAMES,
+            description_store=args.description_store,
+        ),
+        batch_size=args.batch_size or sinks.DEFAULT_BATCH_SIZES[args.output_format],
+        flush_interval=args.flush_interval,
+        on_flush=on_flush,
+    )
+    network_stats = (
+        network_profile.NetworkStats(args.block_profile) if args.network_stats else None
+    )
+    try:
+        if args.workers > 1 and (rows is None or len(rows) > 1):
+            stats = crawl_rows_parallel(rows, sink, args, state, network_stats)
+        else:
+            if rows is None:
+                rows = claimed_rows(queue, args)
+            stats = crawl_rows(rows, sink, args, state, network_stats=network_stats)
+    finally:
+        sink.close()
+        state.close()
+        if queue is not None:
+            if rows is not None and not isinstance(rows, list):
+                rows.close()
+            queue.close()
+    if network_stats is not None:
+        network_stats.report()
+
+    print(f"\nTotal crawled {sum(stats.values())} new products")
+    print(f"Pages handled via HTTP: {stats['http']}, via Selenium: {stats['selenium']}")
+    print(f"Output format: {args.output_format}")
 
 
 if __name__ == "__main__":
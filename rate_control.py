@@ -0,0 +1,225 @@
+import random
+import re
+import threading
+import time
+from urllib.parse import urlsplit
+
+import metrics
+
+START_RATE = 1.0
+MIN_RATE = 0.05
+MAX_RATE = 4.0
+START_CONCURRENCY = 2
+MAX_CONCURRENCY = 8
+
+# Healthy successes between additive increases
+INCREASE_EVERY = 10
+RATE_STEP = 0.25
+DECREASE_FACTOR = 0.5
+# One cut per burst: requests already in flight when the server pushed back
+# would otherwise halve the rate again and again
+COOLDOWN = 10.0
+# Latency above this multiple of the best smoothed latency counts as congestion
+LATENCY_FACTOR = 2.0
+LATENCY_SLACK = 0.1
+JITTER = 0.5
+
+THROTTLE_STATUSES = {408, 429, 500, 502, 503, 504}
+# Matched against the page title only: product pages load captcha scripts too
+CAPTCHA_MARKERS = [
+    "captcha",
+    "verify you are human",
+    "are you a robot",
+    "security check",
+    "access denied",
+    "attention required",
+]
+TITLE_RE = re.compile(r"<title[^>]*>(.*?)</title>", re.I | re.S)
+
+
+class CaptchaError(Exception):
+    pass
+
+
+def is_throttle_status(status_code):
+    return status_code in THROTTLE_STATUSES
+
+
+def looks_like_captcha(html=None, title=None):
+    if title is None and html:
+        match = TITLE_RE.search(html[:20000])
+        title = match.group(1) if match else None
+    if not title:
+        return False
+    title = title.lower()
+    return any(marker in title for marker in CAPTCHA_MARKERS)
+
+
+class Request:
+    # Handed out by RateController.request(); call throttled(reason) when the
+    # server pushed back, anything else counts as a success on exit
+    def __init__(self, controller, kind):
+        self.controller = controller
+        self.kind = kind
+        self.reason = None
+        self.start = time.monotonic()
+
+    def throttled(self, reason):
+        self.reason = reason
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.controller.release(self, time.monotonic() - self.start)
+        return False
+
+
+class RateController:
+    # AIMD pacing for one host: request rate and concurrency grow additively
+    # while responses stay fast and clean, and are cut multiplicatively on
+    # timeouts, 429/5xx, captchas or browser failures
+    def __init__(
+        self,
+        name,
+        start_rate=START_RATE,
+        min_rate=MIN_RATE,
+        max_rate=MAX_RATE,
+        start_concurrency=START_CONCURRENCY,
+        max_concurrency=MAX_CONCURRENCY,
+    ):
+        self.name = name
+        self.min_rate = min_rate
+        self.max_rate = max_rate
+        self.rate = min(start_rate, max_rate)
+        self.max_concurrency = max_concurrency
+        self.concurrency = min(start_concurrency, max_concurrency)
+        self.condition = threading.Condition()
+        self.in_flight = 0
+        self.next_start = 0.0
+        self.healthy = 0
+        self.last_decrease = float("-inf")
+        # Smoothed and best latency per request kind: a browser page load and
+        # an HTTP fetch from the same host are not comparable
+        self.latency = {}
+        self.best_latency = {}
+        self.stats = {"requests": 0, "throttled": 0, "increases": 0, "decreases": 0}
+        self._publish()
+
+    def request(self, kind="http"):
+        # Blocks until a concurrency slot is free and the pacing interval has passed
+        with self.condition:
+            while self.in_flight >= int(self.concurrency):
+                self.condition.wait()
+            self.in_flight += 1
+            now = time.monotonic()
+            start = max(now, self.next_start)
+            self.next_start = start + random.uniform(1, 1 + JITTER) / self.rate
+        delay = start - now
+        if delay > 0:
+            time.sleep(delay)
+        return Request(self, kind)
+
+    def release(self, request, elapsed):
+        with self.condition:
+            self.in_flight -= 1
+            self.stats["requests"] += 1
+            if request.reason is not None:
+                self._decrease(request.reason)
+            else:
+                self._success(request.kind, elapsed)
+            self.condition.notify_all()
+            self._publish()
+
+    def _success(self, kind, elapsed):
+        latency = self.latency.get(kind)
+        latency = self.latency[kind] = (
+            elapsed if latency is None else 0.8 * latency + 0.2 * elapsed
+        )
+        best = self.best_latency[kind] = min(self.best_latency.get(kind, latency), latency)
+        if latency > best * LATENCY_FACTOR and latency - best > LATENCY_SLACK:
+            # Slowing down server side: hold steady rather than push harder
+            self.healthy = 0
+            return
+        self.healthy += 1
+        if self.healthy >= INCREASE_EVERY:
+            self.healthy = 0
+            if self.rate < self.max_rate or self.concurrency < self.max_concurrency:
+                self.rate = min(self.max_rate, self.rate + RATE_STEP)
+                self.concurrency = min(self.max_concurrency, self.concurrency + 1)
+                self.stats["increases"] += 1
+
+    def _decrease(self, reason):
+        self.stats["throttled"] += 1
+        self.healthy = 0
+        metrics.inc("throttled_total", host=self.name, reason=reason)
+        now = time.monotonic()
+        if now - self.last_decrease < COOLDOWN:
+            return
+        self.last_decrease = now
+        self.rate = max(self.min_rate, self.rate * DECREASE_FACTOR)
+        self.concurrency = max(1, self.concurrency * DECREASE_FACTOR)
+        # Let the lower rate take effect before the next request starts
+        self.next_start = max(self.next_start, now + 1 / self.rate)
+        self.stats["decreases"] += 1
+        print(
+            f"Throttled by {self.name} ({reason}): rate {self.rate:.2f}/s, "
+            f"concurrency {int(self.concurrency)}"
+        )
+
+    def backoff(self, attempt):
+        # Retry delay: exponential in the attempt, never faster than the current pace
+        return max(1 / self.rate, min(60.0, 2**attempt)) * random.uniform(1, 1 + JITTER)
+
+    def _publish(self):
+        metrics.gauge("rate_limit", round(self.rate, 3), host=self.name)
+        metrics.gauge("concurrency_limit", int(self.concurrency), host=self.name)
+        metrics.gauge("in_flight", self.in_flight, host=self.name)
+
+    def summary(self):
+        return dict(
+            self.stats,
+            rate=round(self.rate, 3),
+            concurrency=int(self.concurrency),
+            latency={kind: round(value, 3) for kind, value in self.latency.items()},
+        )
+
+
+_settings = {}
+_controllers = {}
+_lock = threading.Lock()
+
+
+def configure(**settings):
+    # Defaults for controllers created afterwards, e.g. max_rate from the CLI
+    _settings.update(settings)
+
+
+def configure_share(processes, max_rate=None):
+    # Controllers are per process: each of several crawler processes paces
+    # itself at an equal share, so together they stay within max_rate
+    max_rate = max_rate or _settings.get("max_rate", MAX_RATE)
+    configure(
+        max_rate=max_rate / processes,
+        start_rate=_settings.get("start_rate", START_RATE) / processes,
+        min_rate=_settings.get("min_rate", MIN_RATE) / processes,
+    )
+
+
+def controller(url):
+    # One controller per host, shared by every stage in this process
+    host = urlsplit(url).netloc or url
+    with _lock:
+        rate = _controllers.get(host)
+        if rate is None:
+            rate = _controllers[host] = RateController(host, **_settings)
+    return rate
+
+
+def request(url, kind="http"):
+    return controller(url).request(kind)
+
+
+def report():
+    for host, rate in sorted(_controllers.items()):
+        print(f"Pacing for {host}: {rate.summary()}")
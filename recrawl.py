@@ -0,0 +1,206 @@
+import csv
+import hashlib
+import heapq
+import math
+import os
+import sys
+import time
+
+# Only what a shopper would notice: price, stock and the option matrix
+FINGERPRINT_FIELDS = ["price", "sku_properties", "option_details"]
+
+# Until a product has history, assume it changes about once a week
+PRIOR_INTERVAL = 7 * 24 * 3600
+
+NEW = "new"
+CHANGED = "changed"
+UNCHANGED = "unchanged"
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS product_fingerprints (
+    url TEXT PRIMARY KEY,
+    lv3 TEXT,
+    lv3_href TEXT,
+    fingerprint TEXT,
+    first_seen REAL NOT NULL,
+    last_checked REAL NOT NULL,
+    last_changed REAL,
+    checks INTEGER NOT NULL DEFAULT 0,
+    changes INTEGER NOT NULL DEFAULT 0
+);
+"""
+
+
+def open_schedule(conn):
+    # Lives next to crawl_state in the same SQLite database
+    conn.executescript(SCHEMA)
+    return conn
+
+
+def _has_options(product):
+    # Live records hold a list, rows read back from the CSV its str() form
+    return product.get("option_details") not in (None, "", [], "[]")
+
+
+def fingerprint(product):
+    # str() of the nested lists is also what the CSV output holds, so rows
+    # read back from the details CSV hash to the same value. With options the
+    # prices are in the option matrix: the Selenium path stores "Price not
+    # found" as the product price there and the HTTP path the shown price
+    values = dict(product, price=None) if _has_options(product) else product
+    payload = "\x1f".join(str(values.get(field)) for field in FINGERPRINT_FIELDS)
+    return hashlib.sha1(payload.encode("utf-8")).hexdigest()
+
+
+def count(conn):
+    return conn.execute("SELECT COUNT(*) FROM product_fingerprints").fetchone()[0]
+
+
+def import_csv(conn, filename, batch_size=10000):
+    # Seed fingerprints from an existing details CSV; later rows win
+    if not os.path.isfile(filename):
+        return 0
+    csv.field_size_limit(sys.maxsize)
+    checked_at = os.path.getmtime(filename)
+    imported = 0
+    batch = []
+    with open(filename, mode="r", newline="", encoding="utf-8") as csvfile:
+        for row in csv.DictReader(csvfile):
+            if not row.get("product_url"):
+                continue
+            batch.append(
+                (
+                    row["product_url"],
+                    row.get("lv3_title", ""),
+                    row.get("lv3_href", ""),
+                    fingerprint(row),
+                    checked_at,
+                    checked_at,
+                )
+            )
+            if len(batch) >= batch_size:
+                imported += _insert(conn, batch, replace=True)
+                batch = []
+    if batch:
+        imported += _insert(conn, batch, replace=True)
+    print(f"Seeded {imported} product fingerprints from {filename}")
+    return imported
+
+
+def _insert(conn, rows, replace=False):
+    verb = "INSERT OR REPLACE" if replace else "INSERT OR IGNORE"
+    cursor = conn.executemany(
+        f"{verb} INTO product_fingerprints "
+        "(url, lv3, lv3_href, fingerprint, first_seen, last_checked) "
+        "VALUES (?, ?, ?, ?, ?, ?)",
+        rows,
+    )
+    conn.commit()
+    return cursor.rowcount
+
+
+def add_products(conn, urls, links):
+    # Crawled products without a fingerprint yet; they are scheduled on the prior
+    now = time.time()
+    return _insert(
+        conn,
+        (
+            (
+                url,
+                links.get(url, {}).get("lv3", ""),
+                links.get(url, {}).get("lv3_href", ""),
+                None,
+                now,
+                now - PRIOR_INTERVAL,
+            )
+            for url in urls
+        ),
+    )
+
+
+def change_probability(row, now):
+    # Poisson change model: rate = (changes + 1) / (observed time + prior
+    # interval), chance of at least one change since the last check
+    _, _, _, first_seen, last_checked, changes = row
+    observed = max(last_checked - first_seen, 0)
+    rate = (changes + 1) / (observed + PRIOR_INTERVAL)
+    return 1 - math.exp(-rate * max(now - last_checked, 0))
+
+
+def select_due(conn, budget, now=None):
+    # The budget most likely changed products, in one streaming pass
+    now = time.time() if now is None else now
+    cursor = conn.execute(
+        "SELECT url, lv3, lv3_href, first_seen, last_checked, changes "
+        "FROM product_fingerprints"
+    )
+    due = heapq.nlargest(
+        budget, ((change_probability(row, now), row) for row in cursor)
+    )
+    if due:
+        print(
+            f"Scheduled {len(due)} products, change probability "
+            f"{due[-1][0]:.2f} to {due[0][0]:.2f}"
+        )
+    return [
+        {"product_url": row[0], "lv3": row[1] or "", "lv3_href": row[2] or ""}
+        for _, row in due
+    ]
+
+
+def record_check(conn, product):
+    url = product["product_url"]
+    now = time.time()
+    current = fingerprint(product)
+    row = conn.execute(
+        "SELECT fingerprint FROM product_fingerprints WHERE url = ?", (url,)
+    ).fetchone()
+    if row is None or row[0] is None:
+        status = NEW
+    elif row[0] == current:
+        status = UNCHANGED
+    else:
+        status = CHANGED
+
+    if row is None:
+        conn.execute(
+            "INSERT INTO product_fingerprints "
+            "(url, lv3, lv3_href, fingerprint, first_seen, last_checked, checks) "
+            "VALUES (?, ?, ?, ?, ?, ?, 1)",
+            (url, product.get("lv3_title"), product.get("lv3_href"), current, now, now),
+        )
+    else:
+        changed = status == CHANGED
+        conn.execute(
+            "UPDATE product_fingerprints SET fingerprint = ?, last_checked = ?, "
+            "checks = checks + 1, changes = changes + ?, "
+            "last_changed = CASE WHEN ? THEN ? ELSE last_changed END WHERE url = ?",
+            (current, now, int(changed), int(changed), now, url),
+        )
+    conn.commit()
+    return status
+
+
+class ChangeSink:
+    # Sits in front of the delta sink: unchanged products only update their
+    # check time, new and changed ones are written with their change_type
+    def __init__(self, conn, delta_sink):
+        self.conn = conn
+        self.delta_sink = delta_sink
+        self.stats = {NEW: 0, CHANGED: 0, UNCHANGED: 0}
+
+    def write(self, product, description=None):
+        status = record_check(self.conn, product)
+        self.stats[status] += 1
+        if status != UNCHANGED:
+            self.delta_sink.write(dict(product, change_type=status), description)
+
+    def flush(self):
+        self.delta_sink.flush()
+
+    def close(self):
+        self.delta_sink.close()
+        print(
+            f"Recrawl delta: {self.stats[CHANGED]} changed, {self.stats[NEW]} new, "
+            f"{self.stats[UNCHANGED]} unchanged"
+        )
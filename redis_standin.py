@@ -0,0 +1,271 @@
+import argparse
+import socketserver
+import threading
+import time
+
+# In-process stand-in for the subset of Redis that work_queue.RedisQueue
+# uses, so the Redis backend can be exercised without a Redis server
+
+
+class CommandError(Exception):
+    pass
+
+
+def _score(value):
+    # Range bounds: -inf, +inf, plain numbers and "(x" for exclusive
+    exclusive = value.startswith("(")
+    if exclusive:
+        value = value[1:]
+    return float(value), exclusive
+
+
+def _in_range(score, low, high):
+    (low, low_excl), (high, high_excl) = low, high
+    above = score > low if low_excl else score >= low
+    below = score < high if high_excl else score <= high
+    return above and below
+
+
+class Store:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.data = {}
+        self.versions = {}
+
+    def _touch(self, key):
+        self.versions[key] = self.versions.get(key, 0) + 1
+
+    def _get(self, key, kind):
+        value = self.data.get(key)
+        if value is None:
+            value = self.data[key] = kind()
+        elif not isinstance(value, kind):
+            raise CommandError("WRONGTYPE Operation against a key holding the wrong kind of value")
+        return value
+
+    def execute(self, name, args):
+        handler = getattr(self, "cmd_" + name.lower(), None)
+        if handler is None:
+            raise CommandError(f"ERR unknown command '{name}'")
+        return handler(*args)
+
+    def cmd_ping(self, *args):
+        return "PONG"
+
+    def cmd_flushall(self):
+        for key in list(self.data):
+            self._touch(key)
+        self.data.clear()
+        return "OK"
+
+    def cmd_del(self, *keys):
+        removed = 0
+        for key in keys:
+            if self.data.pop(key, None) is not None:
+                self._touch(key)
+                removed += 1
+        return removed
+
+    def cmd_zadd(self, key, *args):
+        args = list(args)
+        flags = set()
+        while args and args[0].upper() in ("NX", "XX"):
+            flags.add(args.pop(0).upper())
+        zset = self._get(key, dict)
+        added = 0
+        for i in range(0, len(args), 2):
+            score, member = float(args[i]), args[i + 1]
+            exists = member in zset
+            if ("NX" in flags and exists) or ("XX" in flags and not exists):
+                continue
+            zset[member] = score
+            added += not exists
+        self._touch(key)
+        return added
+
+    def cmd_zrem(self, key, *members):
+        zset = self._get(key, dict)
+        removed = sum(zset.pop(member, None) is not None for member in members)
+        self._touch(key)
+        return removed
+
+    def cmd_zrangebyscore(self, key, low, high, *args):
+        zset = self._get(key, dict)
+        low, high = _score(low), _score(high)
+        members = sorted(
+            (score, member)
+            for member, score in zset.items()
+            if _in_range(score, low, high)
+        )
+        result = [member for _, member in members]
+        if args and args[0].upper() == "LIMIT":
+            offset, count = int(args[1]), int(args[2])
+            result = result[offset:] if count < 0 else result[offset : offset + count]
+        return result
+
+    def cmd_zcount(self, key, low, high):
+        zset = self._get(key, dict)
+        low, high = _score(low), _score(high)
+        return sum(_in_range(score, low, high) for score in zset.values())
+
+    def cmd_hset(self, key, *args):
+        table = self._get(key, dict)
+        added = 0
+        for i in range(0, len(args), 2):
+            added += args[i] not in table
+            table[args[i]] = args[i + 1]
+        self._touch(key)
+        return added
+
+    def cmd_hmget(self, key, *fields):
+        table = self._get(key, dict)
+        return [table.get(field) for field in fields]
+
+    def cmd_hincrby(self, key, field, amount):
+        table = self._get(key, dict)
+        table[field] = str(int(table.get(field, 0)) + int(amount))
+        self._touch(key)
+        return int(table[field])
+
+    def cmd_hdel(self, key, *fields):
+        table = self._get(key, dict)
+        removed = sum(table.pop(field, None) is not None for field in fields)
+        self._touch(key)
+        return removed
+
+    def cmd_sadd(self, key, *members):
+        members_set = self._get(key, set)
+        added = len(set(members) - members_set)
+        members_set.update(members)
+        self._touch(key)
+        return added
+
+    def cmd_scard(self, key):
+        return len(self._get(key, set))
+
+    def cmd_smismember(self, key, *members):
+        members_set = self._get(key, set)
+        return [int(member in members_set) for member in members]
+
+
+class RespHandler(socketserver.StreamRequestHandler):
+    def setup(self):
+        super().setup()
+        self.watched = {}
+        self.queued = None
+
+    def read_command(self):
+        line = self.rfile.readline()
+        if not line:
+            return None
+        if not line.startswith(b"*"):
+            return line.decode("utf-8").split()
+        args = []
+        for _ in range(int(line[1:-2])):
+            length = int(self.rfile.readline()[1:-2])
+            args.append(self.rfile.read(length + 2)[:-2].decode("utf-8"))
+        return args
+
+    def write(self, value):
+        if isinstance(value, CommandError):
+            self.wfile.write(f"-{value}\r\n".encode("utf-8"))
+        elif value is None:
+            self.wfile.write(b"$-1\r\n")
+        elif isinstance(value, bool) or isinstance(value, int):
+            self.wfile.write(b":%d\r\n" % value)
+        elif isinstance(value, list):
+            self.wfile.write(b"*%d\r\n" % len(value))
+            for item in value:
+                self.write(item)
+        elif value in ("OK", "PONG", "QUEUED"):
+            self.wfile.write(f"+{value}\r\n".encode("utf-8"))
+        else:
+            data = str(value).encode("utf-8")
+            self.wfile.write(b"$%d\r\n%s\r\n" % (len(data), data))
+
+    def handle(self):
+        store = self.server.store
+        while True:
+            args = self.read_command()
+            if args is None:
+                return
+            if not args:
+                continue
+            name, args = args[0].upper(), args[1:]
+            try:
+                self.write(self.dispatch(store, name, args))
+            except CommandError as e:
+                self.write(e)
+            self.wfile.flush()
+
+    def dispatch(self, store, name, args):
+        if name in ("AUTH", "SELECT"):
+            return "OK"
+        if name == "WATCH":
+            with store.lock:
+                for key in args:
+                    self.watched[key] = store.versions.get(key, 0)
+            return "OK"
+        if name == "UNWATCH":
+            self.watched = {}
+            return "OK"
+        if name == "MULTI":
+            self.queued = []
+            return "OK"
+        if name == "DISCARD":
+            self.queued = None
+            self.watched = {}
+            return "OK"
+        if name == "EXEC":
+            queued, self.queued = self.queued, None
+            watched, self.watched = self.watched, {}
+            if queued is None:
+                raise CommandError("ERR EXEC without MULTI")
+            with store.lock:
+                if any(store.versions.get(k, 0) != v for k, v in watched.items()):
+                    return None
+                results = []
+                for queued_name, queued_args in queued:
+                    try:
+                        results.append(store.execute(queued_name, queued_args))
+                    except CommandError as e:
+                        results.append(e)
+                return results
+        if self.queued is not None:
+            self.queued.append((name, args))
+            return "QUEUED"
+        with store.lock:
+            return store.execute(name, args)
+
+
+class RespServer(socketserver.ThreadingTCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+
+def start_server(host="127.0.0.1", port=0):
+    server = RespServer((host, port), RespHandler)
+    server.store = Store()
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    server.url = f"redis://{host}:{server.server_address[1]}/0"
+    return server
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Local Redis-protocol stand-in for the work queue"
+    )
+    parser.add_argument("--port", type=int, default=6399)
+    args = parser.parse_args()
+    server = start_server(port=args.port)
+    print(f"Redis stand-in listening on {server.url}")
+    try:
+        while True:
+            time.sleep(1)
+    except KeyboardInterrupt:
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
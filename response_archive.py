@@ -0,0 +1,333 @@
+import argparse
+import gzip
+import hashlib
+import os
+import sqlite3
+import time
+import uuid
+from datetime import datetime, timezone
+
+ARCHIVE_DIR = "banggood_archive"
+
+RESPONSE = "response"
+RENDERED = "rendered"
+REVISIT = "revisit"
+
+# Hop-by-hop and encoding headers no longer describe the stored (decoded) body
+DROPPED_HEADERS = {"content-encoding", "transfer-encoding", "content-length", "connection"}
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS records (
+    id INTEGER PRIMARY KEY,
+    url TEXT NOT NULL,
+    fetched_at REAL NOT NULL,
+    record_type TEXT NOT NULL,
+    status INTEGER,
+    etag TEXT,
+    last_modified TEXT,
+    segment TEXT NOT NULL,
+    offset INTEGER NOT NULL,
+    length INTEGER NOT NULL,
+    digest TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_records_url ON records (url, fetched_at);
+"""
+
+COLUMNS = [
+    "id",
+    "url",
+    "fetched_at",
+    "record_type",
+    "status",
+    "etag",
+    "last_modified",
+    "segment",
+    "offset",
+    "length",
+    "digest",
+]
+
+
+def _warc_date(timestamp):
+    return datetime.fromtimestamp(timestamp, timezone.utc).strftime("%Y-%m-%dT%H:%M:%SZ")
+
+
+class ResponseArchive:
+    # Fetched pages are appended as WARC records, one gzip member each, to a
+    # segment file per instance; the SQLite index maps (url, fetch time) to the
+    # record's segment and offset so any capture can be read back directly
+    def __init__(self, path=ARCHIVE_DIR):
+        os.makedirs(path, exist_ok=True)
+        self.path = path
+        self.conn = sqlite3.connect(os.path.join(path, "index.db"), timeout=30)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.executescript(SCHEMA)
+        self.segment = None
+        self.writer = None
+        self.readers = {}
+
+    def _open_segment(self):
+        # Every archive instance (one per worker process or pipeline thread)
+        # writes its own segment, so appends need no locking and offsets from
+        # tell() always belong to this writer
+        self.segment = (
+            f"{time.strftime('%Y%m%d%H%M%S')}-{os.getpid()}-{uuid.uuid4().hex[:8]}.warc.gz"
+        )
+        self.writer = open(os.path.join(self.path, self.segment), "ab")
+
+    def _append(self, warc_type, url, fetched_at, content_type, block, extra=None):
+        if self.writer is None:
+            self._open_segment()
+        headers = [
+            ("WARC-Type", warc_type),
+            ("WARC-Record-ID", f"<urn:uuid:{uuid.uuid4()}>"),
+            ("WARC-Date", _warc_date(fetched_at)),
+            ("WARC-Target-URI", url),
+        ]
+        headers += extra or []
+        headers += [
+            ("Content-Type", content_type),
+            ("Content-Length", str(len(block))),
+        ]
+        record = (
+            "WARC/1.0\r\n"
+            + "".join(f"{name}: {value}\r\n" for name, value in headers)
+            + "\r\n"
+        ).encode("utf-8") + block + b"\r\n\r\n"
+        compressed = gzip.compress(record)
+        offset = self.writer.tell()
+        self.writer.write(compressed)
+        self.writer.flush()
+        return offset, len(compressed)
+
+    def _index(self, url, fetched_at, record_type, status, validators, location, digest):
+        etag, last_modified = validators
+        segment, offset, length = location
+        with self.conn:
+            self.conn.execute(
+                "INSERT INTO records (url, fetched_at, record_type, status, etag, "
+                "last_modified, segment, offset, length, digest) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (
+                    url,
+                    fetched_at,
+                    record_type,
+                    status,
+                    etag,
+                    last_modified,
+                    segment,
+                    offset,
+                    length,
+                    digest,
+                ),
+            )
+
+    def put_response(self, url, response):
+        # response: a requests.Response with a 200 status
+        fetched_at = time.time()
+        headers = [
+            (name, value)
+            for name, value in response.headers.items()
+            if name.lower() not in DROPPED_HEADERS
+        ]
+        body = response.content
+        digest = "sha1:" + hashlib.sha1(body).hexdigest()
+        block = (
+            f"HTTP/1.1 {response.status_code} {response.reason}\r\n"
+            + "".join(f"{name}: {value}\r\n" for name, value in headers)
+            + "\r\n"
+        ).encode("utf-8") + body
+        offset, length = self._append(
+            "response",
+            url,
+            fetched_at,
+            "application/http; msgtype=response",
+            block,
+            [("WARC-Payload-Digest", digest)],
+        )
+        self._index(
+            url,
+            fetched_at,
+            RESPONSE,
+            response.status_code,
+            (response.headers.get("ETag"), response.headers.get("Last-Modified")),
+            (self.segment, offset, length),
+            digest,
+        )
+
+    def put_rendered(self, url, html):
+        # DOM captured from Chrome after scripts ran and the page was expanded
+        fetched_at = time.time()
+        body = html.encode("utf-8")
+        digest = "sha1:" + hashlib.sha1(body).hexdigest()
+        offset, length = self._append(
+            "resource",
+            url,
+            fetched_at,
+            "text/html; charset=utf-8",
+            body,
+            [("WARC-Payload-Digest", digest)],
+        )
+        self._index(
+            url,
+            fetched_at,
+            RENDERED,
+            200,
+            (None, None),
+            (self.segment, offset, length),
+            digest,
+        )
+
+    def put_revisit(self, url, original):
+        # A 304 only adds a revisit record; its index row points at the
+        # original payload so reads return the unchanged page
+        fetched_at = time.time()
+        self._append(
+            "revisit",
+            url,
+            fetched_at,
+            "application/http; msgtype=response",
+            b"HTTP/1.1 304 Not Modified\r\n\r\n",
+            [
+                ("WARC-Profile", "http://netpreserve.org/warc/1.0/revisit/server-not-modified"),
+                ("WARC-Refers-To-Target-URI", original["url"]),
+                ("WARC-Refers-To-Date", _warc_date(original["fetched_at"])),
+                ("WARC-Payload-Digest", original["digest"]),
+            ],
+        )
+        self._index(
+            url,
+            fetched_at,
+            REVISIT,
+            304,
+            (original["etag"], original["last_modified"]),
+            (original["segment"], original["offset"], original["length"]),
+            original["digest"],
+        )
+
+    def _rows(self, query, params=()):
+        return [dict(zip(COLUMNS, row)) for row in self.conn.execute(query, params)]
+
+    def latest(self, url, record_types=(RESPONSE, REVISIT, RENDERED), fetched_before=None):
+        query = (
+            f"SELECT {', '.join(COLUMNS)} FROM records WHERE url = ? "
+            f"AND record_type IN ({', '.join('?' * len(record_types))})"
+        )
+        params = [url, *record_types]
+        if fetched_before is not None:
+            query += " AND fetched_at <= ?"
+            params.append(fetched_before)
+        rows = self._rows(query + " ORDER BY fetched_at DESC, id DESC LIMIT 1", params)
+        return rows[0] if rows else None
+
+    def validators(self, url):
+        # Headers for a conditional request, from the last server response
+        row = self.latest(url, (RESPONSE, REVISIT))
+        headers = {}
+        if row is None:
+            return row, headers
+        if row["etag"]:
+            headers["If-None-Match"] = row["etag"]
+        if row["last_modified"]:
+            headers["If-Modified-Since"] = row["last_modified"]
+        return row, headers
+
+    def history(self, url):
+        return self._rows(
+            f"SELECT {', '.join(COLUMNS)} FROM records WHERE url = ? ORDER BY fetched_at",
+            (url,),
+        )
+
+    def iter_latest(self):
+        # Newest capture of every archived URL, in fetch order
+        yield from self._rows(
+            f"SELECT {', '.join(COLUMNS)} FROM records WHERE id IN "
+            "(SELECT MAX(id) FROM records GROUP BY url) ORDER BY id"
+        )
+
+    def read(self, row):
+        segment = row["segment"]
+        if segment == self.segment:
+            self.writer.flush()
+        reader = self.readers.get(segment)
+        if reader is None:
+            reader = open(os.path.join(self.path, segment), "rb")
+            self.readers[segment] = reader
+        reader.seek(row["offset"])
+        record = gzip.decompress(reader.read(row["length"]))
+        warc_headers, block = record.split(b"\r\n\r\n", 1)
+        block = block[: -len(b"\r\n\r\n")]
+        if b"msgtype=response" in warc_headers:
+            _, block = block.split(b"\r\n\r\n", 1)
+        return block.decode("utf-8", errors="replace")
+
+    def get(self, url, fetched_before=None):
+        row = self.latest(url, fetched_before=fetched_before)
+        return self.read(row) if row else None
+
+    def stats(self):
+        urls, records = self.conn.execute(
+            "SELECT COUNT(DISTINCT url), COUNT(*) FROM records"
+        ).fetchone()
+        by_type = dict(
+            self.conn.execute(
+                "SELECT record_type, COUNT(*) FROM records GROUP BY record_type"
+            ).fetchall()
+        )
+        segments = [name for name in os.listdir(self.path) if name.endswith(".warc.gz")]
+        size = sum(os.path.getsize(os.path.join(self.path, name)) for name in segments)
+        return {
+            "urls": urls,
+            "records": records,
+            "by_type": by_type,
+            "segments": len(segments),
+            "bytes": size,
+        }
+
+    def close(self):
+        if self.writer is not None:
+            self.writer.close()
+        for reader in self.readers.values():
+            reader.close()
+        self.conn.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Archive of fetched Banggood pages")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    get_parser = subparsers.add_parser("get", help="Print the archived HTML of a URL")
+    get_parser.add_argument("url")
+    get_parser.add_argument(
+        "--at",
+        type=float,
+        default=None,
+        help="Unix time; return the newest capture fetched at or before it",
+    )
+    history_parser = subparsers.add_parser("history", help="List captures of a URL")
+    history_parser.add_argument("url")
+    subparsers.add_parser("stats", help="Show archive size and record counts")
+    parser.add_argument("--archive", default=ARCHIVE_DIR)
+    args = parser.parse_args()
+
+    archive = ResponseArchive(args.archive)
+    try:
+        if args.command == "get":
+            html = archive.get(args.url, args.at)
+            if html is None:
+                print(f"No capture of {args.url}")
+            else:
+                print(html)
+        elif args.command == "history":
+            for row in archive.history(args.url):
+                print(
+                    f"{_warc_date(row['fetched_at'])} {row['record_type']} "
+                    f"{row['status']} {row['digest']}"
+                )
+        else:
+            print(archive.stats())
+    finally:
+        archive.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,252 @@
+import csv
+import os
+import sqlite3
+import time
+
+import metrics
+
+DESCRIPTION_FIELDNAMES = ["product_url", "product_id", "description"]
+
+# Parquet batches become row groups, which should be large enough to scan well
+DEFAULT_BATCH_SIZES = {"csv": 50, "sqlite": 50, "parquet": 5000}
+
+
+def _scalar(value):
+    # Nested lists are kept as their str() form, matching the CSV output
+    if isinstance(value, (list, dict)):
+        return str(value)
+    return value
+
+
+class CsvBackend:
+    def __init__(self, product_file, description_file, product_fieldnames):
+        self.product_file = product_file
+        self.description_file = description_file
+        self.product_fieldnames = product_fieldnames
+
+    def _append(self, filename, fieldnames, rows):
+        is_new = not os.path.isfile(filename)
+        if not is_new:
+            # Keep appending in the existing file's column layout
+            with open(filename, mode="r", newline="", encoding="utf-8") as csvfile:
+                fieldnames = next(csv.reader(csvfile), None) or fieldnames
+        with open(filename, mode="a", newline="", encoding="utf-8") as csvfile:
+            writer = csv.DictWriter(csvfile, fieldnames=fieldnames, extrasaction="ignore")
+            if is_new:
+                writer.writeheader()
+            writer.writerows(rows)
+            csvfile.flush()
+            os.fsync(csvfile.fileno())
+
+    def write_batch(self, records):
+        # csv.DictWriter stores nested lists as str(list), as before.
+        # Descriptions go first: a product row is only visible once its
+        # description is on disk, so the product file acts as the commit log
+        descriptions = [d for _, d in records if d is not None]
+        if descriptions:
+            self._append(self.description_file, DESCRIPTION_FIELDNAMES, descriptions)
+        if not records:
+            return
+        self._append(
+            self.product_file, self.product_fieldnames, [p for p, _ in records]
+        )
+
+    def close(self):
+        pass
+
+
+class SqliteBackend:
+    def __init__(self, path, product_fieldnames):
+        self.product_fieldnames = product_fieldnames
+        self.conn = sqlite3.connect(path)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        columns = ", ".join(
+            f"{name} TEXT PRIMARY KEY" if name == "product_url" else f"{name} TEXT"
+            for name in product_fieldnames
+        )
+        self.conn.execute(f"CREATE TABLE IF NOT EXISTS products ({columns})")
+        existing = {row[1] for row in self.conn.execute("PRAGMA table_info(products)")}
+        for name in product_fieldnames:
+            if name not in existing:
+                self.conn.execute(f"ALTER TABLE products ADD COLUMN {name} TEXT")
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS descriptions "
+            "(product_url TEXT PRIMARY KEY, product_id TEXT, description TEXT)"
+        )
+        self.conn.commit()
+
+    def write_batch(self, records):
+        placeholders = ", ".join("?" for _ in self.product_fieldnames)
+        # One transaction per batch keeps product and description rows together
+        with self.conn:
+            self.conn.executemany(
+                "INSERT OR REPLACE INTO descriptions VALUES (?, ?, ?)",
+                [
+                    tuple(d.get(name) for name in DESCRIPTION_FIELDNAMES)
+                    for _, d in records
+                    if d is not None
+                ],
+            )
+            self.conn.executemany(
+                f"INSERT OR REPLACE INTO products ({', '.join(self.product_fieldnames)}) "
+                f"VALUES ({placeholders})",
+                [
+                    tuple(_scalar(p.get(name)) for name in self.product_fieldnames)
+                    for p, _ in records
+                ],
+            )
+
+    def close(self):
+        self.conn.close()
+
+
+class ParquetBackend:
+    def __init__(self, product_dir, description_dir, product_fieldnames=()):
+        try:
+            import columnar
+        except ImportError:
+            raise RuntimeError("Parquet output requires pyarrow (pip install pyarrow)")
+        self.columnar = columnar
+        self.product_schema = columnar.product_schema(product_fieldnames)
+        self.product_dir = product_dir
+        self.description_dir = description_dir
+        # Each run appends a new part file; the directory is read as one dataset
+        part_name = f"part-{int(time.time())}-{os.getpid()}.parquet"
+        self.product_path = os.path.join(product_dir, part_name)
+        self.description_path = os.path.join(description_dir, part_name)
+        self.product_writer = None
+        self.description_writer = None
+
+    def write_batch(self, records):
+        # Every batch becomes one row group, so size batches for streaming reads
+        descriptions = [d for _, d in records if d is not None]
+        if descriptions:
+            if self.description_writer is None:
+                self.description_writer = self.columnar.open_writer(
+                    self.description_path, self.columnar.DESCRIPTION_SCHEMA
+                )
+            self.description_writer.write_table(
+                self.columnar.descriptions_table(descriptions)
+            )
+        if self.product_writer is None:
+            self.product_writer = self.columnar.open_writer(
+                self.product_path, self.product_schema
+            )
+        self.product_writer.write_table(
+            self.columnar.products_table([p for p, _ in records], self.product_schema)
+        )
+
+    def close(self):
+        for writer in (self.product_writer, self.description_writer):
+            if writer is not None:
+                writer.close()
+        self.product_writer = None
+        self.description_writer = None
+
+
+class DescriptionStoreBackend:
+    # Descriptions go to the deduplicated store; products keep only the hash
+    def __init__(self, backend, store):
+        self.backend = backend
+        self.store = store
+
+    def write_batch(self, records):
+        descriptions = [d for _, d in records if d is not None]
+        hashes = dict(
+            zip(
+                (d["product_url"] for d in descriptions),
+                self.store.put_many(descriptions),
+            )
+        )
+        products = []
+        for product, _ in records:
+            product = dict(product)
+            product["description_hash"] = hashes.get(product["product_url"])
+            products.append((product, None))
+        self.backend.write_batch(products)
+
+    def close(self):
+        self.backend.close()
+        self.store.close()
+
+
+class BufferedSink:
+    def __init__(self, backend, batch_size=50, flush_interval=30.0, on_flush=None):
+        self.backend = backend
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.on_flush = on_flush
+        self.buffer = []
+        self.last_flush = time.monotonic()
+
+    def write(self, product, description=None):
+        self.buffer.append((product, description))
+        if (
+            len(self.buffer) >= self.batch_size
+            or time.monotonic() - self.last_flush >= self.flush_interval
+        ):
+            self.flush()
+
+    def flush(self):
+        self.last_flush = time.monotonic()
+        if not self.buffer:
+            return
+        records = self.buffer
+        with metrics.stage("sink:flush"):
+            self.backend.write_batch(records)
+        metrics.inc("records_written_total", len(records))
+        self.buffer = []
+        print(f"Flushed {len(records)} products to output")
+        if self.on_flush is not None:
+            self.on_flush(records)
+
+    def close(self):
+        self.flush()
+        self.backend.close()
+
+
+class QueueSink:
+    # Used inside worker processes: records are forwarded to the parent's sink
+    def __init__(self, result_queue):
+        self.result_queue = result_queue
+
+    def write(self, product, description=None):
+        self.result_queue.put(("record", (product, description)))
+
+    def flush(self):
+        pass
+
+    def close(self):
+        pass
+
+
+def create_backend(
+    output_format,
+    product_fieldnames,
+    base_name="banggood_product",
+    description_store=None,
+):
+    if description_store is not None:
+        import description_store as store_module
+
+        return DescriptionStoreBackend(
+            create_backend(
+                output_format, product_fieldnames + ["description_hash"], base_name
+            ),
+            store_module.DescriptionStore(description_store),
+        )
+    if output_format == "csv":
+        return CsvBackend(
+            f"{base_name}_details.csv",
+            f"{base_name}_descriptions.csv",
+            product_fieldnames,
+        )
+    if output_format == "sqlite":
+        return SqliteBackend(f"{base_name}s.db", product_fieldnames)
+    if output_format == "parquet":
+        return ParquetBackend(
+            f"{base_name}_details.parquet",
+            f"{base_name}_descriptions.parquet",
+            product_fieldnames,
+        )
+    raise ValueError(f"Unknown output format: {output_format}")
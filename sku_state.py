@@ -0,0 +1,222 @@
+import json
+import re
+
+import html_parse
+
+PRICE_KEYS = ["final_price", "format_price", "formatPrice", "sale_price", "price"]
+# Already formatted for display, e.g. "US$20.00"
+FORMATTED_PRICE_KEYS = ["format_price", "formatPrice"]
+STOCK_KEYS = ["stock", "stocks", "qty", "quantity", "inventory", "stock_num"]
+OPTION_KEYS = ["poa", "poa_id", "poa_ids", "sku_attr", "attrs", "value_ids", "option_ids"]
+ID_KEYS = ["value_id", "poa_id", "id"]
+NAME_KEYS = ["value_name", "poa_name", "name", "title"]
+OPTION_ID_ATTRS = ["data-value-id", "data-poa-id", "data-poa", "data-id", "data-value"]
+
+# Assignments such as `var productInfo = {...}` or `window.__INITIAL_STATE__ = {...}`
+ASSIGNMENT_RE = re.compile(r"(?:var|let|const|window\.)\s*[\w$.]+\s*=\s*(?=[\[{])")
+JSON_PARSE_RE = re.compile(r"JSON\.parse\(\s*(['\"])(.*?)(?<!\\)\1\s*\)", re.S)
+SINGLE_QUOTED_RE = re.compile(r"\\.|\"", re.S)
+CURRENCY_RE = re.compile(r"[^\d\s.,-]+")
+
+
+def _scan_balanced(text, start):
+    # Return the JSON literal starting at text[start] by matching brackets
+    opening = text[start]
+    closing = "}" if opening == "{" else "]"
+    depth = 0
+    in_string = None
+    escaped = False
+    for i in range(start, len(text)):
+        ch = text[i]
+        if in_string:
+            if escaped:
+                escaped = False
+            elif ch == "\\":
+                escaped = True
+            elif ch == in_string:
+                in_string = None
+            continue
+        if ch in "\"'":
+            in_string = ch
+        elif ch == opening:
+            depth += 1
+        elif ch == closing:
+            depth -= 1
+            if depth == 0:
+                return text[start : i + 1]
+    return None
+
+
+def _unquote_single(match):
+    token = match.group()
+    if token == "\\'":
+        return "'"
+    if token == '"':
+        return '\\"'
+    return token
+
+
+def _js_string(quote, body):
+    # Body of a JS string literal -> its value, decoded as JSON so non-ASCII
+    # text and \uXXXX escapes survive; single-quoted bodies are rewritten first
+    if quote == "'":
+        body = SINGLE_QUOTED_RE.sub(_unquote_single, body)
+    return json.loads(f'"{body}"')
+
+
+def find_embedded_json(html, soup=None):
+    # soup: the page already parsed with html_parse.soup, to avoid a second parse
+    if soup is None:
+        soup = html_parse.soup(html)
+    blobs = []
+    for script in soup.find_all("script"):
+        text = script.string or script.get_text()
+        if not text:
+            continue
+        if script.get("type") in ("application/json", "application/ld+json"):
+            try:
+                blobs.append(json.loads(text))
+            except ValueError:
+                pass
+            continue
+        for match in ASSIGNMENT_RE.finditer(text):
+            literal = _scan_balanced(text, match.end())
+            if not literal:
+                continue
+            try:
+                blobs.append(json.loads(literal))
+            except ValueError:
+                continue
+        for match in JSON_PARSE_RE.finditer(text):
+            try:
+                raw = _js_string(match.group(1), match.group(2))
+                blobs.append(json.loads(raw))
+            except ValueError:
+                continue
+    return blobs
+
+
+def _first_key(record, keys):
+    for key in keys:
+        if key in record and record[key] not in (None, ""):
+            return record[key]
+    return None
+
+
+def _walk(obj):
+    yield obj
+    if isinstance(obj, dict):
+        for value in obj.values():
+            yield from _walk(value)
+    elif isinstance(obj, list):
+        for value in obj:
+            yield from _walk(value)
+
+
+def _sku_records(obj):
+    # A SKU table is a list (or id-keyed dict) of records with a price and a stock
+    for node in _walk(obj):
+        if isinstance(node, dict) and node and all(
+            isinstance(v, dict) for v in node.values()
+        ):
+            candidates = [dict(v, _key=k) for k, v in node.items()]
+        elif isinstance(node, list) and node and all(isinstance(v, dict) for v in node):
+            candidates = node
+        else:
+            continue
+        if all(
+            _first_key(c, PRICE_KEYS) is not None
+            and _first_key(c, STOCK_KEYS) is not None
+            for c in candidates
+        ):
+            yield candidates
+
+
+def _option_names(blobs, soup):
+    names = {}
+    for blob in blobs:
+        for node in _walk(blob):
+            if not isinstance(node, dict):
+                continue
+            value_id = _first_key(node, ID_KEYS)
+            name = _first_key(node, NAME_KEYS)
+            if value_id is not None and isinstance(name, str):
+                names.setdefault(str(value_id), name.strip())
+    for a_tag in soup.select("div.product-block a[title]"):
+        for attr in OPTION_ID_ATTRS:
+            if a_tag.get(attr):
+                names[str(a_tag[attr])] = a_tag["title"].strip()
+                break
+    return names
+
+
+def _option_ids(record):
+    value = _first_key(record, OPTION_KEYS)
+    if value is None:
+        value = record.get("_key")
+    if value is None:
+        return []
+    if isinstance(value, (list, tuple)):
+        return [str(v) for v in value]
+    if isinstance(value, dict):
+        return [str(v) for v in value.values()]
+    return [v for v in re.split(r"[,;|_\s]+", str(value)) if v]
+
+
+def display_currency(price_text):
+    # "US$12.99" -> "US$"
+    if not isinstance(price_text, str):
+        return None
+    match = CURRENCY_RE.match(price_text.strip())
+    return match.group() if match else None
+
+
+def format_price(record, currency=None):
+    # The option price as the page shows it, so it matches the clicked-option
+    # path: the formatted field if there is one, else currency + amount
+    formatted = _first_key(record, FORMATTED_PRICE_KEYS)
+    if isinstance(formatted, str) and CURRENCY_RE.search(formatted):
+        return formatted.strip()
+    value = _first_key(record, PRICE_KEYS)
+    if isinstance(value, str) and CURRENCY_RE.search(value):
+        return value.strip()
+    try:
+        amount = float(str(value).replace(",", ""))
+    except ValueError:
+        return str(value)
+    return f"{currency or ''}{amount:,.2f}"
+
+
+def extract_option_details(html, display_price=None, soup=None):
+    # display_price is the product's displayed price; its currency symbol is
+    # put in front of raw amounts from the page state. The page is parsed
+    # once here unless the caller passes its own soup
+    if soup is None:
+        soup = html_parse.soup(html)
+    blobs = find_embedded_json(html, soup)
+    if not blobs:
+        return []
+    names = _option_names(blobs, soup)
+    currency = display_currency(display_price)
+
+    best = []
+    for blob in blobs:
+        for records in _sku_records(blob):
+            if len(records) > len(best):
+                best = records
+    if not best:
+        return []
+
+    option_details = []
+    for record in best:
+        ids = _option_ids(record)
+        labels = [names.get(i, i) for i in ids]
+        option_details.append(
+            {
+                "option_name": " / ".join(labels) if labels else "Default",
+                "price": format_price(record, currency),
+                "stock": str(_first_key(record, STOCK_KEYS)),
+            }
+        )
+
+    return option_details
@@ -5,9 +5,10 @@ from selenium.webdriver.support.ui import WebDriverWait
 from selenium.webdriver.support import expected_conditions as EC
 import random
 import time
+import network_profile
 
 
-def setup_driver():
+def setup_driver(block_profile="default"):
     # Cấu hình Selenium
     options = Options()
     options.add_argument("--headless")  # Chạy ẩn
@@ -17,7 +18,9 @@ def setup_driver():
     options.add_argument(
         "user-agent=Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36"
     )
+    network_profile.apply_options(options, block_profile)
     driver = webdriver.Chrome(options=options)
+    network_profile.apply_blocking(driver, block_profile)
     return driver
 
 
@@ -0,0 +1,32 @@
+import sqlite3
+
+import pytest
+
+import recrawl
+import sinks
+
+pq = pytest.importorskip("pyarrow.parquet")
+
+FIELDNAMES = ["lv3_href", "product_url", "product_id", "title", "price", "option_details"]
+
+
+def test_parquet_delta_keeps_change_type(tmp_path):
+    conn = recrawl.open_schedule(sqlite3.connect(":memory:"))
+    backend = sinks.create_backend(
+        "parquet", FIELDNAMES + ["change_type"], base_name=str(tmp_path / "delta")
+    )
+    sink = recrawl.ChangeSink(conn, sinks.BufferedSink(backend))
+    sink.write(
+        {
+            "product_url": "https://sea.banggood.com/A-p-1.html",
+            "product_id": "1",
+            "title": "A",
+            "price": "US$1.00",
+            "option_details": [],
+        }
+    )
+    sink.close()
+
+    table = pq.read_table(backend.product_path)
+    assert table.column("change_type").to_pylist() == [recrawl.NEW]
+    assert table.column("price_amount").to_pylist() == [1.0]
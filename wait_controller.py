@@ -0,0 +1,131 @@
+import time
+
+import metrics
+
+RESOURCE_COUNT_JS = (
+    "return [document.readyState, performance.getEntriesByType('resource').length];"
+)
+
+
+def network_idle(quiet_period=0.5):
+    # Ready once the document has parsed and no new resource has started for quiet_period
+    state = {"count": None, "since": None}
+
+    def condition(driver):
+        ready_state, count = driver.execute_script(RESOURCE_COUNT_JS)
+        now = time.monotonic()
+        if ready_state == "loading" or count != state["count"]:
+            state["count"] = count
+            state["since"] = now
+            return False
+        return now - state["since"] >= quiet_period
+
+    return condition
+
+
+def count_increased(script, previous):
+    # script returns a number, e.g. the number of listing items already rendered
+    def condition(driver):
+        count = driver.execute_script(script)
+        return count if count > previous else False
+
+    return condition
+
+
+class WaitController:
+    # Waits on concrete conditions and learns how long each page type usually
+    # takes, so later timeouts shrink to a multiple of the observed p95
+    def __init__(
+        self,
+        min_timeout=1.0,
+        max_timeout=30.0,
+        poll_frequency=0.1,
+        history_size=50,
+        headroom=2.0,
+    ):
+        self.min_timeout = min_timeout
+        self.max_timeout = max_timeout
+        self.poll_frequency = poll_frequency
+        self.history_size = history_size
+        self.headroom = headroom
+        self.history = {}
+        self.stats = {}
+
+    def _p95(self, samples):
+        ordered = sorted(samples)
+        return ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))]
+
+    def timeout_for(self, page_type, default=None):
+        samples = self.history.get(page_type, [])
+        if len(samples) < 5:
+            return default if default is not None else self.max_timeout
+        learned = self._p95(samples) * self.headroom
+        return min(self.max_timeout, max(self.min_timeout, learned))
+
+    def _record(self, page_type, elapsed, timed_out):
+        stats = self.stats.setdefault(
+            page_type, {"waits": 0, "timeouts": 0, "seconds": 0.0}
+        )
+        stats["waits"] += 1
+        stats["seconds"] += elapsed
+        metrics.observe("wait_seconds", elapsed, wait=page_type)
+        if timed_out:
+            stats["timeouts"] += 1
+            metrics.inc("wait_timeouts_total", wait=page_type)
+        # A timed-out wait still counts: the page needed at least this long,
+        # so repeated timeouts raise the learned timeout toward max_timeout
+        samples = self.history.setdefault(page_type, [])
+        samples.append(elapsed)
+        if len(samples) > self.history_size:
+            del samples[0]
+
+    def until(self, driver, page_type, condition, timeout=None):
+        # Same contract as WebDriverWait.until: returns the condition's value
+        # or raises TimeoutException
+        from selenium.common.exceptions import TimeoutException
+        from selenium.webdriver.support.ui import WebDriverWait
+
+        wait_timeout = self.timeout_for(page_type, timeout)
+        start = time.monotonic()
+        try:
+            result = WebDriverWait(
+                driver, wait_timeout, poll_frequency=self.poll_frequency
+            ).until(condition)
+        except TimeoutException:
+            self._record(page_type, time.monotonic() - start, True)
+            raise
+        self._record(page_type, time.monotonic() - start, False)
+        return result
+
+    def settle(self, driver, page_type, quiet_period=0.5, timeout=3):
+        # Best-effort network-idle wait; a busy page is not an error
+        from selenium.common.exceptions import TimeoutException
+
+        try:
+            self.until(driver, page_type, network_idle(quiet_period), timeout)
+            return True
+        except TimeoutException:
+            return False
+
+    def summary(self):
+        summary = {}
+        for page_type, stats in self.stats.items():
+            samples = self.history.get(page_type, [])
+            summary[page_type] = dict(
+                stats,
+                mean_ready=sum(samples) / len(samples) if samples else None,
+                p95_ready=self._p95(samples) if samples else None,
+                next_timeout=self.timeout_for(page_type),
+            )
+        return summary
+
+    def report(self):
+        total = sum(stats["seconds"] for stats in self.stats.values())
+        print(f"Wait time: {total:.1f}s on page conditions")
+        for page_type, stats in sorted(self.summary().items()):
+            ready = stats["p95_ready"]
+            print(
+                f"  {page_type}: {stats['waits']} waits, {stats['timeouts']} timeouts, "
+                f"{stats['seconds']:.1f}s total, p95 ready "
+                f"{'n/a' if ready is None else f'{ready:.2f}s'}"
+            )
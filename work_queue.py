@@ -0,0 +1,363 @@
+import json
+import os
+import socket
+import sqlite3
+import time
+from contextlib import contextmanager
+from urllib.parse import unquote, urlparse
+
+DEFAULT_QUEUE = "sqlite:///banggood_work_queue.db"
+DEFAULT_LEASE = 900
+DEFAULT_BATCH = 10
+MAX_ATTEMPTS = 3
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS work_items (
+    queue TEXT NOT NULL,
+    url TEXT NOT NULL,
+    payload TEXT,
+    status TEXT NOT NULL DEFAULT 'pending',
+    owner TEXT,
+    lease_until REAL NOT NULL DEFAULT 0,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    updated_at REAL NOT NULL,
+    PRIMARY KEY (queue, url)
+);
+CREATE INDEX IF NOT EXISTS idx_work_items_status ON work_items (queue, status, lease_until);
+"""
+
+
+class QueueError(Exception):
+    pass
+
+
+def default_owner():
+    return f"{socket.gethostname()}-{os.getpid()}"
+
+
+class SqliteQueue:
+    # For workers on one machine or a shared disk with working locks: every
+    # claim runs under SQLite's exclusive write lock (BEGIN IMMEDIATE)
+    def __init__(self, path, name, max_attempts=MAX_ATTEMPTS):
+        self.name = name
+        self.max_attempts = max_attempts
+        self.conn = sqlite3.connect(path, timeout=60, isolation_level=None)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.executescript(SCHEMA)
+
+    @contextmanager
+    def _transaction(self):
+        self.conn.execute("BEGIN IMMEDIATE")
+        try:
+            yield
+        except BaseException:
+            self.conn.execute("ROLLBACK")
+            raise
+        self.conn.execute("COMMIT")
+
+    def put(self, items):
+        # items: (url, payload dict); URLs already queued or done are kept as they are
+        now = time.time()
+        with self._transaction():
+            cursor = self.conn.executemany(
+                "INSERT OR IGNORE INTO work_items (queue, url, payload, updated_at) "
+                "VALUES (?, ?, ?, ?)",
+                (
+                    (self.name, url, json.dumps(payload) if payload else None, now)
+                    for url, payload in items
+                ),
+            )
+        return cursor.rowcount
+
+    def claim(self, owner, batch_size=DEFAULT_BATCH, lease_seconds=DEFAULT_LEASE):
+        now = time.time()
+        with self._transaction():
+            # Expired leases (crashed or stuck workers) go back to the queue
+            # unless they already used up their attempts
+            self.conn.execute(
+                "UPDATE work_items SET owner = NULL, updated_at = ?, status = "
+                "CASE WHEN attempts >= ? THEN 'failed' ELSE 'pending' END "
+                "WHERE queue = ? AND status = 'leased' AND lease_until < ?",
+                (now, self.max_attempts, self.name, now),
+            )
+            rows = self.conn.execute(
+                "SELECT url, payload FROM work_items WHERE queue = ? AND status = 'pending' "
+                "ORDER BY rowid LIMIT ?",
+                (self.name, batch_size),
+            ).fetchall()
+            self.conn.executemany(
+                "UPDATE work_items SET status = 'leased', owner = ?, lease_until = ?, "
+                "attempts = attempts + 1, updated_at = ? WHERE queue = ? AND url = ?",
+                ((owner, now + lease_seconds, now, self.name, url) for url, _ in rows),
+            )
+        return [(url, json.loads(payload) if payload else {}) for url, payload in rows]
+
+    def extend(self, owner, urls, lease_seconds=DEFAULT_LEASE):
+        now = time.time()
+        with self._transaction():
+            self.conn.executemany(
+                "UPDATE work_items SET lease_until = ?, updated_at = ? "
+                "WHERE queue = ? AND url = ? AND owner = ? AND status = 'leased'",
+                ((now + lease_seconds, now, self.name, url, owner) for url in urls),
+            )
+
+    def ack(self, urls):
+        now = time.time()
+        with self._transaction():
+            self.conn.executemany(
+                "UPDATE work_items SET status = 'done', owner = NULL, updated_at = ? "
+                "WHERE queue = ? AND url = ?",
+                ((now, self.name, url) for url in urls),
+            )
+
+    def release(self, owner, urls):
+        # Unstarted items of a batch go straight back without using an attempt
+        now = time.time()
+        with self._transaction():
+            self.conn.executemany(
+                "UPDATE work_items SET status = 'pending', owner = NULL, "
+                "attempts = attempts - 1, updated_at = ? "
+                "WHERE queue = ? AND url = ? AND owner = ? AND status = 'leased'",
+                ((now, self.name, url, owner) for url in urls),
+            )
+
+    def stats(self):
+        return dict(
+            self.conn.execute(
+                "SELECT status, COUNT(*) FROM work_items WHERE queue = ? GROUP BY status",
+                (self.name,),
+            ).fetchall()
+        )
+
+    def close(self):
+        self.conn.close()
+
+
+class RespConnection:
+    # Minimal Redis protocol (RESP2) client, enough for the queue commands
+    def __init__(self, host, port, db=0, password=None, timeout=30):
+        self.sock = socket.create_connection((host, port), timeout)
+        self.reader = self.sock.makefile("rb")
+        if password:
+            self.command("AUTH", password)
+        if db:
+            self.command("SELECT", db)
+
+    def command(self, *args):
+        parts = [b"*%d\r\n" % len(args)]
+        for arg in args:
+            data = arg if isinstance(arg, bytes) else str(arg).encode("utf-8")
+            parts.append(b"$%d\r\n%s\r\n" % (len(data), data))
+        self.sock.sendall(b"".join(parts))
+        return self._read()
+
+    def _read(self):
+        line = self.reader.readline()
+        if not line:
+            raise QueueError("Connection closed by server")
+        prefix, rest = line[:1], line[1:-2]
+        if prefix == b"+":
+            return rest.decode("utf-8")
+        if prefix == b"-":
+            raise QueueError(rest.decode("utf-8"))
+        if prefix == b":":
+            return int(rest)
+        if prefix == b"$":
+            length = int(rest)
+            if length < 0:
+                return None
+            data = self.reader.read(length + 2)[:-2]
+            return data.decode("utf-8")
+        if prefix == b"*":
+            length = int(rest)
+            if length < 0:
+                return None
+            return [self._read() for _ in range(length)]
+        raise QueueError(f"Unexpected reply: {line!r}")
+
+    def close(self):
+        self.reader.close()
+        self.sock.close()
+
+
+def _pairs(mapping):
+    for key, value in mapping:
+        yield key
+        yield value
+
+
+class RedisQueue:
+    # One sorted set per queue, scored by when an item may next be claimed:
+    # enqueue time for new items, lease expiry for leased ones. Claims are
+    # optimistic WATCH/MULTI/EXEC transactions, so two workers never hold
+    # the same URL and an expired lease needs no cleanup to be reclaimed
+    def __init__(self, connection, name, max_attempts=MAX_ATTEMPTS):
+        self.conn = connection
+        self.name = name
+        self.max_attempts = max_attempts
+        prefix = f"banggood:{name}:"
+        self.queue_key = prefix + "queue"
+        self.payload_key = prefix + "payload"
+        self.attempts_key = prefix + "attempts"
+        self.owner_key = prefix + "owner"
+        self.done_key = prefix + "done"
+        self.failed_key = prefix + "failed"
+
+    def put(self, items, chunk_size=500):
+        items = list(items)
+        added = 0
+        now = time.time()
+        for start in range(0, len(items), chunk_size):
+            chunk = items[start : start + chunk_size]
+            urls = [url for url, _ in chunk]
+            done = self.conn.command("SMISMEMBER", self.done_key, *urls)
+            chunk = [item for item, is_done in zip(chunk, done) if not is_done]
+            if not chunk:
+                continue
+            added += self.conn.command(
+                "ZADD", self.queue_key, "NX", *_pairs((now, url) for url, _ in chunk)
+            )
+            self.conn.command(
+                "HSET",
+                self.payload_key,
+                *_pairs((url, json.dumps(payload or {})) for url, payload in chunk),
+            )
+        return added
+
+    def claim(self, owner, batch_size=DEFAULT_BATCH, lease_seconds=DEFAULT_LEASE):
+        # A batch made only of items that used up their attempts is not the
+        # end of the queue: drop them and claim again
+        while True:
+            urls, attempts = self._lease(owner, batch_size, lease_seconds)
+            if not urls:
+                return []
+            payloads = self.conn.command("HMGET", self.payload_key, *urls)
+            claimed = []
+            exhausted = []
+            for url, attempt, payload in zip(urls, attempts, payloads):
+                if attempt > self.max_attempts:
+                    exhausted.append(url)
+                else:
+                    claimed.append((url, json.loads(payload) if payload else {}))
+            if exhausted:
+                self.conn.command("MULTI")
+                self.conn.command("ZREM", self.queue_key, *exhausted)
+                self.conn.command("SADD", self.failed_key, *exhausted)
+                self.conn.command("EXEC")
+            if claimed:
+                return claimed
+
+    def _lease(self, owner, batch_size, lease_seconds):
+        while True:
+            now = time.time()
+            self.conn.command("WATCH", self.queue_key)
+            urls = self.conn.command(
+                "ZRANGEBYSCORE", self.queue_key, "-inf", now, "LIMIT", 0, batch_size
+            )
+            if not urls:
+                self.conn.command("UNWATCH")
+                return [], []
+            self.conn.command("MULTI")
+            self.conn.command(
+                "ZADD",
+                self.queue_key,
+                "XX",
+                *_pairs((now + lease_seconds, url) for url in urls),
+            )
+            self.conn.command("HSET", self.owner_key, *_pairs((url, owner) for url in urls))
+            for url in urls:
+                self.conn.command("HINCRBY", self.attempts_key, url, 1)
+            result = self.conn.command("EXEC")
+            if result is not None:
+                return urls, result[2:]
+            # Another worker claimed from the queue first; try again
+
+    def _owned(self, owner, urls):
+        owners = self.conn.command("HMGET", self.owner_key, *urls)
+        return [url for url, current in zip(urls, owners) if current == owner]
+
+    def extend(self, owner, urls, lease_seconds=DEFAULT_LEASE):
+        urls = self._owned(owner, list(urls)) if urls else []
+        if urls:
+            deadline = time.time() + lease_seconds
+            self.conn.command(
+                "ZADD", self.queue_key, "XX", *_pairs((deadline, url) for url in urls)
+            )
+
+    def ack(self, urls):
+        urls = list(urls)
+        if not urls:
+            return
+        self.conn.command("MULTI")
+        self.conn.command("ZREM", self.queue_key, *urls)
+        self.conn.command("SADD", self.done_key, *urls)
+        for key in [self.payload_key, self.attempts_key, self.owner_key]:
+            self.conn.command("HDEL", key, *urls)
+        self.conn.command("EXEC")
+
+    def release(self, owner, urls):
+        urls = self._owned(owner, list(urls)) if urls else []
+        if not urls:
+            return
+        now = time.time()
+        self.conn.command("MULTI")
+        self.conn.command("ZADD", self.queue_key, "XX", *_pairs((now, url) for url in urls))
+        for url in urls:
+            self.conn.command("HINCRBY", self.attempts_key, url, -1)
+        self.conn.command("HDEL", self.owner_key, *urls)
+        self.conn.command("EXEC")
+
+    def stats(self):
+        now = time.time()
+        return {
+            "pending": self.conn.command("ZCOUNT", self.queue_key, "-inf", now),
+            "leased": self.conn.command("ZCOUNT", self.queue_key, f"({now}", "+inf"),
+            "done": self.conn.command("SCARD", self.done_key),
+            "failed": self.conn.command("SCARD", self.failed_key),
+        }
+
+    def close(self):
+        self.conn.close()
+
+
+def open_queue(url, name, max_attempts=MAX_ATTEMPTS):
+    # sqlite:///path/to/queue.db (or a plain path) or redis://[:password@]host:port/db
+    parsed = urlparse(url)
+    if parsed.scheme == "redis":
+        connection = RespConnection(
+            parsed.hostname or "localhost",
+            parsed.port or 6379,
+            int(parsed.path.lstrip("/") or 0),
+            unquote(parsed.password) if parsed.password else None,
+        )
+        return RedisQueue(connection, name, max_attempts)
+    if parsed.scheme == "sqlite":
+        return SqliteQueue(parsed.path[1:] or parsed.netloc, name, max_attempts)
+    if not parsed.scheme:
+        return SqliteQueue(url, name, max_attempts)
+    raise ValueError(f"Unknown queue backend: {url}")
+
+
+def iter_claimed(queue, owner, batch_size=DEFAULT_BATCH, lease_seconds=DEFAULT_LEASE):
+    # Yields (url, payload) until nothing is claimable. The current batch
+    # keeps its lease renewed until acked; whatever was not handed out when
+    # the consumer stops is released for other workers
+    while True:
+        batch = queue.claim(owner, batch_size, lease_seconds)
+        if not batch:
+            return
+        print(f"Claimed {len(batch)} items from queue '{queue.name}'")
+        claimed_at = time.monotonic()
+        next_index = 0
+        try:
+            while next_index < len(batch):
+                if time.monotonic() - claimed_at > lease_seconds / 2:
+                    # Acked items are no longer leased and are left alone
+                    queue.extend(owner, [url for url, _ in batch], lease_seconds)
+                    claimed_at = time.monotonic()
+                item = batch[next_index]
+                next_index += 1
+                yield item
+        finally:
+            if next_index < len(batch):
+                queue.release(owner, [url for url, _ in batch[next_index:]])